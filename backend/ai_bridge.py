@@ -1,18 +1,33 @@
 import os
+import time
 import google.generativeai as genai
-from openai import OpenAI
-from anthropic import Anthropic
-from groq import Groq
+from openai import OpenAI, AsyncOpenAI
+from anthropic import Anthropic, AsyncAnthropic
+from groq import Groq, AsyncGroq
+import metrics
+from llm_cache import cache_key, get_cache
+from llm_limits import get_limiter
+from llm_resilience import call_with_retries, acall_with_retries, astream_with_retries
+from local_llm import LocalLLMClient
+
+# Failures are reported as text with this prefix instead of raising
+ERROR_PREFIX = "Error:"
+UNKNOWN_PROVIDER_ERROR = f"{ERROR_PREFIX} Unknown AI Provider or initialization failed."
 
 class UnifiedAIClient:
-    def __init__(self, model_name, provider=None):
+    def __init__(self, model_name, provider=None, fallback_model=None):
         self.model_name = model_name
         self.provider = provider or self._identify_provider(model_name)
         self.client = self._init_client()
+        self._async_client = None # Built on first agenerate_content call
+        # Secondary model used when this one fails for good (retries exhausted, circuit open)
+        self.fallback = UnifiedAIClient(fallback_model) if fallback_model and fallback_model != model_name else None
         
     def _identify_provider(self, model_name):
         model_name_lower = model_name.lower()
-        if model_name_lower.startswith("gemini"):
+        if model_name_lower == "local" or model_name_lower.startswith("local-"):
+            return "local"
+        elif model_name_lower.startswith("gemini"):
             return "google"
         elif model_name_lower.startswith("gpt") or model_name_lower.startswith("o1"):
             return "openai"
@@ -47,15 +62,151 @@ class UnifiedAIClient:
             
         elif self.provider == "groq":
             return Groq(api_key=os.getenv("GROQ_API_KEY"))
+
+        elif self.provider == "local":
+            return LocalLLMClient(self.model_name)
             
         return None
 
-    def generate_content(self, prompt):
+    def generate_content(self, prompt, use_cache=True):
         """
         Unified interface for generating text content.
         Returns an object with a .text property to match Gemini's interface,
         or we adapt the result to be a simple string wrapper.
+        Identical (provider, model, prompt) requests are answered from llm_cache
+        unless use_cache is False. Retries and failover: see llm_resilience.py.
+        """
+        cached, key = self._cache_lookup(prompt, use_cache)
+        if cached is not None:
+            return cached
+
+        try:
+            response = call_with_retries(self.provider, self.model_name, lambda: self._timed_generate(prompt))
+        except Exception as e:
+            if not self.fallback:
+                raise
+            self._report_failover(e)
+            return self.fallback.generate_content(prompt, use_cache)
+        self._cache_store(key, response)
+        return response
+
+    async def agenerate_content(self, prompt, use_cache=True):
+        """
+        Async twin of generate_content (same return type).
+        Waits for this provider's concurrency slot and token budget (see llm_limits.py)
+        instead of tying up a worker thread for the whole round-trip.
+        Attempts are also bounded by a deadline and may be hedged (llm_resilience.py).
+        """
+        cached, key = self._cache_lookup(prompt, use_cache)
+        if cached is not None:
+            return cached
+
+        try:
+            response = await acall_with_retries(self.provider, self.model_name, lambda: self._limited_agenerate(prompt))
+        except Exception as e:
+            if not self.fallback:
+                raise
+            self._report_failover(e)
+            return await self.fallback.agenerate_content(prompt, use_cache)
+        self._cache_store(key, response)
+        return response
+
+    async def astream_content(self, prompt, use_cache=True):
         """
+        Streaming twin of agenerate_content: an async generator of text chunks as the
+        provider produces them. Same limits, metrics and cache; a cache hit is one chunk.
+        Fails over only while nothing has been streamed yet.
+        """
+        cached, key = self._cache_lookup(prompt, use_cache)
+        if cached is not None:
+            yield cached.text
+            return
+
+        chunks = []
+        try:
+            async for chunk in astream_with_retries(self.provider, self.model_name, lambda: self._limited_astream(prompt)):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            if chunks or not self.fallback:
+                raise
+            self._report_failover(e)
+            async for chunk in self.fallback.astream_content(prompt, use_cache):
+                yield chunk
+            return
+        self._cache_store(key, TextWrapper("".join(chunks)))
+
+    def _timed_generate(self, prompt):
+        start = time.perf_counter()
+        try:
+            response = self._generate(prompt)
+        except Exception:
+            self._record(start, prompt, None)
+            raise
+        self._record(start, prompt, response)
+        return response
+
+    async def _limited_agenerate(self, prompt):
+        """One attempt: provider slot + request + metrics."""
+        limiter = get_limiter(self.provider)
+        async with limiter.slot(prompt):
+            start = time.perf_counter()
+            try:
+                response = await self._agenerate(prompt)
+            except Exception:
+                self._record(start, prompt, None)
+                raise
+        self._record(start, prompt, response)
+        limiter.charge_response(_safe_text(response))
+        return response
+
+    async def _limited_astream(self, prompt):
+        limiter = get_limiter(self.provider)
+        chunks = []
+        async with limiter.slot(prompt):
+            start = time.perf_counter()
+            try:
+                async for chunk in self._astream(prompt):
+                    if chunk:
+                        chunks.append(chunk)
+                        yield chunk
+            except Exception:
+                self._record(start, prompt, None)
+                raise
+        response = TextWrapper("".join(chunks))
+        self._record(start, prompt, response)
+        limiter.charge_response(response.text)
+
+    def _report_failover(self, error):
+        print(f"   ⚠️ {self.model_name} unavailable ({error}). Failing over to {self.fallback.model_name}...")
+        metrics.LLM_FAILOVERS.labels(self.model_name, self.fallback.model_name).inc()
+
+    def _cache_lookup(self, prompt, use_cache):
+        """Returns (cached response or None, cache key or None). A bypassed request doesn't read but still refreshes."""
+        cache = get_cache()
+        if cache is None:
+            return None, None
+        key = cache_key(self.provider, self.model_name, prompt)
+        text = cache.get(key) if use_cache else None
+        return (TextWrapper(text) if text is not None else None), key
+
+    def _cache_store(self, key, response):
+        """Caches successful responses only; an error text would be served until the TTL runs out."""
+        text = _safe_text(response)
+        if key and text and not text.startswith(ERROR_PREFIX):
+            get_cache().put(key, text)
+
+    def _record(self, start, prompt, response):
+        metrics.LLM_DURATION.labels(self.provider, self.model_name).observe(time.perf_counter() - start)
+        if response is None:
+            metrics.LLM_REQUESTS.labels(self.provider, self.model_name, "error").inc()
+            return
+        metrics.LLM_REQUESTS.labels(self.provider, self.model_name, "ok").inc()
+        metrics.LLM_PROMPT_CHARS.labels(self.provider).inc(len(prompt))
+        metrics.LLM_RESPONSE_CHARS.labels(self.provider).inc(len(_safe_text(response)))
+
+    def _generate(self, prompt):
+        """Provider-specific request. Called (and instrumented) by generate_content."""
         if self.provider == "google":
             # Gemini returns a response object with .text property
             return self.client.generate_content(prompt)
@@ -82,8 +233,110 @@ class UnifiedAIClient:
                 messages=[{"role": "user", "content": prompt}],
             )
             return TextWrapper(response.choices[0].message.content)
+
+        elif self.provider == "local":
+            return TextWrapper(self.client.generate(prompt))
             
-        return TextWrapper("Error: Unknown AI Provider or initialization failed.")
+        return TextWrapper(UNKNOWN_PROVIDER_ERROR)
+
+    def _init_async_client(self):
+        if self.provider == "openai":
+            return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+        elif self.provider == "deepseek":
+            return AsyncOpenAI(
+                api_key=os.getenv("DEEPSEEK_API_KEY"), 
+                base_url="https://api.deepseek.com"
+            )
+
+        elif self.provider == "anthropic":
+            return AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+
+        elif self.provider == "groq":
+            return AsyncGroq(api_key=os.getenv("GROQ_API_KEY"))
+
+        # Gemini and the local provider expose async methods on the sync client
+        return self.client
+
+    async def _agenerate(self, prompt):
+        """Provider-specific async request. Called (and limited/instrumented) by agenerate_content."""
+        if self._async_client is None:
+            self._async_client = self._init_async_client()
+        client = self._async_client
+
+        if self.provider == "google":
+            return await client.generate_content_async(prompt)
+
+        elif self.provider in ["openai", "deepseek"]:
+            response = await client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                stream=False
+            )
+            return TextWrapper(response.choices[0].message.content)
+
+        elif self.provider == "anthropic":
+            response = await client.messages.create(
+                model=self.model_name,
+                max_tokens=4096,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            return TextWrapper(response.content[0].text)
+
+        elif self.provider == "groq":
+            response = await client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+            )
+            return TextWrapper(response.choices[0].message.content)
+
+        elif self.provider == "local":
+            return TextWrapper(await client.agenerate(prompt))
+
+        return TextWrapper(UNKNOWN_PROVIDER_ERROR)
+
+    async def _astream(self, prompt):
+        """Provider-specific streaming request. Called (and limited/instrumented) by astream_content."""
+        if self._async_client is None:
+            self._async_client = self._init_async_client()
+        client = self._async_client
+
+        if self.provider == "google":
+            response = await client.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                yield _safe_text(chunk)
+
+        elif self.provider in ["openai", "deepseek", "groq"]:
+            stream = await client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+        elif self.provider == "anthropic":
+            async with client.messages.stream(
+                model=self.model_name,
+                max_tokens=4096,
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield text
+
+        elif self.provider == "local":
+            async for chunk in client.astream(prompt):
+                yield chunk
+
+        else:
+            yield UNKNOWN_PROVIDER_ERROR
+
+def _safe_text(response):
+    try:
+        return response.text or ""
+    except Exception:
+        return "" # Gemini raises on .text for blocked responses; the caller handles that
 
 class TextWrapper:
     """Mimics the Gemini response object which accesses .text"""
@@ -0,0 +1,265 @@
+"""
+Pipeline Benchmark Harness
+Generates a synthetic repository and times the pipeline stages on it:
+ingestion, edge resolution, graph serialization, search, heal planning and propagation.
+
+ChromaDB is replaced by a local stand-in (benchmarks/stand_ins.py) and the LLMs by
+the built-in "local" provider, so runs are offline and comparable. Results are written as JSON.
+
+Usage (from backend/):
+    python benchmarks/run_benchmarks.py --files 500 --repeat 3 --output results/large.json
+    python benchmarks/run_benchmarks.py --files 500 --compare results/large.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import networkx as nx
+from synthetic_repo import generate, add_spec_arguments, spec_from_args
+from stand_ins import LocalClient
+
+STAGES = ("ingestion", "edge_resolution", "graph_serialization", "search", "heal_plan", "propagation")
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """The pipeline narrates every step with print(); keep that out of the timings' output."""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def make_archeologist():
+    """A real CodeArcheologist wired to the local stand-ins instead of ChromaDB and the LLM providers."""
+    import core # Loads backend/.env first, so the overrides below win
+    # Point at a closed port so the constructor can never reach a real Chroma server
+    os.environ["CHROMA_HOST"] = "127.0.0.1"
+    os.environ["CHROMA_PORT"] = "9"
+    # ...and doesn't fall back to the embedded vector index either (LocalClient replaces it)
+    os.environ["VECTOR_BACKEND"] = "chroma"
+    # Offline provider with no simulated latency: we time our code, not the model
+    os.environ["ARCHITECT_MODEL"] = os.environ["ENGINEER_MODEL"] = "local"
+    os.environ["LOCAL_LLM_LATENCY_MS"] = os.environ["LOCAL_LLM_TOKENS_PER_SEC"] = os.environ["LOCAL_LLM_FAILURE_RATE"] = "0"
+    # Repeats must not be answered from the LLM response cache
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    arch = core.CodeArcheologist()
+    arch.chroma_client = LocalClient() # Phase 1 opens the repo's collection from it
+    arch.has_memory = True
+    return arch
+
+
+def summarize(samples, **extra):
+    result = {
+        "runs": samples,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "max": max(samples)
+    }
+    result.update(extra)
+    return result
+
+
+def timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - start, out
+
+
+def _git(repo, *args):
+    subprocess.run(["git", "-c", "user.email=bench@local", "-c", "user.name=bench", *args],
+                   cwd=repo, check=True, capture_output=True)
+
+
+def bench_ingestion(repo, repeat):
+    from pipeline import phase_1_ingestion
+    samples = []
+    arch = None
+    for _ in range(repeat):
+        arch = make_archeologist()
+        t, _ = timed(lambda: phase_1_ingestion.run(arch, repo))
+        samples.append(t)
+    nodes = arch.graph.number_of_nodes()
+    return arch, summarize(samples, nodes=nodes, nodes_per_sec=nodes / statistics.median(samples))
+
+
+def bench_edge_resolution(arch, repeat):
+    from pipeline import phase_2_analysis
+    samples = []
+    for _ in range(repeat):
+        arch.graph.remove_edges_from(list(arch.graph.edges))
+        t, _ = timed(lambda: phase_2_analysis.run(arch))
+        samples.append(t)
+    edges = arch.graph.number_of_edges()
+    return summarize(samples, edges=edges, edges_per_sec=edges / statistics.median(samples))
+
+
+def bench_graph_serialization(arch, repeat):
+    """Same work as GET /graph: node_link_data + FastAPI's JSON encoding."""
+    try:
+        from fastapi.encoders import jsonable_encoder
+    except ImportError:
+        jsonable_encoder = lambda data: data
+
+    samples = []
+    payload = b""
+    for _ in range(repeat):
+        t, payload = timed(lambda: json.dumps(jsonable_encoder(nx.node_link_data(arch.graph))).encode())
+        samples.append(t)
+    return summarize(samples, bytes=len(payload))
+
+
+def bench_search(arch, repeat, queries=50):
+    from pipeline import phase_3_strategy
+    names = sorted(arch.graph.nodes)
+    step = max(1, len(names) // queries)
+    texts = [n.split("::")[1] for n in names[::step][:queries]]
+    samples = []
+    for _ in range(repeat):
+        t, _ = timed(lambda: [phase_3_strategy.run_search(arch, q) for q in texts])
+        samples.append(t)
+    return summarize(samples, queries=len(texts), per_query=statistics.median(samples) / max(1, len(texts)))
+
+
+def _hotspots(arch, count):
+    ranked = sorted(arch.graph.nodes, key=lambda n: (-arch.graph.in_degree(n), n))
+    return ranked[:count]
+
+
+def bench_heal_plan(arch, repo, repeat, targets):
+    from pipeline import phase_3_strategy
+    nodes = _hotspots(arch, targets)
+    samples = []
+    for _ in range(repeat):
+        t, _ = timed(lambda: [phase_3_strategy.generate_heal_plan(arch, repo, n) for n in nodes])
+        samples.append(t)
+    return summarize(samples, targets=len(nodes))
+
+
+def bench_propagation(arch, repo, repeat, targets):
+    """Phase 5 on the top fan-in nodes of a scratch git copy; files are restored between runs."""
+    from pipeline import phase_5_propagation
+    scratch = tempfile.mkdtemp(prefix="archeologist-bench-")
+    try:
+        work = os.path.join(scratch, "repo")
+        shutil.copytree(repo, work)
+        _git(work, "init", "-q")
+        _git(work, "add", "-A")
+        _git(work, "commit", "-qm", "baseline")
+
+        nodes = _hotspots(arch, targets)
+        callers = sum(arch.graph.in_degree(n) for n in nodes)
+        samples = []
+        for _ in range(repeat):
+            t, _ = timed(lambda: [phase_5_propagation.run(arch, n, n.split("::")[1] + "_renamed", work) for n in nodes])
+            samples.append(t)
+            _git(work, "reset", "-q", "--hard")
+        return summarize(samples, targets=len(nodes), callers=callers)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def run(args):
+    spec = spec_from_args(args)
+    workdir = tempfile.mkdtemp(prefix="archeologist-synth-")
+    try:
+        repo = os.path.join(workdir, "repo")
+        manifest = generate(repo, spec)
+        print(f"Synthetic repo: {manifest['files']} files, {manifest['functions']} functions, {manifest['calls']} calls")
+
+        results = {}
+        with quiet(not args.verbose):
+            arch, results["ingestion"] = bench_ingestion(repo, args.repeat)
+            results["edge_resolution"] = bench_edge_resolution(arch, args.repeat)
+            results["graph_serialization"] = bench_graph_serialization(arch, args.repeat)
+            results["search"] = bench_search(arch, args.repeat)
+            results["heal_plan"] = bench_heal_plan(arch, repo, args.repeat, args.targets)
+            results["propagation"] = bench_propagation(arch, repo, args.repeat, args.targets)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "git_commit": _current_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "targets": args.targets
+        },
+        "repo": manifest,
+        "results": results
+    }
+
+
+def _current_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def print_report(report, baseline=None):
+    print(f"\n{'stage':<22}{'median (s)':>12}{'min (s)':>12}" + (f"{'baseline':>12}{'change':>10}" if baseline else ""))
+    for stage in STAGES:
+        r = report["results"].get(stage)
+        if not r:
+            continue
+        line = f"{stage:<22}{r['median']:>12.4f}{r['min']:>12.4f}"
+        if baseline and stage in baseline["results"]:
+            old = baseline["results"][stage]["median"]
+            change = (r["median"] - old) / old * 100 if old else 0.0
+            line += f"{old:>12.4f}{change:>+9.1f}%"
+        print(line)
+
+    if baseline and baseline.get("repo", {}).get("spec") != report["repo"]["spec"]:
+        print("\n⚠️  Baseline was generated with different repo parameters; compare with care.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Code Archeologist pipeline on a synthetic repo.")
+    add_spec_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--targets", type=int, default=10, help="Hotspot nodes used by the heal_plan/propagation stages")
+    parser.add_argument("--output", help="Where to write the JSON report (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Previous JSON report to compare medians against")
+    parser.add_argument("--verbose", action="store_true", help="Show pipeline logs")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results",
+        datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"\nReport written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Local stand-ins for the external services the pipeline talks to.
+They keep benchmark numbers about our code, not about network round-trips.
+(LLMs need no stand-in: the built-in "local" provider in ai_bridge.py is used.)
+"""
+import re
+
+TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def _tokens(text):
+    return set(TOKEN_RE.findall(text or ""))
+
+
+class LocalClient:
+    """In-memory replacement for a chromadb client: one LocalCollection per name."""
+    def __init__(self):
+        self.collections = {}
+
+    def heartbeat(self):
+        return 0
+
+    def get_or_create_collection(self, name):
+        return self.collections.setdefault(name, LocalCollection(name))
+
+
+class LocalCollection:
+    """
+    In-memory replacement for a chromadb Collection (upsert/query/get, no deletes).
+    Similarity is token-set Jaccard, brute force: cheap, deterministic, no embedding model.
+    """
+    def __init__(self, name="code_knowledge"):
+        self.name = name
+        self.ids = []
+        self.index = {} # id -> position
+        self.documents = []
+        self.metadatas = []
+        self.token_sets = []
+
+    def upsert(self, ids, documents, metadatas=None):
+        metadatas = metadatas or [{} for _ in ids]
+        for node_id, doc, meta in zip(ids, documents, metadatas):
+            if node_id in self.index:
+                pos = self.index[node_id]
+                self.documents[pos] = doc
+                self.metadatas[pos] = meta
+                self.token_sets[pos] = _tokens(doc)
+            else:
+                self.index[node_id] = len(self.ids)
+                self.ids.append(node_id)
+                self.documents.append(doc)
+                self.metadatas.append(meta)
+                self.token_sets.append(_tokens(doc))
+
+    def count(self):
+        return len(self.ids)
+
+    def get(self, ids=None, include=None, limit=None, offset=None):
+        positions = [self.index[i] for i in ids if i in self.index] if ids is not None else list(range(len(self.ids)))
+        positions = positions[offset or 0:(offset or 0) + limit if limit is not None else None]
+        return {"ids": [self.ids[p] for p in positions], "metadatas": [self.metadatas[p] for p in positions]}
+
+    def query(self, query_texts, n_results=10):
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for text in query_texts:
+            q = _tokens(text)
+            scored = []
+            for pos, toks in enumerate(self.token_sets):
+                union = len(q | toks)
+                sim = len(q & toks) / union if union else 0.0
+                scored.append((1.0 - sim, pos))
+            scored.sort()
+            top = scored[:n_results]
+            out["ids"].append([self.ids[p] for _, p in top])
+            out["documents"].append([self.documents[p] for _, p in top])
+            out["metadatas"].append([self.metadatas[p] for _, p in top])
+            out["distances"].append([d for d, _ in top])
+        return out
@@ -0,0 +1,333 @@
+"""
+Synthetic Repository Generator
+Writes a deterministic, parseable codebase of arbitrary size for benchmarking the pipeline.
+
+Same parameters + same seed => byte-identical repository.
+
+Usage (from backend/):
+    python benchmarks/synthetic_repo.py /tmp/synth --files 500 --functions-per-file 10 --call-density 3
+"""
+import argparse
+import os
+import random
+import shutil
+
+LANG_EXTENSIONS = {
+    'python': '.py',
+    'javascript': '.js',
+    'typescript': '.ts',
+    'java': '.java',
+    'php': '.php',
+    'csharp': '.cs'
+}
+
+IMPORT_STYLES = ('module', 'from', 'alias', 'mixed')
+
+
+class SyntheticRepoSpec:
+    def __init__(self, files=100, functions_per_file=8, call_density=2.0, import_style='mixed',
+                 nesting_depth=2, language_mix=None, packages=4, seed=42):
+        """
+        files:              number of source files
+        functions_per_file: function definitions per file
+        call_density:       average number of calls made by each function
+                            (~1/3 local, ~2/3 cross-file through imports)
+        import_style:       'module' (import m; m.f()), 'from' (from m import f; f()),
+                            'alias' (import m as x; x.f()) or 'mixed'
+        nesting_depth:      depth of nested control flow in every function body
+        language_mix:       {language: weight}, e.g. {'python': 3, 'javascript': 1}
+        packages:           number of sub-directories files are spread across
+        """
+        if import_style not in IMPORT_STYLES:
+            raise ValueError(f"import_style must be one of {IMPORT_STYLES}")
+        self.files = files
+        self.functions_per_file = functions_per_file
+        self.call_density = call_density
+        self.import_style = import_style
+        self.nesting_depth = nesting_depth
+        self.language_mix = language_mix or {'python': 1}
+        self.packages = max(1, packages)
+        self.seed = seed
+
+        unknown = set(self.language_mix) - set(LANG_EXTENSIONS)
+        if unknown:
+            raise ValueError(f"Unsupported languages: {sorted(unknown)}")
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+def _module_name(file_idx):
+    return f"mod_{file_idx}"
+
+
+def _func_name(file_idx, func_idx):
+    return f"func_{file_idx}_{func_idx}"
+
+
+def _plan(spec):
+    """Decides languages, locations and call targets for every file. Returns a list of file plans."""
+    rng = random.Random(spec.seed)
+    langs = sorted(spec.language_mix)
+    weights = [spec.language_mix[l] for l in langs]
+
+    files = []
+    for i in range(spec.files):
+        lang = rng.choices(langs, weights)[0]
+        files.append({
+            'idx': i,
+            'lang': lang,
+            'dir': f"pkg_{i % spec.packages}",
+            'module': _module_name(i),
+            'functions': []
+        })
+
+    # Cross-file calls only go to files of the same language family, like real imports do
+    by_family = {}
+    for f in files:
+        by_family.setdefault(_family(f['lang']), []).append(f['idx'])
+
+    for f in files:
+        peers = [i for i in by_family[_family(f['lang'])] if i != f['idx']]
+        for j in range(spec.functions_per_file):
+            n_calls = _poisson(rng, spec.call_density)
+            calls = []
+            for _ in range(n_calls):
+                if peers and rng.random() < 0.66:
+                    target_file = rng.choice(peers)
+                    style = spec.import_style
+                    if style == 'mixed':
+                        style = rng.choice(IMPORT_STYLES[:3])
+                    calls.append(('import', target_file, rng.randrange(spec.functions_per_file), style))
+                elif spec.functions_per_file > 1:
+                    target = rng.randrange(spec.functions_per_file - 1)
+                    target = target if target < j else target + 1 # Never call yourself
+                    calls.append(('local', f['idx'], target, None))
+            f['functions'].append(calls)
+    return files
+
+
+def _family(lang):
+    return 'js' if lang in ('javascript', 'typescript') else lang
+
+
+def _poisson(rng, mean):
+    # Knuth's algorithm; fine for the small means used here
+    if mean <= 0:
+        return 0
+    limit, k, p = pow(2.718281828459045, -mean), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+# --- Language Renderers ---
+
+def _render_python(f, spec):
+    imports = set()
+    bodies = []
+    for j, calls in enumerate(f['functions']):
+        exprs = []
+        for kind, t_file, t_func, style in calls:
+            name = _func_name(t_file, t_func)
+            if kind == 'local':
+                exprs.append(f"{name}(x)")
+            elif style == 'module':
+                imports.add(f"import {_module_name(t_file)}")
+                exprs.append(f"{_module_name(t_file)}.{name}(x)")
+            elif style == 'alias':
+                imports.add(f"import {_module_name(t_file)} as m{t_file}")
+                exprs.append(f"m{t_file}.{name}(x)")
+            else:
+                imports.add(f"from {_module_name(t_file)} import {name}")
+                exprs.append(f"{name}(x)")
+
+        lines = [f"def {_func_name(f['idx'], j)}(x):"]
+        indent = "    "
+        for depth in range(spec.nesting_depth):
+            if depth % 2 == 0:
+                lines.append(f"{indent}if x > {depth}:")
+            else:
+                lines.append(f"{indent}for i{depth} in range({depth + 2}):")
+            indent += "    "
+            lines.append(f"{indent}x = x + {depth + 1}")
+        for expr in exprs:
+            lines.append(f"{indent}x = x + {expr}")
+        lines.append(f"{indent}return x")
+        lines.append("    return x")
+        bodies.append("\n".join(lines))
+    header = "\n".join(sorted(imports))
+    return (header + "\n\n\n" if header else "") + "\n\n\n".join(bodies) + "\n"
+
+
+def _render_javascript(f, spec):
+    imports = {}
+    bodies = []
+    for j, calls in enumerate(f['functions']):
+        exprs = []
+        for kind, t_file, t_func, style in calls:
+            name = _func_name(t_file, t_func)
+            path = f"../pkg_{t_file % spec.packages}/{_module_name(t_file)}"
+            if kind == 'local':
+                exprs.append(f"{name}(x)")
+            elif style in ('module', 'alias'):
+                alias = _module_name(t_file) if style == 'module' else f"m{t_file}"
+                imports[f"import {alias} from '{path}';"] = None
+                exprs.append(f"{alias}.{name}(x)")
+            else:
+                imports[f"import {{ {name} }} from '{path}';"] = None
+                exprs.append(f"{name}(x)")
+
+        lines = [f"function {_func_name(f['idx'], j)}(x) {{"]
+        indent = "    "
+        for depth in range(spec.nesting_depth):
+            if depth % 2 == 0:
+                lines.append(f"{indent}if (x > {depth}) {{")
+            else:
+                lines.append(f"{indent}for (let i{depth} = 0; i{depth} < {depth + 2}; i{depth}++) {{")
+            indent += "    "
+            lines.append(f"{indent}x = x + {depth + 1};")
+        for expr in exprs:
+            lines.append(f"{indent}x = x + {expr};")
+        for depth in range(spec.nesting_depth):
+            indent = indent[:-4]
+            lines.append(f"{indent}}}")
+        lines.append("    return x;")
+        lines.append("}")
+        bodies.append("\n".join(lines))
+    header = "\n".join(sorted(imports))
+    exports = "export { " + ", ".join(_func_name(f['idx'], j) for j in range(len(f['functions']))) + " };"
+    return (header + "\n\n" if header else "") + "\n\n".join(bodies) + "\n\n" + exports + "\n"
+
+
+def _render_c_like(f, spec, lang):
+    """Java / C# / PHP: static methods on one class per file; cross-file calls are Class.method()."""
+    class_name = f"Mod{f['idx']}"
+    bodies = []
+    for j, calls in enumerate(f['functions']):
+        exprs = []
+        for kind, t_file, t_func, _ in calls:
+            name = _func_name(t_file, t_func)
+            if lang == 'php':
+                exprs.append(f"{name}($x)" if kind == 'local' else f"Mod{t_file}::{name}($x)")
+            else:
+                exprs.append(f"{name}(x)" if kind == 'local' else f"Mod{t_file}.{name}(x)")
+
+        var = "$x" if lang == 'php' else "x"
+        if lang == 'php':
+            sig = f"    public static function {_func_name(f['idx'], j)}($x) {{"
+        else:
+            sig = f"    public static int {_func_name(f['idx'], j)}(int x) {{"
+        lines = [sig]
+        indent = "        "
+        for depth in range(spec.nesting_depth):
+            if depth % 2 == 0:
+                lines.append(f"{indent}if ({var} > {depth}) {{")
+            else:
+                loop_var = f"$i{depth}" if lang == 'php' else f"int i{depth}"
+                ref = f"$i{depth}" if lang == 'php' else f"i{depth}"
+                lines.append(f"{indent}for ({loop_var} = 0; {ref} < {depth + 2}; {ref}++) {{")
+            indent += "    "
+            lines.append(f"{indent}{var} = {var} + {depth + 1};")
+        for expr in exprs:
+            lines.append(f"{indent}{var} = {var} + {expr};")
+        for depth in range(spec.nesting_depth):
+            indent = indent[:-4]
+            lines.append(f"{indent}}}")
+        lines.append(f"        return {var};")
+        lines.append("    }")
+        bodies.append("\n".join(lines))
+
+    body = "\n\n".join(bodies)
+    if lang == 'php':
+        return f"<?php\n\nclass {class_name} {{\n{body}\n}}\n"
+    if lang == 'java':
+        return f"public class {class_name} {{\n{body}\n}}\n"
+    return f"public static class {class_name}\n{{\n{body}\n}}\n"
+
+
+def render_file(f, spec):
+    if f['lang'] == 'python':
+        return _render_python(f, spec)
+    if f['lang'] in ('javascript', 'typescript'):
+        return _render_javascript(f, spec)
+    return _render_c_like(f, spec, f['lang'])
+
+
+def generate(out_dir, spec=None, clean=True):
+    """
+    Writes the synthetic repository to out_dir.
+    Returns a manifest dict (spec, file/function/call counts).
+    """
+    spec = spec or SyntheticRepoSpec()
+    if clean and os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    plan = _plan(spec)
+    total_calls = 0
+    per_language = {}
+    for f in plan:
+        folder = os.path.join(out_dir, f['dir'])
+        os.makedirs(folder, exist_ok=True)
+        name = f['module'] + LANG_EXTENSIONS[f['lang']]
+        if f['lang'] in ('java', 'csharp'):
+            name = f"Mod{f['idx']}" + LANG_EXTENSIONS[f['lang']] # One public class per file
+        with open(os.path.join(folder, name), 'w', newline='\n') as fh:
+            fh.write(render_file(f, spec))
+        total_calls += sum(len(c) for c in f['functions'])
+        per_language[f['lang']] = per_language.get(f['lang'], 0) + 1
+
+    return {
+        "spec": spec.to_dict(),
+        "files": len(plan),
+        "functions": len(plan) * spec.functions_per_file,
+        "calls": total_calls,
+        "files_per_language": per_language
+    }
+
+
+def parse_language_mix(text):
+    """'python:3,javascript:1' -> {'python': 3.0, 'javascript': 1.0}"""
+    mix = {}
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        lang, _, weight = part.partition(':')
+        mix[lang.strip()] = float(weight) if weight else 1.0
+    return mix
+
+
+def add_spec_arguments(parser):
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--functions-per-file", type=int, default=8)
+    parser.add_argument("--call-density", type=float, default=2.0)
+    parser.add_argument("--import-style", choices=IMPORT_STYLES, default='mixed')
+    parser.add_argument("--nesting-depth", type=int, default=2)
+    parser.add_argument("--languages", default="python:1", help="Weighted mix, e.g. python:3,javascript:1")
+    parser.add_argument("--packages", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def spec_from_args(args):
+    return SyntheticRepoSpec(
+        files=args.files,
+        functions_per_file=args.functions_per_file,
+        call_density=args.call_density,
+        import_style=args.import_style,
+        nesting_depth=args.nesting_depth,
+        language_mix=parse_language_mix(args.languages),
+        packages=args.packages,
+        seed=args.seed
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic codebase.")
+    parser.add_argument("out_dir")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+    manifest = generate(args.out_dir, spec_from_args(args))
+    print(f"Generated {manifest['files']} files / {manifest['functions']} functions / {manifest['calls']} calls in {args.out_dir}")
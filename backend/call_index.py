@@ -0,0 +1,150 @@
+"""
+Call-site inverted index: called identifier -> every place it is called.
+
+Phase 1 records each call site the parsers report as (called name, call text, caller,
+byte range of the name, line). Rows are stored per file, one array per column, with
+all strings interned; a posting map sends each name to the files that call it. A
+lookup costs O(sites of that name) and never touches the source. A re-ingested file
+replaces its rows as a unit.
+
+The index is written next to the other analysis state after every analysis/refresh
+(binary: a JSON header followed by the raw columns):
+
+    CALL_INDEX_DIR=<tmp>/code-archeologist-index
+"""
+import bisect
+import hashlib
+import json
+import os
+import re
+import tempfile
+from array import array
+
+COLUMNS = ("name", "text", "caller", "start", "end", "line")
+MAGIC = b"CAIX1\n"
+
+
+def file_digest(content):
+    return hashlib.sha1(content).hexdigest()
+
+
+def path_for(project_path):
+    base = os.getenv("CALL_INDEX_DIR") or os.path.join(tempfile.gettempdir(), "code-archeologist-index")
+    project_path = os.path.abspath(project_path)
+    repo_key = hashlib.sha1(project_path.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(base, f"{os.path.basename(project_path)}-{repo_key}.bin")
+
+
+class CallSiteIndex:
+    def __init__(self):
+        self.strings = []
+        self._string_ids = {}
+        self.files = {} # file -> {"digest": str, "name": array, "text": array, ...}
+        self.postings = {} # name id -> set of files
+
+    def _intern(self, value):
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def add_file(self, file, content, sites):
+        """Replaces the rows of `file`. sites: [(caller name, call text, start_byte, end_byte)] in content."""
+        self.remove_file(file)
+        line_starts = [0] + [m.end() for m in re.finditer(b"\n", content)] if sites else []
+        block = {"digest": file_digest(content), **{column: array("i") for column in COLUMNS}}
+        for caller, call_text, start_byte, end_byte in sites:
+            name_id = self._intern(content[start_byte:end_byte].decode("utf-8", "replace"))
+            block["name"].append(name_id)
+            block["text"].append(self._intern(call_text))
+            block["caller"].append(self._intern(caller))
+            block["start"].append(start_byte)
+            block["end"].append(end_byte)
+            block["line"].append(bisect.bisect_right(line_starts, start_byte))
+            self.postings.setdefault(name_id, set()).add(file)
+        self.files[file] = block
+
+    def remove_file(self, file):
+        block = self.files.pop(file, None)
+        if block is None:
+            return
+        for name_id in set(block["name"]):
+            files = self.postings.get(name_id)
+            if files:
+                files.discard(file)
+                if not files:
+                    del self.postings[name_id]
+
+    def digest(self, file):
+        block = self.files.get(file)
+        return block["digest"] if block else None
+
+    def files_calling(self, name):
+        name_id = self._string_ids.get(name)
+        return set(self.postings.get(name_id, ())) if name_id is not None else set()
+
+    def sites(self, name, files=None):
+        """[{"name", "call", "file", "caller", "start_byte", "end_byte", "line"}], by file and position."""
+        name_id = self._string_ids.get(name)
+        if name_id is None:
+            return []
+        results = []
+        for file in sorted(self.postings.get(name_id, ())):
+            if files is not None and file not in files:
+                continue
+            block = self.files[file]
+            for row, row_name in enumerate(block["name"]):
+                if row_name != name_id:
+                    continue
+                results.append({
+                    "name": name,
+                    "call": self.strings[block["text"][row]],
+                    "file": file,
+                    "caller": f"{file}::{self.strings[block['caller'][row]]}",
+                    "start_byte": block["start"][row],
+                    "end_byte": block["end"][row],
+                    "line": block["line"][row],
+                })
+        return results
+
+    def stats(self):
+        return {"files": len(self.files), "names": len(self.postings),
+                "sites": sum(len(block["name"]) for block in self.files.values())}
+
+    def save(self, path):
+        files = sorted(self.files)
+        header = json.dumps({
+            "strings": self.strings,
+            "files": [[file, self.files[file]["digest"], len(self.files[file]["name"])] for file in files],
+        }).encode("utf-8")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for file in files:
+                for column in COLUMNS:
+                    self.files[file][column].tofile(f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a call-site index")
+            header = json.loads(f.read(int.from_bytes(f.read(8), "little")))
+            index.strings = header["strings"]
+            index._string_ids = {value: i for i, value in enumerate(index.strings)}
+            for file, digest, rows in header["files"]:
+                block = {"digest": digest}
+                for column in COLUMNS:
+                    block[column] = array("i")
+                    block[column].fromfile(f, rows)
+                index.files[file] = block
+                for name_id in set(block["name"]):
+                    index.postings.setdefault(name_id, set()).add(file)
+        return index
+
@@ -0,0 +1,112 @@
+"""
+One ChromaDB HTTP client for the whole process, shared by every CodeArcheologist.
+
+The client is built once with a bounded keep-alive connection pool (chromadb's httpx
+session), instead of a new client and TCP handshake on every /analyze. A background
+thread sends a heartbeat every CHROMA_HEALTH_INTERVAL_SECONDS. When the server stops
+answering, the attached archeologists switch their vector memory off. When it answers
+again, they switch it back on and reopen their repo's collection, so a blip while
+/analyze runs no longer disables memory for the rest of the session. The monitor
+thread only sends heartbeats; the archeologists re-embed on their own threads.
+
+    CHROMA_HTTP_MAX_CONNECTIONS=20
+    CHROMA_HTTP_MAX_KEEPALIVE_CONNECTIONS=20   (idle connections kept open)
+    CHROMA_HTTP_KEEPALIVE_SECS=30
+    CHROMA_HEALTH_INTERVAL_SECONDS=15
+"""
+import os
+import threading
+import time
+import weakref
+
+import chromadb
+from chromadb.config import Settings
+
+import metrics
+
+
+class ChromaPool:
+    def __init__(self):
+        self.client = None
+        self.healthy = False
+        self.last_error = None
+        self.attached = weakref.WeakSet() # CodeArcheologists that follow the health state
+        self._lock = threading.Lock()
+        self._monitor = None
+
+    def _settings(self):
+        max_connections = int(os.getenv("CHROMA_HTTP_MAX_CONNECTIONS", "20"))
+        return Settings(
+            anonymized_telemetry=False,
+            chroma_http_max_connections=max_connections,
+            chroma_http_max_keepalive_connections=int(os.getenv("CHROMA_HTTP_MAX_KEEPALIVE_CONNECTIONS", str(max_connections))),
+            chroma_http_keepalive_secs=float(os.getenv("CHROMA_HTTP_KEEPALIVE_SECS", "30")),
+        )
+
+    def connect(self):
+        """The shared client, created on first use; raises if the server can't be reached."""
+        with self._lock:
+            if self.client is None:
+                host = os.getenv("CHROMA_HOST", "localhost")
+                port = int(os.getenv("CHROMA_PORT", "8000"))
+                try:
+                    # Builds the session and validates the tenant, so this is a round-trip
+                    self.client = chromadb.HttpClient(host=host, port=port, settings=self._settings())
+                except Exception as e:
+                    self._set_health(False, e)
+                    raise
+                self._set_health(True)
+            return self.client
+
+    def check(self):
+        """One heartbeat; updates `healthy` and tells the attached archeologists if it changed."""
+        was_healthy = self.healthy
+        try:
+            start = time.perf_counter()
+            if self.client is None:
+                self.connect()
+            else:
+                self.client.heartbeat()
+                self._set_health(True)
+            metrics.VECTOR_DURATION.labels("heartbeat").observe(time.perf_counter() - start)
+            metrics.CHROMA_HEALTH_CHECKS.labels("ok").inc()
+        except Exception as e:
+            self._set_health(False, e)
+            metrics.CHROMA_HEALTH_CHECKS.labels("failed").inc()
+        if self.healthy != was_healthy:
+            if self.healthy:
+                metrics.CHROMA_RECONNECTS.inc()
+                print("   -> ChromaDB is reachable again; re-enabling vector memory.")
+            else:
+                print(f"⚠️  ChromaDB unreachable ({self.last_error}); vector memory paused.")
+            for archeologist in list(self.attached):
+                archeologist.on_vector_health(self.healthy)
+        return self.healthy
+
+    def _set_health(self, healthy, error=None):
+        self.healthy = healthy
+        self.last_error = None if healthy else str(error)
+        metrics.CHROMA_UP.set(1 if healthy else 0)
+
+    def attach(self, archeologist):
+        self.attached.add(archeologist)
+        self.start_monitor()
+
+    def start_monitor(self):
+        with self._lock:
+            if self._monitor is not None:
+                return
+            self._monitor = threading.Thread(target=self._run, name="chroma-health", daemon=True)
+            self._monitor.start()
+
+    def _run(self):
+        while True:
+            time.sleep(float(os.getenv("CHROMA_HEALTH_INTERVAL_SECONDS", "15")))
+            if self.attached:
+                self.check()
+
+    def status(self):
+        return {"healthy": self.healthy, "connected": self.client is not None, "last_error": self.last_error}
+
+
+pool = ChromaPool()
@@ -0,0 +1,378 @@
+"""
+Near-duplicate (copy-pasted) function detection with MinHash + LSH.
+
+Each function body arrives from the parsers as a normalised token stream
+(languages/body_tokens.py: identifiers -> $id, literals -> $lit), so copies with
+renamed variables still match. Phase 1 turns it into a set of SHINGLE_SIZE-token
+shingles, then a NUM_HASHES MinHash signature (one vectorised numpy pass), then
+BANDS band keys. Functions sharing a band key are candidates. Each bucket is checked
+against one member only (its head, picked by a stable hash of the id), never pairwise:
+members whose estimated Jaccard similarity reaches CLONE_THRESHOLD are linked to it,
+and clusters are the connected components of those links. The cost is linear in the
+number of functions.
+
+After a refresh only the buckets whose members changed are checked again. New links
+merge clusters (the smaller one is relabelled). Lost links start a search from their
+endpoints, in lockstep, that stops as soon as they meet again, so the cost follows
+the part that splits off, not the size of the cluster. Cluster ids are stable, and
+only the clusters that changed are rewritten on the graph as `clone_group` (and
+`clone_similarity`); /clones lists them.
+
+    CLONE_THRESHOLD=0.8
+    CLONE_MIN_TOKENS=40      # shorter bodies (getters, one-liners) are not considered
+"""
+import os
+import zlib
+from collections import deque
+
+import numpy as np
+
+SHINGLE_SIZE = 5
+NUM_HASHES = 128
+BANDS = 16 # x 8 rows: pairs above ~0.7 estimated similarity almost always share a band
+ROWS = NUM_HASHES // BANDS
+
+# Multiply-shift hashing on uint64 (wrapping multiply, top 32 bits): no modulo needed
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, 1 << 63, NUM_HASHES, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.integers(0, 1 << 63, NUM_HASHES, dtype=np.uint64)
+_SHINGLE_MULTIPLIERS = _rng.integers(1, 1 << 63, SHINGLE_SIZE, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_token_hashes = {}
+
+
+def _hash_token(token):
+    h = _token_hashes[token] = zlib.crc32(token.encode("utf-8"))
+    return h
+
+
+def _rank(node_id):
+    """Orders a bucket's members to pick its head: a stable hash, so a new function rarely becomes one."""
+    return (zlib.crc32(node_id.encode("utf-8")), node_id)
+
+
+def clone_threshold():
+    return float(os.getenv("CLONE_THRESHOLD", "0.8"))
+
+
+def min_tokens():
+    return int(os.getenv("CLONE_MIN_TOKENS", "40"))
+
+
+def signature(tokens):
+    """MinHash signature (NUM_HASHES uint32) of the token shingles; None if the body is too short."""
+    if len(tokens) < max(min_tokens(), SHINGLE_SIZE):
+        return None
+    hashes = np.array([_token_hashes.get(token) or _hash_token(token) for token in tokens], dtype=np.uint64)
+    count = len(tokens) - SHINGLE_SIZE + 1
+    shingles = np.zeros(count, dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        shingles += hashes[offset:offset + count] * _SHINGLE_MULTIPLIERS[offset]
+    shingles = np.unique(shingles)
+    return ((_A[:, None] * shingles[None, :] + _B[:, None]) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+
+class CloneIndex:
+    def __init__(self):
+        self.signatures = {} # node_id -> signature
+        self.buckets = {} # (band, band hash) -> set of node ids
+        self.links = {} # bucket key -> (head, members linked to it), for buckets with links
+        self.adjacent = {} # node_id -> linked node ids
+        self.edge_counts = {} # (a, b) -> number of buckets linking them
+        self.cluster_of = {} # node_id -> cluster id (only nodes in clusters of 2+)
+        self.members = {} # cluster id -> set of node ids
+        self.info = {} # cluster id -> {"id", "members", "similarity"}
+        self.threshold = None # what the clusters were computed with (None: never)
+        self._next_id = 0
+        self._dirty_keys = set()
+        self._dirty_nodes = set()
+
+    def _band_keys(self, sig):
+        return [(band, sig[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+    def add(self, node_id, tokens):
+        self.remove(node_id)
+        sig = signature(tokens)
+        if sig is None:
+            return
+        self.signatures[node_id] = sig
+        self._dirty_nodes.add(node_id)
+        for key in self._band_keys(sig):
+            self.buckets.setdefault(key, set()).add(node_id)
+            self._dirty_keys.add(key)
+
+    def remove(self, node_id):
+        sig = self.signatures.pop(node_id, None)
+        if sig is None:
+            return
+        self._dirty_nodes.add(node_id)
+        for key in self._band_keys(sig):
+            self._dirty_keys.add(key)
+            members = self.buckets.get(key)
+            if members:
+                members.discard(node_id)
+                if not members:
+                    del self.buckets[key]
+
+    def similarity(self, a, b):
+        """Estimated Jaccard similarity of two indexed functions' shingle sets."""
+        return float(np.mean(self.signatures[a] == self.signatures[b]))
+
+    def _similarities(self, head, node_ids):
+        """Estimated similarity of head to each of node_ids, in one numpy pass."""
+        if len(node_ids) == 1:
+            return [np.count_nonzero(self.signatures[node_ids[0]] == self.signatures[head]) / NUM_HASHES]
+        sigs = np.stack([self.signatures[n] for n in node_ids])
+        return (sigs == self.signatures[head]).mean(axis=1)
+
+    def _verify(self, key, threshold, before):
+        """Re-checks a bucket's links (only its dirty members if its head is unchanged) and applies the difference."""
+        members = self.buckets.get(key)
+        old = self.links.get(key)
+        dirty = members & self._dirty_nodes if members and old is not None else set()
+        if old is not None and members and old[0] in members and old[0] not in dirty and all(_rank(n) > _rank(old[0]) for n in dirty):
+            # Same head (only dirty members can be new to the bucket): the rest keep their links
+            head, linked = old
+            check = sorted(dirty)
+            passed = {n for n, score in zip(check, self._similarities(head, check)) if score >= threshold} if check else set()
+            dropped = linked & self._dirty_nodes
+            linked -= dropped
+            linked |= passed
+            for node_id in dropped - passed:
+                self._link(head, node_id, -1, before)
+            for node_id in passed - dropped:
+                self._link(head, node_id, +1, before)
+            if not linked:
+                del self.links[key]
+            return
+
+        if old is not None:
+            del self.links[key]
+            for node_id in old[1]:
+                self._link(old[0], node_id, -1, before)
+        if not members or len(members) < 2:
+            return
+        head = min(members, key=_rank)
+        check = sorted(members - {head})
+        linked = {n for n, score in zip(check, self._similarities(head, check)) if score >= threshold}
+        if linked:
+            self.links[key] = (head, linked)
+            for node_id in linked:
+                self._link(head, node_id, +1, before)
+
+    def _link(self, a, b, delta, before):
+        pair = (a, b) if a < b else (b, a)
+        count = self.edge_counts.get(pair, 0)
+        before.setdefault(pair, count > 0)
+        if count + delta > 0:
+            self.edge_counts[pair] = count + delta
+        else:
+            self.edge_counts.pop(pair, None)
+        if count == 0 and delta > 0:
+            self.adjacent.setdefault(a, set()).add(b)
+            self.adjacent.setdefault(b, set()).add(a)
+        elif count + delta <= 0 < count:
+            for x, y in ((a, b), (b, a)):
+                neighbours = self.adjacent.get(x)
+                if neighbours is not None:
+                    neighbours.discard(y)
+                    if not neighbours:
+                        del self.adjacent[x]
+
+    def _new_cluster(self, nodes):
+        cluster_id = self._next_id
+        self._next_id += 1
+        self.members[cluster_id] = set(nodes)
+        for node_id in nodes:
+            self.cluster_of[node_id] = cluster_id
+        return cluster_id
+
+    def _dissolve(self, cluster_id, nodes, changed):
+        """Takes nodes out of a cluster (as their own cluster if they still link to each other)."""
+        self.members[cluster_id] -= nodes
+        for node_id in nodes:
+            self.cluster_of.pop(node_id, None)
+        if len(nodes) >= 2:
+            changed.add(self._new_cluster(nodes))
+        if len(self.members[cluster_id]) < 2:
+            for node_id in self.members.pop(cluster_id):
+                self.cluster_of.pop(node_id, None)
+
+    def _split(self, cluster_id, sources, changed):
+        """
+        Splits off the parts of a cluster that lost their links. One search per group of
+        sources (endpoints of lost links known to be connected), expanded in turn; searches
+        that meet are merged. A search that runs out of nodes before meeting the others is
+        a component of its own.
+        """
+        owner = {} # node -> search id
+        parent = {} # search id -> merged into
+        frontier, visited = {}, {}
+        for search, group in enumerate(sorted(sources, key=min)):
+            for node_id in group:
+                owner[node_id] = search
+            parent[search] = search
+            frontier[search], visited[search] = deque(sorted(group)), set(group)
+
+        def find(search):
+            while parent[search] != search:
+                parent[search] = parent[parent[search]]
+                search = parent[search]
+            return search
+
+        queue_order = deque(frontier)
+        live = len(frontier)
+        while live > 1 and queue_order:
+            search = queue_order.popleft()
+            if find(search) != search or not frontier.get(search):
+                continue # Merged into another search, or queued twice and already done
+            node_id = frontier[search].popleft()
+            for neighbour in self.adjacent.get(node_id, ()):
+                other = owner.get(neighbour)
+                if other is None:
+                    owner[neighbour] = search
+                    visited[search].add(neighbour)
+                    frontier[search].append(neighbour)
+                    continue
+                other = find(other)
+                if other != search:
+                    # Met another search: same component, keep the larger one's sets
+                    big, small = (search, other) if len(visited[search]) >= len(visited[other]) else (other, search)
+                    parent[small] = big
+                    visited[big] |= visited.pop(small)
+                    frontier[big].extend(frontier.pop(small))
+                    live -= 1
+                    search = big
+            if frontier[search]:
+                queue_order.append(search)
+            elif live > 1:
+                # Ran out of nodes before meeting the others: a component of its own
+                self._dissolve(cluster_id, visited.pop(search), changed)
+                frontier.pop(search)
+                live -= 1
+
+    def refresh(self, threshold=None):
+        """
+        Brings the clusters up to date with the adds/removes since the last call.
+        Returns the node ids whose cluster id or cluster similarity changed.
+        """
+        threshold = clone_threshold() if threshold is None else threshold
+        touched = set()
+        if threshold != self.threshold:
+            # First run or a new threshold: everything is checked again
+            touched = set(self.cluster_of)
+            self.links, self.adjacent, self.edge_counts = {}, {}, {}
+            self.cluster_of, self.members, self.info = {}, {}, {}
+            self._dirty_keys = [key for key, members in self.buckets.items() if len(members) >= 2]
+            self._dirty_nodes = set(self.signatures)
+            self.threshold = threshold
+        dirty_nodes = self._dirty_nodes
+
+        before = {} # (a, b) -> whether they were linked before this refresh
+        for key in self._dirty_keys:
+            if key in self.links or len(self.buckets.get(key, ())) >= 2: # Most buckets hold one function
+                self._verify(key, threshold, before)
+        self._dirty_keys, self._dirty_nodes = set(), set()
+
+        changed = set() # cluster ids whose membership changed
+        for node_id in dirty_nodes:
+            if node_id not in self.signatures and node_id in self.cluster_of:
+                cluster_id = self.cluster_of.pop(node_id)
+                self.members[cluster_id].discard(node_id)
+                changed.add(cluster_id)
+            elif node_id in self.cluster_of:
+                changed.add(self.cluster_of[node_id]) # The cluster's similarity may have changed
+
+        lost = []
+        joined = {} # union-find over the links added by this refresh
+
+        def root(node_id):
+            while joined.get(node_id, node_id) != node_id:
+                joined[node_id] = joined.get(joined[node_id], joined[node_id])
+                node_id = joined[node_id]
+            return node_id
+
+        for (a, b), was_linked in before.items():
+            is_linked = (a, b) in self.edge_counts
+            if is_linked and not was_linked:
+                root_a, root_b = root(a), root(b)
+                if root_a != root_b:
+                    joined[root_a] = root_b
+                cluster_a, cluster_b = self.cluster_of.get(a), self.cluster_of.get(b)
+                if cluster_a is None and cluster_b is None:
+                    changed.add(self._new_cluster((a, b)))
+                elif cluster_a is None or cluster_b is None:
+                    cluster_id = cluster_a if cluster_b is None else cluster_b
+                    node_id = a if cluster_a is None else b
+                    self.members[cluster_id].add(node_id)
+                    self.cluster_of[node_id] = cluster_id
+                    changed.add(cluster_id)
+                elif cluster_a != cluster_b:
+                    big, small = sorted((cluster_a, cluster_b), key=lambda c: (-len(self.members[c]), c))
+                    moved = self.members.pop(small)
+                    for node_id in moved:
+                        self.cluster_of[node_id] = big
+                    self.members[big] |= moved
+                    changed |= {big, small}
+            elif was_linked and not is_linked:
+                lost += [a, b]
+
+        # Endpoints that new links already connect start as one search (e.g. a bucket whose head changed)
+        sources = {}
+        for node_id in lost:
+            if node_id in self.cluster_of:
+                sources.setdefault(self.cluster_of[node_id], {}).setdefault(root(node_id), set()).add(node_id)
+        for cluster_id, groups in sources.items():
+            changed.add(cluster_id)
+            self._split(cluster_id, list(groups.values()), changed)
+
+        for cluster_id in changed:
+            old = self.info.pop(cluster_id, None)
+            old_members = set(old["members"]) if old is not None else set()
+            if len(self.members.get(cluster_id, ())) < 2:
+                for node_id in self.members.pop(cluster_id, ()):
+                    self.cluster_of.pop(node_id, None)
+                    touched.add(node_id)
+                touched |= old_members
+                continue
+            members = sorted(self.members[cluster_id])
+            info = self.info[cluster_id] = {
+                "id": cluster_id,
+                "members": members,
+                "similarity": round(float(min(self._similarities(members[0], members[1:]))), 3),
+            }
+            if old is None or old["similarity"] != info["similarity"]:
+                touched |= old_members | self.members[cluster_id]
+            else:
+                touched |= old_members ^ self.members[cluster_id] # Only who joined or left
+        return touched
+
+    def clusters(self):
+        """[{"id", "members": [node ids], "similarity": lowest estimate to the representative}], largest first."""
+        return sorted(self.info.values(), key=lambda c: (-len(c["members"]), c["members"][0]))
+
+    def cluster(self, cluster_id):
+        return self.info.get(cluster_id)
+
+    def stats(self):
+        return {"functions": len(self.signatures), "buckets": len(self.buckets), "clusters": len(self.info)}
+
+
+def annotate(archeologist):
+    """Updates the clusters and rewrites clone_group / clone_similarity on the nodes whose cluster changed."""
+    index = archeologist.clone_index
+    touched = index.refresh()
+    for node_id in touched:
+        if node_id not in archeologist.graph:
+            continue
+        data = archeologist.graph.nodes[node_id]
+        cluster_id = index.cluster_of.get(node_id)
+        if cluster_id is None:
+            data.pop('clone_group', None)
+            data.pop('clone_similarity', None)
+        else:
+            data['clone_group'] = cluster_id
+            data['clone_similarity'] = index.info[cluster_id]["similarity"]
+    clusters = archeologist.clones = index.clusters()
+    if touched:
+        archeologist.log(f"   -> {len(clusters)} clone clusters ({len(index.cluster_of)} functions), {len(touched)} functions re-grouped.")
+    return clusters
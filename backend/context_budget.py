@@ -0,0 +1,155 @@
+"""
+Token-budgeted context for the Architect's heal prompt.
+
+Hub functions can have hundreds of callers; sending all of them inflates latency
+and cost without improving the plan. The budgeter keeps the target code whole,
+ranks the graph neighbours by relevance and fills a per-provider token budget:
+
+    callees   (signatures, ranked by how often the target calls them)       20%
+    callers   (call-site snippets, ranked by call count x caller fan-in)    50%
+    similar   (vector DB matches, in similarity order)                      30%
+
+Unused share rolls over to the next section. Callers that don't fit are listed
+by name in one summary line; everything dropped is reported.
+
+    LLM_CONTEXT_BUDGET_TOKENS=6000     (suffix with _GOOGLE, _OPENAI, ... to override)
+"""
+import math
+import os
+import re
+
+# Rough characters per token; tokenizers differ a little per provider family
+CHARS_PER_TOKEN = {
+    "google": 4.0,
+    "openai": 4.0,
+    "deepseek": 4.0,
+    "groq": 4.0,
+    "anthropic": 3.5,
+}
+DEFAULT_BUDGET = 6000
+SHARES = (("callees", 0.2), ("callers", 0.5), ("similar", 0.3))
+MIN_TRIM_TOKENS = 40 # Below this a truncated snippet isn't worth sending
+CALLER_SNIPPET_LINES = 3
+
+
+def estimate_tokens(text, provider=None):
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN.get(provider, 4.0)))
+
+
+def budget_for(provider):
+    value = os.getenv(f"LLM_CONTEXT_BUDGET_TOKENS_{(provider or '').upper()}") or os.getenv("LLM_CONTEXT_BUDGET_TOKENS")
+    return int(value) if value else DEFAULT_BUDGET
+
+
+def _call_count(code, name):
+    return len(re.findall(rf"\b{re.escape(name)}\s*\(", code))
+
+
+def caller_snippet(code, name):
+    """Signature line plus the first lines that call `name`."""
+    lines = code.split("\n")
+    calls = [line for line in lines[1:] if re.search(rf"\b{re.escape(name)}\s*\(", line)]
+    return "\n".join([lines[0]] + [line.rstrip() for line in calls[:CALLER_SNIPPET_LINES]])
+
+
+def rank_callers(graph, node_id, name):
+    """[(caller_id, snippet)] most relevant first: call sites to the target x (1 + log fan-in of the caller)."""
+    ranked = []
+    for caller in graph.predecessors(node_id):
+        code = graph.nodes[caller].get("code", "")
+        calls = max(1, _call_count(code, name))
+        ranked.append((calls * (1 + math.log1p(graph.in_degree(caller))), caller, caller_snippet(code, name)))
+    ranked.sort(key=lambda item: (-item[0], item[1]))
+    return [(caller, snippet) for _, caller, snippet in ranked]
+
+
+def rank_callees(graph, node_id, target_code):
+    """[(callee_id, signature)] most called by the target first."""
+    ranked = []
+    for callee in graph.successors(node_id):
+        code = graph.nodes[callee].get("code", "")
+        calls = _call_count(target_code, callee.split("::")[-1])
+        ranked.append((calls, callee, code.split("\n")[0]))
+    ranked.sort(key=lambda item: (-item[0], item[1]))
+    return [(callee, sig) for _, callee, sig in ranked]
+
+
+class ContextBudgeter:
+    def __init__(self, provider=None, budget=None):
+        self.provider = provider
+        self.budget = budget if budget is not None else budget_for(provider)
+
+    def tokens(self, text):
+        return estimate_tokens(text, self.provider)
+
+    def fit(self, target_code, callers, callees, similar):
+        """
+        callers/callees: ranked [(node_id, text)]; similar: [text].
+        Returns ({"callers": [...], "callees": [...], "similar": [...]} formatted for the prompt, report).
+        """
+        target_tokens = self.tokens(target_code)
+        remaining = max(0, self.budget - target_tokens)
+        items = {
+            "callees": [(c, f"Callee `{c}` defined as: {sig}") for c, sig in callees],
+            "callers": [(c, f"Caller `{c}`:\n{snippet}...") for c, snippet in callers],
+            "similar": [(None, doc) for doc in similar],
+        }
+
+        sections = {}
+        report = {"budget": self.budget, "target_tokens": target_tokens, "over_budget": target_tokens > self.budget,
+                  "kept": {}, "dropped": {}, "trimmed": 0}
+        carry = 0
+        total_share = sum(share for _, share in SHARES)
+        for section, share in SHARES:
+            allowance = int(remaining * share / total_share) + carry
+            kept, dropped, used = [], [], 0
+            for node_id, text in items[section]:
+                cost = self.tokens(text)
+                if used + cost <= allowance:
+                    kept.append(text)
+                    used += cost
+                elif section == "similar" and allowance - used >= MIN_TRIM_TOKENS:
+                    # Style examples still help when cut short
+                    chars = int((allowance - used) * CHARS_PER_TOKEN.get(self.provider, 4.0)) - 20
+                    kept.append(text[:chars] + "\n...(truncated)")
+                    used = allowance
+                    report["trimmed"] += 1
+                else:
+                    dropped.append(node_id or text.split("\n")[0][:60])
+
+            report["kept"][section] = len(kept)
+            if section == "callers" and dropped:
+                summary = self._summarize_dropped(dropped, allowance - used)
+                if summary:
+                    kept.append(summary)
+                    used += self.tokens(summary)
+
+            sections[section] = kept
+            report["dropped"][section] = dropped
+            carry = max(0, allowance - used)
+
+        report["used_tokens"] = target_tokens + sum(self.tokens(t) for texts in sections.values() for t in texts)
+        return sections, report
+
+    def _summarize_dropped(self, dropped, room):
+        """One line naming as many omitted callers as fit (names alone still tell the model the contract is shared)."""
+        header = f"...and {len(dropped)} more callers (omitted for length)"
+        names = []
+        for node_id in dropped:
+            line = f"{header}: {', '.join(names + [node_id])}"
+            if self.tokens(line) > room:
+                break
+            names.append(node_id)
+        return f"{header}: {', '.join(names)}" if names else header
+
+
+def format_report(report):
+    dropped = {k: len(v) for k, v in report["dropped"].items() if v}
+    text = f"{report['used_tokens']}/{report['budget']} tokens"
+    if dropped:
+        text += ", dropped " + ", ".join(f"{n} {section}" for section, n in dropped.items())
+    if report["trimmed"]:
+        text += f", trimmed {report['trimmed']} similar"
+    if report["over_budget"]:
+        text += " (target code alone exceeds the budget)"
+    return text
@@ -2,15 +2,28 @@
 Code Archeologist - Core Engine
 """
 import os
+import threading
 import networkx as nx
 import warnings
 # Suppress the noisy deprecation warning from the legacy library
 warnings.filterwarnings("ignore", category=FutureWarning)
 import google.generativeai as genai
 from dotenv import load_dotenv
-import chromadb
+import chroma_pool
 from languages.manager import ParserManager
 from ai_bridge import UnifiedAIClient
+from llm_resilience import fallback_model_for
+from graph_stream import GraphStreamer
+from call_index import CallSiteIndex
+from lexical_index import LexicalIndex
+from neighbours import NeighbourIndex
+from clones import CloneIndex
+import metrics
+import profiling
+import search_cache
+import vector_index
+import vector_memory
+import worktrees
 
 # Import Pipeline Stages
 from pipeline import (
@@ -34,32 +47,64 @@ class CodeArcheologist:
 
         # Initialize Dependency Graph (Directed)
         self.graph = nx.DiGraph()
-
+        self.file_map = {} # file -> {function name: node id}, built by Phase 2
+        self.call_index = CallSiteIndex() # called name -> call sites, built by Phase 1
+        self.lexical_index = LexicalIndex() # BM25 over names/paths/strings, built by Phase 1
+        self.neighbours = NeighbourIndex() # Vectors behind each node's precomputed `similar` list
+        self.clone_index = CloneIndex() # MinHash signatures of function bodies, built by Phase 1
+        self.clones = [] # Clone clusters of the last analysis/refresh
+        self.ingest_lock = threading.Lock() # Held while Phase 1 rebuilds the graph, or vectors are re-embedded
+        self.graph_version = 0 # Bumped by Phase 1 whenever the graph/indexes change (search cache key)
+        self.search_results = search_cache.LRUCache("result")
+
+        # Progressive graph streaming (server.py attaches the WebSocket sink)
+        self.graph_stream = GraphStreamer()
 
         # Initialize Parser Manager
         self.parser_manager = ParserManager()
 
-        # Initialize ChromaDB (Vector Search)
+        # Initialize ChromaDB (Vector Search), or the embedded index if it can't be reached
         chroma_host = os.getenv("CHROMA_HOST", "localhost")
         chroma_port = os.getenv("CHROMA_PORT", "8000")
-        
-        try:
-            self.log(f"   -> Connecting to ChromaDB at {chroma_host}:{chroma_port}...")
-            self.chroma_client = chromadb.HttpClient(host=chroma_host, port=int(chroma_port))
-            self.collection = self.chroma_client.get_or_create_collection(name="code_knowledge")
-            self.log("   -> Connected to ChromaDB 'code_knowledge' collection.")
-            self.has_memory = True
-        except Exception as e:
-            self.log(f"⚠️  Warning: Could not connect to ChromaDB: {e}")
-            self.has_memory = False
+        vector_backend = os.getenv("VECTOR_BACKEND", "auto").lower()
+        self.has_memory = False
+        self.vector_backend = None
+        self.collection = None # The analysed repo's collection, opened by Phase 1 (vector_memory.py)
+        self.vector_hashes = {} # id -> content hash of the vectors in it
+        self.vector_project = None # Repo the collection belongs to (reopened after a reconnect)
+
+        if vector_backend in ("auto", "chroma"):
+            try:
+                self.log(f"   -> Connecting to ChromaDB at {chroma_host}:{chroma_port}...")
+                # One pooled client per process (chroma_pool.py), not one per analysis
+                self.chroma_client = chroma_pool.pool.connect()
+                self.log("   -> Connected to ChromaDB.")
+                self.has_memory = True
+                self.vector_backend = "chroma"
+            except Exception as e:
+                self.log(f"⚠️  Warning: Could not connect to ChromaDB: {e}")
+                if vector_backend == "chroma":
+                    # No fallback wanted: memory comes back on when the health check reaches the server
+                    self.vector_backend = "chroma"
+            if self.vector_backend == "chroma":
+                chroma_pool.pool.attach(self)
+
+        if not self.has_memory and vector_backend in ("auto", "local"):
+            try:
+                self.chroma_client = vector_index.get_client()
+                self.log(f"   -> Using the local vector index ({self.chroma_client.embedder.name}).")
+                self.has_memory = True
+                self.vector_backend = "local"
+            except Exception as e:
+                self.log(f"⚠️  Warning: Could not open the local vector index: {e}")
 
         # Initialize AI
         arch_model_name = os.getenv("ARCHITECT_MODEL", "gemini-1.5-pro")
         eng_model_name = os.getenv("ENGINEER_MODEL", "gemini-1.5-flash")
         
         try: 
-            self.architect = UnifiedAIClient(arch_model_name)
-            self.engineer = UnifiedAIClient(eng_model_name)
+            self.architect = UnifiedAIClient(arch_model_name, fallback_model=fallback_model_for("architect"))
+            self.engineer = UnifiedAIClient(eng_model_name, fallback_model=fallback_model_for("engineer"))
             
             # Legacy alias
             self.model = self.engineer
@@ -69,11 +114,34 @@ class CodeArcheologist:
             
             self.log(f"   -> AI Architect: {arch_model_name} ({self.architect.provider})") 
             self.log(f"   -> AI Engineer: {eng_model_name} ({self.engineer.provider})")
+            for role, client in (("Architect", self.architect), ("Engineer", self.engineer)):
+                if client.fallback:
+                    self.log(f"   -> {role} fallback: {client.fallback.model_name} ({client.fallback.provider})")
 
         except Exception as e:
             self.log(f"⚠️  Warning: AI initialization failed. Check your API Keys. Error: {e}")
             self.has_ai = False
 
+    def on_vector_health(self, healthy):
+        """
+        Called by chroma_pool's health monitor when ChromaDB goes away or comes back.
+        Reattaching re-embeds whatever was analysed meanwhile, so it runs on its own thread.
+        """
+        if not healthy:
+            self.has_memory = False
+            return
+        threading.Thread(target=self._reattach_vectors, name="vector-reattach", daemon=True).start()
+
+    def _reattach_vectors(self):
+        with self.ingest_lock:
+            # The server may have gone away again while an analysis held the lock
+            if not chroma_pool.pool.healthy:
+                return
+            self.chroma_client = chroma_pool.pool.client
+            self.has_memory = True
+            if self.vector_project is not None:
+                vector_memory.reattach(self)
+
     def log(self, message):
         """Helper to log execution steps. Now simply prints to stdout, which server.py captures."""
         print(message)
@@ -81,48 +149,104 @@ class CodeArcheologist:
     # --- Pipeline Delegation ---
 
     def phase_1_ingest(self, project_path: str):
-        phase_1_ingestion.run(self, project_path)
+        with self.ingest_lock, metrics.track_phase("1_ingestion"), profiling.section("1_ingestion"):
+            phase_1_ingestion.run(self, project_path)
 
     def phase_2_analyze(self):
-        phase_2_analysis.run(self)
-
-    def phase_3_strategy(self, project_path, specific_target=None):
-        return phase_3_strategy.generate_heal_plan(self, project_path, specific_target)
+        with metrics.track_phase("2_analysis"), profiling.section("2_analysis"):
+            phase_2_analysis.run(self)
+        metrics.GRAPH_NODES.set(self.graph.number_of_nodes())
+        metrics.GRAPH_EDGES.set(self.graph.number_of_edges())
+
+    def refresh_files(self, rel_paths, project_path):
+        """
+        Phases 1 & 2 for just these files (after a merge/discard), updating the graph in place.
+        Nothing goes to the graph stream: its history must stay one complete begin..end run.
+        """
+        with self.graph_stream.paused():
+            with self.ingest_lock, metrics.track_phase("1_ingestion"), profiling.section("1_ingestion"):
+                nodes_by_file = phase_1_ingestion.refresh_files(self, project_path, rel_paths)
+            with metrics.track_phase("2_analysis"), profiling.section("2_analysis"):
+                phase_2_analysis.refresh(self, nodes_by_file)
+        metrics.GRAPH_NODES.set(self.graph.number_of_nodes())
+        metrics.GRAPH_EDGES.set(self.graph.number_of_edges())
+
+    def phase_3_strategy(self, project_path, specific_target=None, use_cache=True):
+        with metrics.track_phase("3_strategy"), profiling.section("3_strategy"):
+            return phase_3_strategy.generate_heal_plan(self, project_path, specific_target, use_cache)
+
+    async def aphase_3_strategy(self, project_path, specific_target=None, use_cache=True, on_token=None, on_code_block=None):
+        with metrics.track_phase("3_strategy"):
+            return await phase_3_strategy.agenerate_heal_plan(self, project_path, specific_target, use_cache,
+                                                              on_token, on_code_block)
 
     def phase_4_execution(self, plan_tuple, project_path):
-        return phase_4_execution.run(self, plan_tuple, project_path)
+        with metrics.track_phase("4_execution"), profiling.section("4_execution"):
+            return phase_4_execution.run(self, plan_tuple, project_path)
 
-    def phase_5_propagation(self, old_node_id, new_name, project_path):
-        phase_5_propagation.run(self, old_node_id, new_name, project_path)
+    def phase_4_batch_execution(self, plans, project_path):
+        with metrics.track_phase("4_execution"), profiling.section("4_execution"):
+            return phase_4_execution.run_batch(self, plans, project_path)
+
+    def phase_5_propagation(self, old_node_id, new_name, project_path, renamed=None):
+        with metrics.track_phase("5_propagation"), profiling.section("5_propagation"):
+            return phase_5_propagation.run(self, old_node_id, new_name, project_path, renamed)
 
     # --- Utilities exposed via API ---
     
-    def explain_function(self, node_id):
-        return phase_3_strategy.explain_function(self, node_id)
+    def explain_function(self, node_id, use_cache=True):
+        return phase_3_strategy.explain_function(self, node_id, use_cache)
+
+    async def aexplain_function(self, node_id, use_cache=True, on_token=None):
+        return await phase_3_strategy.aexplain_function(self, node_id, use_cache, on_token)
         
-    def rag_search(self, query):
-        return phase_3_strategy.run_search(self, query)
+    def find_usages(self, node_id):
+        return phase_2_analysis.call_sites_of(self, node_id)
+
+    def rag_search(self, query, n_results=3, mode="hybrid"):
+        return phase_3_strategy.run_search(self, query, n_results, mode)
+
+    def rag_search_batch(self, queries, n_results=3, mode="hybrid"):
+        return phase_3_strategy.run_search_batch(self, queries, n_results, mode)
         
+    def workspace_for(self, branch_name, project_path):
+        """Directory holding a heal's changes: its worktree in safe mode, else the project."""
+        return worktrees.workspace_for(branch_name, project_path)
+
     def get_diff(self, branch_name, project_path):
         return phase_4_execution.get_diff(branch_name, project_path)
         
+    def touched_files(self, branch_name, project_path):
+        return phase_4_execution.touched_files(branch_name, project_path)
+
     def merge_branch(self, branch_name, project_path):
         return phase_4_execution.merge_branch(branch_name, project_path)
         
     def discard_branch(self, branch_name, project_path):
         return phase_4_execution.discard_branch(branch_name, project_path)
 
-    def reset(self):
-        """Wipes the Vector Memory and clears the graph."""
+    def reset(self, wipe_vectors=False):
+        """
+        Clears the graph and indexes. The repo's vectors are kept for the next analysis
+        (unchanged functions aren't embedded again) unless wipe_vectors is set.
+        """
         self.log("⚠️  RESET INITIATED: Wiping System Memory...")
-        if self.has_memory:
+        if wipe_vectors and self.has_memory and self.collection is not None:
             try:
-                self.chroma_client.delete_collection("code_knowledge")
-                self.collection = self.chroma_client.create_collection(name="code_knowledge")
-                self.log("   -> ChromaDB Collection 'code_knowledge' recreated.")
+                self.chroma_client.delete_collection(self.collection.name)
+                self.log(f"   -> Vector collection '{self.collection.name}' deleted ({self.vector_backend}).")
             except Exception as e:
-                self.log(f"   -> Error clearing ChromaDB: {e}")
+                self.log(f"   -> Error clearing the vector memory: {e}")
+            self.collection = None
+        self.vector_hashes = {}
         
         self.graph.clear()
+        self.file_map = {}
+        self.call_index = CallSiteIndex()
+        self.lexical_index = LexicalIndex()
+        self.neighbours = NeighbourIndex()
+        self.clone_index = CloneIndex()
+        self.clones = []
+        self.graph_version += 1
         self.log("   -> Dependency Graph cleared.")
         self.log("✅ System Reset Complete.")
@@ -0,0 +1,127 @@
+"""
+Git service layer used by the heal pipeline (phases 4/5, worktrees, merge/discard).
+
+- Repository setup (init + baseline commit, 'master' -> 'main', commit identity)
+  happens once per repository and is cached, instead of on every heal.
+- The commit identity is passed per command (-c user.name/-c user.email) when
+  neither the repository nor the user has one; global git config is never written.
+- Staging is batched: one `git add` for all files a phase touched.
+- Every git command is timed (archeologist_git_operation_seconds{operation}).
+"""
+import os
+import subprocess
+import threading
+import time
+
+import metrics
+
+MAIN_BRANCH = "main"
+IDENTITY = ("Code Archeologist", "archeologist@system.local")
+
+_repos = {}
+_repos_lock = threading.Lock()
+
+
+class GitError(Exception):
+    pass
+
+
+def run(cwd, *args, config=(), check=True):
+    """Runs one git command in cwd and returns its stdout (text). Timed per operation."""
+    cmd = ["git", *config, *args]
+    start = time.perf_counter()
+    result = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True)
+    metrics.GIT_DURATION.labels(args[0]).observe(time.perf_counter() - start)
+    if check and result.returncode != 0:
+        raise GitError(f"git {' '.join(args)} failed: {(result.stderr or result.stdout).strip()}")
+    return result.stdout
+
+
+def stage(cwd, paths):
+    """One `git add` for all the given paths (relative to cwd)."""
+    paths = sorted(set(paths))
+    if paths:
+        run(cwd, "add", "--", *paths)
+
+
+class GitRepo:
+    def __init__(self, path):
+        self.path = path
+        self.ready = False
+        self._identity = None
+        self._lock = threading.Lock()
+
+    def ensure_ready(self):
+        """Makes sure the repo exists with a 'main' branch. Runs the git commands only once per repo."""
+        git_dir = os.path.join(self.path, ".git")
+        if self.ready and os.path.exists(git_dir):
+            return
+        with self._lock:
+            if self.ready and os.path.exists(git_dir):
+                return
+            if not os.path.exists(git_dir):
+                print("   -> Initializing Git repository for safety...")
+                self._identity = None
+                run(self.path, "init", "-q")
+                run(self.path, "config", "user.email", IDENTITY[1])
+                run(self.path, "config", "user.name", IDENTITY[0])
+                run(self.path, "symbolic-ref", "HEAD", f"refs/heads/{MAIN_BRANCH}") # Enforce main
+                run(self.path, "add", "-A")
+                self.commit("Initial Baseline")
+            elif not self.branch_exists(MAIN_BRANCH) and self.branch_exists("master"):
+                print("   -> Renaming 'master' to 'main' for consistency...")
+                run(self.path, "branch", "-m", "master", MAIN_BRANCH)
+            self.ready = True
+
+    def identity_args(self):
+        """-c overrides for commits, only if the repo (or the user) has no identity configured."""
+        if self._identity is None:
+            configured = run(self.path, "config", "user.email", check=False).strip()
+            self._identity = [] if configured else ["-c", f"user.name={IDENTITY[0]}", "-c", f"user.email={IDENTITY[1]}"]
+        return self._identity
+
+    def branch_exists(self, name):
+        return run(self.path, "rev-parse", "--verify", "-q", f"refs/heads/{name}", check=False).strip() != ""
+
+    def current_branch(self):
+        out = run(self.path, "symbolic-ref", "--short", "-q", "HEAD", check=False).strip()
+        return out or "HEAD"
+
+    def commit(self, message, cwd=None):
+        run(cwd or self.path, "commit", "-q", "-m", message, config=self.identity_args())
+
+    def merge(self, branch_name):
+        run(self.path, "merge", "-q", branch_name, config=self.identity_args())
+
+    def fast_forward(self, branch_name, onto=MAIN_BRANCH):
+        """Moves `onto` to branch_name without touching any checkout (fails if not a fast-forward)."""
+        run(self.path, "fetch", "-q", ".", f"{branch_name}:{onto}")
+
+    def delete_branch(self, branch_name, force=False):
+        run(self.path, "branch", "-D" if force else "-d", branch_name)
+
+    def diff_cached(self, cwd=None):
+        return run(cwd or self.path, "diff", "--cached")
+
+    def changed_files(self, cwd=None):
+        """Paths whose checkout or index differs from HEAD (uncommitted edits), relative to cwd."""
+        return run(cwd or self.path, "diff", "HEAD", "--name-only", "--relative").splitlines()
+
+    def restore(self, paths, cwd=None):
+        """Resets the given paths in the index and the checkout to HEAD."""
+        paths = sorted(set(paths))
+        if paths:
+            run(cwd or self.path, "checkout", "-q", "HEAD", "--", *paths)
+
+    def staged_files(self, cwd=None):
+        """Paths with staged changes, relative to cwd."""
+        return run(cwd or self.path, "diff", "--cached", "--name-only", "--relative").splitlines()
+
+
+def get_repo(path):
+    """Process-wide GitRepo per repository root."""
+    key = os.path.abspath(path)
+    with _repos_lock:
+        if key not in _repos:
+            _repos[key] = GitRepo(key)
+        return _repos[key]
@@ -0,0 +1,89 @@
+"""
+Progressive graph streaming.
+Buffers nodes (Phase 1) and edges (Phase 2) as they are produced and hands
+compact frames to a sink (the /ws/graph WebSocket) so the UI can render the
+graph incrementally instead of waiting for ANALYSIS_COMPLETE.
+
+Frame format (JSON arrays, first element is the frame type):
+    ["b"]                                  -> begin: a new graph is coming, clear the view
+    ["n", [[id, file, complexity], ...]]   -> node batch
+    ["e", [[source, target], ...]]         -> edge batch
+    ["z", node_count, edge_count]          -> end: graph is complete
+    ["r", live]                            -> replay of the latest run finished (sent by server.py on connect)
+"""
+import contextlib
+import json
+import time
+
+BEGIN = "b"
+NODES = "n"
+EDGES = "e"
+END = "z"
+REPLAY_DONE = "r"
+
+
+def encode_frame(*parts):
+    return json.dumps(parts, separators=(',', ':'))
+
+
+class GraphStreamer:
+    def __init__(self, batch_size=200, max_delay=0.25):
+        self.sink = None # Set by server.py; None means nobody is listening
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._nodes = []
+        self._edges = []
+        self._last_flush = time.monotonic()
+
+    def _emit(self, *parts):
+        if self.sink:
+            try:
+                self.sink(encode_frame(*parts))
+            except Exception as e:
+                print(f"   -> Graph stream error: {e}")
+
+    def _due(self, buffer):
+        return len(buffer) >= self.batch_size or (time.monotonic() - self._last_flush) >= self.max_delay
+
+    def begin(self):
+        self._nodes = []
+        self._edges = []
+        self._last_flush = time.monotonic()
+        self._emit(BEGIN)
+
+    def add_node(self, node_id, file, complexity):
+        if not self.sink:
+            return
+        self._nodes.append([node_id, file, complexity])
+        if self._due(self._nodes):
+            self.flush()
+
+    def add_edge(self, source, target):
+        if not self.sink:
+            return
+        self._edges.append([source, target])
+        if self._due(self._edges):
+            self.flush()
+
+    def flush(self):
+        # Nodes always go out before edges so the UI never sees a dangling link
+        if self._nodes:
+            self._emit(NODES, self._nodes)
+            self._nodes = []
+        if self._edges:
+            self._emit(EDGES, self._edges)
+            self._edges = []
+        self._last_flush = time.monotonic()
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Drops frames for the duration: an in-place refresh is not a new graph to stream."""
+        sink, self.sink = self.sink, None
+        try:
+            yield
+        finally:
+            self.sink = sink
+
+    def end(self, node_count, edge_count):
+        self.flush()
+        self._emit(END, node_count, edge_count)
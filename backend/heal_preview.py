@@ -0,0 +1,169 @@
+"""
+Dry-run heals: Phases 4 and 5 computed in memory and returned as a structured diff.
+
+A preview splices the planned code and renames the callers against the files as
+they are in the project, without writing anything or touching git. The result is
+kept so that accepting it writes exactly what was shown: one write per file on a
+heal branch, staged with one `git add` (and committed by the merge that follows).
+If a file changed since the preview, accepting it is refused.
+
+    HEAL_PREVIEW_TTL_SECONDS=1800
+"""
+import difflib
+import os
+import threading
+import time
+import uuid
+
+import git_service
+import metrics
+import worktrees
+from pipeline import phase_4_execution, phase_5_propagation
+
+MAX_PREVIEWS = 50
+DIFF_CONTEXT_LINES = 3
+
+
+class StalePreviewError(Exception):
+    pass
+
+
+def file_hunks(old_text, new_text, context=DIFF_CONTEXT_LINES):
+    """Unified-diff hunks as JSON: [{"old_start", "old_lines", "new_start", "new_lines", "lines": [{"op", "text"}]}]."""
+    old_lines, new_lines = old_text.splitlines(), new_text.splitlines()
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    hunks = []
+    for group in matcher.get_grouped_opcodes(context):
+        first, last = group[0], group[-1]
+        lines = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines += [{"op": " ", "text": line} for line in old_lines[i1:i2]]
+                continue
+            lines += [{"op": "-", "text": line} for line in old_lines[i1:i2]]
+            lines += [{"op": "+", "text": line} for line in new_lines[j1:j2]]
+        hunks.append({
+            "old_start": first[1] + 1, "old_lines": last[2] - first[1],
+            "new_start": first[3] + 1, "new_lines": last[4] - first[3],
+            "lines": lines,
+        })
+    return hunks
+
+
+class HealPreview:
+    def __init__(self, results, files, reports):
+        self.id = uuid.uuid4().hex[:12]
+        self.created = time.monotonic()
+        self.results = results # node_id -> {"status", "new_name", "propagated_to", "propagated_sites", "propagation_failed"}
+        self.files = files # file_rel_path -> (old bytes, new bytes)
+        self.reports = reports # node_id -> Architect report
+
+    def file_diffs(self):
+        diffs = []
+        for file_rel_path, (old, new) in sorted(self.files.items()):
+            if old == new:
+                continue
+            hunks = file_hunks(old.decode("utf-8", "replace"), new.decode("utf-8", "replace"))
+            diffs.append({
+                "file": file_rel_path,
+                "additions": sum(1 for h in hunks for line in h["lines"] if line["op"] == "+"),
+                "deletions": sum(1 for h in hunks for line in h["lines"] if line["op"] == "-"),
+                "hunks": hunks,
+            })
+        return diffs
+
+
+class PreviewStore:
+    """Previews waiting for the user to accept them; expired after HEAL_PREVIEW_TTL_SECONDS."""
+    def __init__(self, max_entries=MAX_PREVIEWS):
+        self.max_entries = max_entries
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def put(self, preview):
+        with self._lock:
+            self._expire()
+            self.entries[preview.id] = preview
+            while len(self.entries) > self.max_entries:
+                self.entries.pop(next(iter(self.entries)))
+
+    def pop(self, preview_id):
+        with self._lock:
+            self._expire()
+            return self.entries.pop(preview_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def _expire(self):
+        ttl = float(os.getenv("HEAL_PREVIEW_TTL_SECONDS", "1800"))
+        now = time.monotonic()
+        for preview_id in [k for k, p in self.entries.items() if now - p.created > ttl]:
+            del self.entries[preview_id]
+
+
+store = PreviewStore()
+
+
+def build(archeologist, plans, project_path):
+    """Phase 4 splices + Phase 5 caller renames for every plan, in memory. Stored for a later apply."""
+    print(f"Dry run: previewing {len(plans)} plan(s)...")
+    results, files = phase_4_execution.preview(archeologist, plans, project_path)
+
+    # Callers are renamed on top of the spliced text (they often live in the same file)
+    contents = {path: new for path, (_, new) in files.items()}
+    renamed = {node_id: r["new_name"] for node_id, r in results.items() if r["status"] == "ready" and r["new_name"]}
+    for node_id, result in results.items():
+        result["propagated_to"] = []
+        result["propagated_sites"] = []
+        result["propagation_failed"] = []
+        if node_id in renamed:
+            sites, failed = phase_5_propagation.rewrite_callers(archeologist, node_id, renamed[node_id], contents, project_path, renamed)
+            result["propagated_to"] = sorted({site["caller"] for site in sites})
+            result["propagated_sites"] = sites
+            result["propagation_failed"] = failed
+            if failed:
+                result["status"] = "partial"
+
+    for path, content in contents.items():
+        if path not in files:
+            with open(os.path.join(project_path, path), "rb") as f:
+                files[path] = (f.read(), None)
+        files[path] = (files[path][0], content)
+
+    preview = HealPreview(results, files, dict(plans))
+    store.put(preview)
+    return preview
+
+
+def apply(archeologist, preview, project_path):
+    """
+    Writes a preview's files on a heal branch (prepare_branch, as a normal heal) and
+    stages them in one go. Returns the branch name (None if nothing changes); raises StalePreviewError if a
+    file no longer matches what the preview was computed from.
+    """
+    changed = {path: contents for path, contents in preview.files.items() if contents[0] != contents[1]}
+    for path, (old, _) in changed.items():
+        try:
+            with open(os.path.join(project_path, path), "rb") as f:
+                current = f.read()
+        except OSError:
+            current = b""
+        if current != old:
+            raise StalePreviewError(f"{path} changed since the preview was made; preview it again.")
+    if not changed:
+        return None
+
+    slug = next(iter(preview.results)).split("::")[-1].replace("_", "-") if len(preview.results) == 1 else f"batch-{len(preview.results)}"
+    branch_name, workdir = phase_4_execution.prepare_branch(archeologist, project_path, slug)
+    for path, (old, new) in changed.items():
+        os.makedirs(os.path.dirname(os.path.join(workdir, path)), exist_ok=True)
+        with open(os.path.join(workdir, path), "wb") as f:
+            f.write(new)
+        # The preview was built on the user's checkout, uncommitted edits included
+        worktrees.record_synced(project_path, workdir, path, old)
+    git_service.stage(workdir, list(changed))
+    metrics.HEALS.labels("applied").inc(sum(1 for r in preview.results.values() if r["status"] in ("ready", "partial")))
+    print(f"   -> Applied preview {preview.id}: {len(changed)} file(s) on {branch_name}.")
+    return branch_name
@@ -0,0 +1,34 @@
+LITERAL_MARKERS = ('string', 'number', 'integer', 'float', 'char', 'literal', 'heredoc')
+IDENTIFIER_MARKERS = ('identifier', 'name')
+
+def body_tokens(fn_node):
+    """
+    The token stream of a function's body with identifiers folded to `$id` and literals
+    to `$lit` (comments dropped), so renamed copies of a function tokenize the same.
+    Keywords and punctuation are kept as they are. Used for clone detection (clones.py).
+    """
+    root = fn_node.child_by_field_name('body') or fn_node
+    tokens = []
+    cursor = root.walk()
+    while True:
+        node = cursor.node
+        kind = node.type
+        descend = False
+        if 'comment' in kind:
+            pass
+        elif node.is_named and any(marker in kind for marker in LITERAL_MARKERS):
+            tokens.append('$lit')
+        elif node.child_count == 0:
+            if node.is_named and any(marker in kind for marker in IDENTIFIER_MARKERS):
+                tokens.append('$id')
+            elif node.is_named:
+                tokens.append(kind)
+            else:
+                tokens.append(node.text.decode('utf-8', 'replace'))
+        else:
+            descend = True
+        if descend and cursor.goto_first_child():
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent() or cursor.node == root:
+                return tokens
@@ -0,0 +1,22 @@
+NAME_TYPES = ('identifier', 'property_identifier', 'name')
+NAME_FIELDS = ('attribute', 'property', 'name')
+
+def call_site(call_node):
+    """
+    (call text, start_byte, end_byte) for a captured call expression, where the byte
+    range covers just the called name: `g` in `m.g(...)`, `h` in `\\Foo\\h()`.
+    None for calls without a name to rename (e.g. `x[0]()`).
+    """
+    target = call_node
+    while target.type not in NAME_TYPES:
+        child = None
+        for field in NAME_FIELDS:
+            child = target.child_by_field_name(field)
+            if child is not None:
+                break
+        if child is None and target.type == 'qualified_name':
+            child = target.named_children[-1] if target.named_children else None
+        if child is None:
+            return None
+        target = child
+    return (call_node.text.decode('utf-8'), target.start_byte, target.end_byte)
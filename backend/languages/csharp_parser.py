@@ -1,5 +1,7 @@
 from tree_sitter import Language, Parser, Query, QueryCursor
 import tree_sitter_c_sharp
+from .call_sites import call_site
+from .body_tokens import body_tokens
 
 class CSharpParser:
     def __init__(self):
@@ -12,7 +14,7 @@ class CSharpParser:
         self.parser = Parser()
         self.parser.language = self.language
 
-    def parse(self, code_bytes):
+    def parse(self, code_bytes, with_body_tokens=False):
         definitions = []
         file_imports = []
         
@@ -92,6 +94,7 @@ class CSharpParser:
 
             # Local Calls
             calls = []
+            call_sites = []
             if query_call:
                 call_cursor = QueryCursor(query_call)
                 call_cursor.set_point_range(fn_node.start_point, fn_node.end_point)
@@ -110,6 +113,7 @@ class CSharpParser:
                 for c_node in iter_captures:
                     c_name = code_bytes[c_node.start_byte:c_node.end_byte].decode('utf-8')
                     calls.append(c_name)
+                    call_sites.append(call_site(c_node))
             
             definitions.append({
                 'name': func_name,
@@ -119,7 +123,9 @@ class CSharpParser:
                 'start_byte': fn_node.start_byte,
                 'end_byte': fn_node.end_byte,
                 'complexity': complexity,
-                'calls': calls
+                'calls': calls,
+                'call_sites': [site for site in call_sites if site],
+                'body_tokens': body_tokens(fn_node) if with_body_tokens else None
             })
             
         return definitions
@@ -1,5 +1,7 @@
 from tree_sitter import Language, Parser, Query, QueryCursor
 import tree_sitter_java
+from .call_sites import call_site
+from .body_tokens import body_tokens
 
 class JavaParser:
     def __init__(self):
@@ -7,7 +9,7 @@ class JavaParser:
         self.parser = Parser()
         self.parser.language = self.language
 
-    def parse(self, code_bytes):
+    def parse(self, code_bytes, with_body_tokens=False):
         definitions = []
         file_imports = []
         
@@ -67,6 +69,7 @@ class JavaParser:
                 complexity = len(cc_captures) + 1
 
             calls = []
+            call_sites = []
             if query_call:
                 call_cursor = QueryCursor(query_call)
                 call_cursor.set_point_range(fn_node.start_point, fn_node.end_point)
@@ -77,11 +80,13 @@ class JavaParser:
                      for c_node in call_nodes:
                         c_name = code_bytes[c_node.start_byte:c_node.end_byte].decode('utf-8')
                         calls.append(c_name)
+                        call_sites.append(call_site(c_node))
                 elif isinstance(call_captures, list):
                      for capture in call_captures:
                         c_node = capture[0]
                         c_name = code_bytes[c_node.start_byte:c_node.end_byte].decode('utf-8')
                         calls.append(c_name)
+                        call_sites.append(call_site(c_node))
             
             definitions.append({
                 'name': func_name,
@@ -91,7 +96,9 @@ class JavaParser:
                 'start_byte': fn_node.start_byte,
                 'end_byte': fn_node.end_byte,
                 'complexity': complexity,
-                'calls': calls
+                'calls': calls,
+                'call_sites': [site for site in call_sites if site],
+                'body_tokens': body_tokens(fn_node) if with_body_tokens else None
             })
             
         return definitions
@@ -1,6 +1,8 @@
 from tree_sitter import Language, Parser, Query, QueryCursor
 import tree_sitter_javascript
 import re
+from .call_sites import call_site
+from .body_tokens import body_tokens
 
 class JavascriptParser:
     def __init__(self):
@@ -8,7 +10,7 @@ class JavascriptParser:
         self.parser = Parser()
         self.parser.language = self.language
 
-    def parse(self, code_bytes):
+    def parse(self, code_bytes, with_body_tokens=False):
         definitions = []
         file_imports = []
         
@@ -94,6 +96,7 @@ class JavascriptParser:
                 
                 # Calls
                 local_calls = []
+                call_sites = []
                 if query_call:
                     cursor_calls = QueryCursor(query_call)
                     captures_calls = cursor_calls.captures(func_def_node)
@@ -101,6 +104,7 @@ class JavascriptParser:
                     if 'call.full' in captures_calls:
                          for call_node in captures_calls['call.full']:
                              local_calls.append(call_node.text.decode('utf-8'))
+                             call_sites.append(call_site(call_node))
 
                 definitions.append({
                     'name': node.text.decode('utf-8'),
@@ -108,6 +112,8 @@ class JavascriptParser:
                     'end_byte': func_def_node.end_byte,
                     'complexity': complexity,
                     'calls': local_calls,
+                    'call_sites': [site for site in call_sites if site],
+                    'body_tokens': body_tokens(func_def_node) if with_body_tokens else None,
                     'imports': file_imports
                 })
 
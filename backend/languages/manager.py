@@ -15,7 +15,8 @@ class ParserManager:
             'csharp': CSharpParser()
         }
     
-    def parse(self, code_bytes, lang):
+    def parse(self, code_bytes, lang, with_body_tokens=False):
+        """Function definitions in code_bytes; with_body_tokens adds each body's normalised tokens (clone detection)."""
         if lang in self.parsers:
-             return self.parsers[lang].parse(code_bytes)
+             return self.parsers[lang].parse(code_bytes, with_body_tokens)
         return []
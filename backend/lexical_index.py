@@ -0,0 +1,102 @@
+"""
+Lexical (keyword) index over the ingested functions, for hybrid search.
+
+Phase 1 adds every function as a small document made of its name (whole and split
+into sub-tokens: `syncWithLegacy_v1` -> sync, with, legacy, v, 1), its file path
+and the words of its string literals. The name counts NAME_WEIGHT times, so a query
+for `check permissions` ranks `check_permissions` above functions that only print
+"permission denied". Scoring is Okapi BM25 over an in-memory inverted index.
+
+An exact function name is answered straight from the name map, without BM25 or
+an embedding (see phase_3_strategy.run_search).
+"""
+import math
+import re
+
+from vector_index import split_identifier
+
+NAME_WEIGHT = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+STRING_RE = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`')
+
+
+def terms(text):
+    """Query/document terms: each identifier lowercased, plus its sub-tokens."""
+    out = []
+    for identifier in IDENTIFIER_RE.findall(text or ""):
+        whole = identifier.lower()
+        out.append(whole)
+        parts = split_identifier(identifier)
+        if parts != [whole]:
+            out += parts
+    return out
+
+
+def string_literals(code):
+    return [literal[1:-1] for literal in STRING_RE.findall(code or "")]
+
+
+class LexicalIndex:
+    def __init__(self):
+        self.docs = {} # node_id -> {term: frequency}
+        self.lengths = {} # node_id -> document length
+        self.postings = {} # term -> {node_id: frequency}
+        self.names = {} # function name (lowercase) -> set of node ids
+        self.total_length = 0
+
+    def add(self, node_id, rel_path, name, code):
+        """Indexes (or re-indexes) one function."""
+        self.remove(node_id)
+        frequencies = {}
+        for term in terms(name) * NAME_WEIGHT + terms(rel_path) + terms(" ".join(string_literals(code))):
+            frequencies[term] = frequencies.get(term, 0) + 1
+        for term, frequency in frequencies.items():
+            self.postings.setdefault(term, {})[node_id] = frequency
+        self.docs[node_id] = frequencies
+        self.lengths[node_id] = length = sum(frequencies.values())
+        self.total_length += length
+        self.names.setdefault(name.lower(), set()).add(node_id)
+
+    def remove(self, node_id):
+        frequencies = self.docs.pop(node_id, None)
+        if frequencies is None:
+            return
+        for term in frequencies:
+            postings = self.postings[term]
+            del postings[node_id]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(node_id)
+        name = node_id.split("::")[-1].lower()
+        ids = self.names.get(name)
+        if ids:
+            ids.discard(node_id)
+            if not ids:
+                del self.names[name]
+
+    def lookup(self, name):
+        """Node ids of the functions called exactly `name` (case-insensitive)."""
+        return sorted(self.names.get(name.lower(), ()))
+
+    def search(self, query, n_results=10):
+        """[(node_id, BM25 score)], best first."""
+        if not self.docs:
+            return []
+        doc_count = len(self.docs)
+        average_length = self.total_length / doc_count
+        scores = {}
+        for term in set(terms(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for node_id, frequency in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[node_id] / average_length)
+                scores[node_id] = scores.get(node_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:n_results]
+
+    def stats(self):
+        return {"documents": len(self.docs), "terms": len(self.postings)}
@@ -0,0 +1,126 @@
+"""
+Content-addressed LLM response cache.
+Keyed by sha256(provider, model, prompt), stored in SQLite so it survives restarts.
+Entries expire after a TTL and the least recently used ones are evicted past a size bound.
+
+    LLM_CACHE_ENABLED=1
+    LLM_CACHE_PATH=~/.cache/code-archeologist/llm_cache.sqlite3
+    LLM_CACHE_TTL_SECONDS=604800      (7 days)
+    LLM_CACHE_MAX_ENTRIES=5000
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "code-archeologist", "llm_cache.sqlite3")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def cache_key(provider, model_name, prompt):
+    digest = hashlib.sha256()
+    for part in (provider, model_name, prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, path=None, ttl=None, max_entries=None):
+        self.path = path or os.getenv("LLM_CACHE_PATH") or DEFAULT_PATH
+        self.ttl = ttl if ttl is not None else float(os.getenv("LLM_CACHE_TTL_SECONDS", "604800"))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        try:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+        except Exception as e:
+            print(f"⚠️  Warning: LLM cache at {self.path} unavailable ({e}). Using an in-memory cache.")
+            self.path = ":memory:"
+            self.db = sqlite3.connect(":memory:", check_same_thread=False)
+
+        with self._lock:
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self.db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)")
+            self.db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self.db.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl and now - row[1] > self.ttl:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.db.commit()
+                row = None
+            if row:
+                self.db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self.db.commit()
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        metrics.LLM_CACHE.labels("hit" if row else "miss").inc()
+        return row[0] if row else None
+
+    def put(self, key, text):
+        now = time.time()
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, text, created, last_access) VALUES (?, ?, ?, ?)",
+                (key, text, now, now)
+            )
+            excess = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.db.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (excess,)
+                )
+            self.db.commit()
+
+    def clear(self):
+        with self._lock:
+            self.db.execute("DELETE FROM responses")
+            self.db.commit()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+def get_cache():
+    """Process-wide cache shared by the Architect and the Engineer, or None if disabled."""
+    global _cache
+    if os.getenv("LLM_CACHE_ENABLED", "1").lower() in ("0", "false", "no"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+        return _cache
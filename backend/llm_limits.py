@@ -0,0 +1,105 @@
+"""
+Per-provider concurrency and rate limits for async LLM calls.
+
+Every provider gets one process-wide limiter (shared by the Architect and the
+Engineer when they use the same provider):
+- a semaphore capping in-flight requests
+- a tokens-per-minute bucket, so bursts of /explain or /heal don't trip provider 429s
+
+asyncio primitives belong to the loop that first waits on them, so the semaphore and
+the bucket's lock are created per running loop (the server's, or one asyncio.run in a
+script); the token budget itself is shared.
+
+Configuration (provider-specific values win over the global default):
+    LLM_MAX_CONCURRENCY=4            LLM_MAX_CONCURRENCY_GOOGLE=8
+    LLM_TOKENS_PER_MINUTE=0          LLM_TOKENS_PER_MINUTE_OPENAI=90000     (0 = unlimited)
+"""
+import asyncio
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+import metrics
+from local_llm import estimate_tokens
+
+_limiters = {}
+
+
+def provider_setting(name, provider, default):
+    """NAME_<PROVIDER> if set, else NAME, else default (as a float). Shared with llm_resilience.py."""
+    value = os.getenv(f"{name}_{provider.upper()}") or os.getenv(name)
+    return float(value) if value else default
+
+
+def per_loop(primitives, create):
+    """The running loop's entry in primitives ({loop: primitive}), created on first use."""
+    loop = asyncio.get_running_loop()
+    primitive = primitives.get(loop)
+    if primitive is None:
+        primitive = primitives[loop] = create()
+    return primitive
+
+
+class TokenBucket:
+    """Refills continuously at tokens_per_minute / 60 per second; may go into debt for long responses."""
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.tokens = tokens_per_minute
+        self.updated = time.monotonic()
+        self._locks = weakref.WeakKeyDictionary() # event loop -> asyncio.Lock
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    async def acquire(self, tokens):
+        tokens = min(tokens, self.capacity) # A single oversized prompt must still go through eventually
+        async with per_loop(self._locks, asyncio.Lock): # FIFO: one waiter refills at a time
+            while True:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) * 60 / self.capacity)
+
+    def debit(self, tokens):
+        """Charges tokens after the fact (the response), without waiting."""
+        self._refill()
+        self.tokens -= tokens
+
+
+class ProviderLimiter:
+    def __init__(self, provider):
+        self.provider = provider
+        self.max_concurrency = int(provider_setting("LLM_MAX_CONCURRENCY", provider, 4))
+        tpm = provider_setting("LLM_TOKENS_PER_MINUTE", provider, 0)
+        self._semaphores = weakref.WeakKeyDictionary() # event loop -> asyncio.Semaphore
+        self.bucket = TokenBucket(tpm) if tpm > 0 else None
+
+    @asynccontextmanager
+    async def slot(self, prompt):
+        """Waits for a concurrency slot and enough token budget for the prompt."""
+        start = time.perf_counter()
+        async with per_loop(self._semaphores, lambda: asyncio.Semaphore(self.max_concurrency)):
+            if self.bucket:
+                await self.bucket.acquire(estimate_tokens(prompt))
+            metrics.LLM_QUEUE_WAIT.labels(self.provider).observe(time.perf_counter() - start)
+            metrics.LLM_IN_FLIGHT.labels(self.provider).inc()
+            try:
+                yield self
+            finally:
+                metrics.LLM_IN_FLIGHT.labels(self.provider).dec()
+
+    def charge_response(self, text):
+        if self.bucket and text:
+            self.bucket.debit(estimate_tokens(text))
+
+
+def get_limiter(provider):
+    """Created lazily; usable from any event loop (see per_loop)."""
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        limiter = _limiters[provider] = ProviderLimiter(provider)
+    return limiter
@@ -0,0 +1,314 @@
+"""
+Resilience for LLM calls: retries, deadlines, hedged requests and circuit breakers.
+
+UnifiedAIClient runs every provider call through this module:
+- Retryable errors (429, 5xx, timeouts, dropped connections) are retried with
+  exponential backoff and full jitter, within an overall per-call deadline.
+- Hedging (opt-in, it can double token spend): if the first attempt is slower than
+  this provider's recent p95, a duplicate is sent and whichever finishes first wins.
+- A circuit breaker per model opens after consecutive failures; while it is open,
+  calls go straight to the fallback model (e.g. Groq while Gemini is degraded).
+
+Configuration (provider-specific values win, like llm_limits.py):
+    LLM_MAX_RETRIES=2                 LLM_BACKOFF_BASE_SECONDS=0.5   LLM_BACKOFF_MAX_SECONDS=8
+    LLM_DEADLINE_SECONDS=120          (whole call, retries included; 0 = none)
+    LLM_HEDGE=0                       LLM_HEDGE_DELAY_MS=0 (0 = use the observed p95)
+    LLM_BREAKER_FAILURES=5            LLM_BREAKER_COOLDOWN_SECONDS=30
+    ARCHITECT_FALLBACK_MODEL=         ENGINEER_FALLBACK_MODEL=       (LLM_FALLBACK_MODEL for both)
+"""
+import asyncio
+import collections
+import os
+import random
+import threading
+import time
+
+import metrics
+from llm_limits import provider_setting
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+# SDK exception class names that mean "try again" when no status code is attached
+RETRYABLE_NAMES = ("Timeout", "RateLimit", "Connection", "ServiceUnavailable", "ResourceExhausted",
+                   "DeadlineExceeded", "InternalServer", "Overloaded")
+HEDGE_MIN_SAMPLES = 20
+
+_breakers = {}
+_latencies = {}
+_registry_lock = threading.Lock()
+
+
+class CallDeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, model_name):
+        self.model_name = model_name
+        super().__init__(f"Circuit breaker for '{model_name}' is open (model degraded)")
+
+
+def is_retryable(error):
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    return any(name in type(error).__name__ for name in RETRYABLE_NAMES)
+
+
+class RetryPolicy:
+    def __init__(self, provider):
+        self.max_retries = int(provider_setting("LLM_MAX_RETRIES", provider, 2))
+        self.backoff_base = provider_setting("LLM_BACKOFF_BASE_SECONDS", provider, 0.5)
+        self.backoff_max = provider_setting("LLM_BACKOFF_MAX_SECONDS", provider, 8)
+        self.deadline = provider_setting("LLM_DEADLINE_SECONDS", provider, 120)
+        self.hedge = provider_setting("LLM_HEDGE", provider, 0) > 0
+        self.hedge_delay = provider_setting("LLM_HEDGE_DELAY_MS", provider, 0) / 1000
+
+    def backoff(self, attempt):
+        """Full jitter: uniform in [0, min(max, base * 2^attempt)]."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def expires_at(self):
+        return time.monotonic() + self.deadline if self.deadline > 0 else None
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for the hedging delay."""
+    def __init__(self, size=200):
+        self.samples = collections.deque(maxlen=size)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def p95(self):
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class CircuitBreaker:
+    """closed -> (N consecutive failures) -> open -> (cooldown) -> half-open -> one trial call."""
+    def __init__(self, provider, model_name):
+        self.provider = provider
+        self.model_name = model_name
+        self.threshold = int(provider_setting("LLM_BREAKER_FAILURES", provider, 5))
+        self.cooldown = provider_setting("LLM_BREAKER_COOLDOWN_SECONDS", provider, 30)
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+        metrics.LLM_CIRCUIT_OPEN.labels(self.provider, self.model_name).set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            reopen = self.trial_running or (self.opened_at is None and self.failures >= self.threshold)
+            self.trial_running = False
+            if reopen:
+                self.opened_at = time.monotonic()
+        if reopen:
+            print(f"   ⚠️ LLM model '{self.model_name}' ({self.provider}) degraded: circuit open for {self.cooldown:.0f}s.")
+            metrics.LLM_CIRCUIT_OPEN.labels(self.provider, self.model_name).set(1)
+
+
+def get_breaker(provider, model_name):
+    with _registry_lock:
+        key = (provider, model_name)
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(provider, model_name)
+        return _breakers[key]
+
+
+def get_latency(provider, model_name):
+    with _registry_lock:
+        key = (provider, model_name)
+        if key not in _latencies:
+            _latencies[key] = LatencyTracker()
+        return _latencies[key]
+
+
+def _remaining(expires_at):
+    if expires_at is None:
+        return None
+    remaining = expires_at - time.monotonic()
+    if remaining <= 0:
+        raise CallDeadlineExceeded("LLM call deadline exceeded")
+    return remaining
+
+
+def call_with_retries(provider, model_name, call):
+    """Sync calls: retries and breaker only (the SDK call itself can't be interrupted or hedged)."""
+    policy = RetryPolicy(provider)
+    breaker = get_breaker(provider, model_name)
+    expires_at = policy.expires_at()
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(model_name)
+        start = time.monotonic()
+        try:
+            result = call()
+        except Exception as e:
+            delay = _retry_delay(e, breaker, provider, attempt, policy, expires_at)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        get_latency(provider, model_name).add(time.monotonic() - start)
+        return result
+
+
+async def acall_with_retries(provider, model_name, make_call):
+    """
+    Async calls: make_call() returns a fresh coroutine per attempt.
+    Each attempt is bounded by what is left of the deadline and may be hedged.
+    """
+    policy = RetryPolicy(provider)
+    breaker = get_breaker(provider, model_name)
+    latency = get_latency(provider, model_name)
+    expires_at = policy.expires_at()
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(model_name)
+        timeout = _remaining(expires_at)
+        hedge_after = (policy.hedge_delay or latency.p95()) if policy.hedge else None
+        start = time.monotonic()
+        try:
+            if hedge_after:
+                result = await asyncio.wait_for(_hedged(provider, make_call, hedge_after), timeout)
+            else:
+                result = await asyncio.wait_for(make_call(), timeout)
+        except Exception as e:
+            if expires_at is not None and time.monotonic() >= expires_at:
+                breaker.record_failure()
+                raise CallDeadlineExceeded(f"LLM call deadline of {policy.deadline:.0f}s exceeded") from e
+            delay = _retry_delay(e, breaker, provider, attempt, policy, expires_at)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        latency.add(time.monotonic() - start)
+        return result
+
+
+async def astream_with_retries(provider, model_name, make_stream):
+    """
+    Streams: make_stream() returns a fresh async generator per attempt. Retries and the
+    deadline only apply until the first chunk arrives; once text has reached the caller,
+    a failure is raised as is (it can't be taken back).
+    """
+    policy = RetryPolicy(provider)
+    breaker = get_breaker(provider, model_name)
+    expires_at = policy.expires_at()
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(model_name)
+        timeout = _remaining(expires_at)
+        start = time.monotonic()
+        stream = make_stream()
+        try:
+            first = await asyncio.wait_for(stream.__anext__(), timeout)
+            break
+        except StopAsyncIteration:
+            breaker.record_success()
+            return
+        except Exception as e:
+            await stream.aclose()
+            if expires_at is not None and time.monotonic() >= expires_at:
+                breaker.record_failure()
+                raise CallDeadlineExceeded(f"LLM call deadline of {policy.deadline:.0f}s exceeded") from e
+            delay = _retry_delay(e, breaker, provider, attempt, policy, expires_at)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    try:
+        yield first
+        async for chunk in stream:
+            yield chunk
+    except Exception as e:
+        if is_retryable(e):
+            breaker.record_failure()
+        raise
+    finally:
+        await stream.aclose()
+    breaker.record_success()
+    get_latency(provider, model_name).add(time.monotonic() - start)
+
+
+def _retry_delay(error, breaker, provider, attempt, policy, expires_at):
+    """Backoff before the next attempt, or None if the error should be raised."""
+    if not is_retryable(error):
+        # The provider answered (e.g. 400 bad request): not a health problem
+        breaker.record_success()
+        return None
+    breaker.record_failure()
+    delay = policy.backoff(attempt)
+    if attempt >= policy.max_retries or (expires_at is not None and time.monotonic() + delay >= expires_at):
+        return None
+    metrics.LLM_RETRIES.labels(provider, type(error).__name__).inc()
+    print(f"   -> LLM call to '{provider}' failed ({error}). Retrying ({attempt + 1}/{policy.max_retries})...")
+    return delay
+
+
+async def _hedged(provider, make_call, delay):
+    """Starts a duplicate request if the first one hasn't finished after `delay` seconds."""
+    tasks = [asyncio.ensure_future(make_call())]
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return tasks[0].result()
+
+        metrics.LLM_HEDGES.labels(provider, "sent").inc()
+        tasks.append(asyncio.ensure_future(make_call()))
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is tasks[1]:
+                        metrics.LLM_HEDGES.labels(provider, "won").inc()
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def fallback_model_for(role):
+    """Fallback model name for the 'architect' or 'engineer' client, or None."""
+    return os.getenv(f"{role.upper()}_FALLBACK_MODEL") or os.getenv("LLM_FALLBACK_MODEL") or None
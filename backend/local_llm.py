@@ -0,0 +1,154 @@
+"""
+Offline LLM provider for load testing and benchmarking.
+Selected with ARCHITECT_MODEL/ENGINEER_MODEL=local (or any "local-*" name).
+
+Responses are derived from the code in the prompt, so the same prompt always
+gets the same answer and phases 3-5 behave exactly as with a real provider.
+Simulated latency, token rate and failure rate are configurable:
+
+    LOCAL_LLM_LATENCY_MS      fixed time-to-first-token (default 0)
+    LOCAL_LLM_TOKENS_PER_SEC  output rate; 0 = instant (default 0)
+    LOCAL_LLM_FAILURE_RATE    probability in [0, 1] of a simulated 429/503 (default 0)
+    LOCAL_LLM_SEED            seed for the failure sequence (default 0)
+"""
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+
+CODE_BLOCK_RE = re.compile(r"```[a-zA-Z]*\s*\n(.*?)\n\s*```", re.DOTALL)
+FILE_RE = re.compile(r"from file `([^`]+)`")
+DEF_RES = (
+    re.compile(r"(\bdef\s+)([A-Za-z_]\w*)(\s*\()"),
+    re.compile(r"(\bfunction\s+)([A-Za-z_$][\w$]*)(\s*\()"),
+    re.compile(r"(\b(?:public|private|protected|internal|static|\s)+[\w<>\[\],\s]*?\s)([A-Za-z_]\w*)(\s*\()"),
+)
+BRANCH_RE = re.compile(r"\b(if|elif|else if|for|foreach|while|case|catch|except)\b")
+STREAM_CHUNK_RE = re.compile(r"\S*\s*") # word + trailing whitespace, roughly one token each
+CALL_RE = re.compile(r"([A-Za-z_][\w.]*)\s*\(")
+KEYWORDS = {"if", "for", "while", "switch", "catch", "return", "def", "function", "print", "elif", "foreach"}
+# Phase 4 only recognises these fence labels; anything else gets a bare fence
+FENCE_LANGS = {".py": "python", ".js": "javascript", ".ts": "typescript"}
+
+
+class SimulatedProviderError(Exception):
+    """Raised for simulated failures; status_code mirrors what real providers send."""
+    def __init__(self, status_code):
+        self.status_code = status_code
+        super().__init__(f"Simulated provider error {status_code} (LOCAL_LLM_FAILURE_RATE)")
+
+
+class LocalLLMClient:
+    def __init__(self, model_name="local", latency_ms=None, tokens_per_sec=None, failure_rate=None, seed=None):
+        self.model_name = model_name
+        self.latency = (latency_ms if latency_ms is not None else float(os.getenv("LOCAL_LLM_LATENCY_MS", "0"))) / 1000
+        self.tokens_per_sec = tokens_per_sec if tokens_per_sec is not None else float(os.getenv("LOCAL_LLM_TOKENS_PER_SEC", "0"))
+        self.failure_rate = failure_rate if failure_rate is not None else float(os.getenv("LOCAL_LLM_FAILURE_RATE", "0"))
+        self._rng = random.Random(seed if seed is not None else int(os.getenv("LOCAL_LLM_SEED", "0")))
+        self._lock = threading.Lock()
+
+    def _roll(self):
+        with self._lock:
+            fail = self._rng.random() < self.failure_rate
+            status = self._rng.choice((429, 503))
+        return SimulatedProviderError(status) if fail else None
+
+    def generate(self, prompt):
+        error = self._roll()
+        if self.latency:
+            time.sleep(self.latency)
+        if error:
+            raise error
+
+        text = self.respond(prompt)
+        if self.tokens_per_sec:
+            time.sleep(estimate_tokens(text) / self.tokens_per_sec)
+        return text
+
+    async def agenerate(self, prompt):
+        error = self._roll()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if error:
+            raise error
+
+        text = self.respond(prompt)
+        if self.tokens_per_sec:
+            await asyncio.sleep(estimate_tokens(text) / self.tokens_per_sec)
+        return text
+
+    async def astream(self, prompt):
+        """Same answer as agenerate, yielded a few tokens at a time at the simulated rate."""
+        error = self._roll()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if error:
+            raise error
+
+        text = self.respond(prompt)
+        for chunk in STREAM_CHUNK_RE.findall(text):
+            if not chunk:
+                continue
+            if self.tokens_per_sec:
+                await asyncio.sleep(estimate_tokens(chunk) / self.tokens_per_sec)
+            yield chunk
+
+    def respond(self, prompt):
+        """The deterministic answer, without any simulated latency or failures."""
+        code_match = CODE_BLOCK_RE.search(prompt)
+        code = code_match.group(1).strip() if code_match else ""
+
+        if "Refactor the Legacy Function" in prompt and code:
+            return self._refactor(prompt, code)
+        if prompt.lstrip().startswith("Explain") and code:
+            return self._explain(code)
+        return f"Local model received {len(prompt)} characters ({estimate_tokens(prompt)} tokens)."
+
+    def _refactor(self, prompt, code):
+        file_match = FILE_RE.search(prompt)
+        ext = os.path.splitext(file_match.group(1))[1] if file_match else ".py"
+        fence = FENCE_LANGS.get(ext, "")
+
+        refactored = code
+        old_name = None
+        for pattern in DEF_RES:
+            m = pattern.search(code)
+            if m:
+                old_name = m.group(2)
+                new_name = old_name if old_name.endswith("_refactored") else f"{old_name}_refactored"
+                refactored = code[:m.start(2)] + new_name + code[m.end(2):]
+                break
+
+        lines = refactored.splitlines()
+        report = [
+            "## Analysis",
+            f"- `{old_name or 'function'}` spans {len(lines)} lines with {len(BRANCH_RE.findall(code))} branch points.",
+            "- Renamed for clarity; behaviour and signature are unchanged.",
+            "",
+            "## Refactored Code",
+            f"```{fence}",
+            refactored,
+            "```"
+        ]
+        return "\n".join(report)
+
+    def _explain(self, code):
+        first = code.splitlines()[0].strip() if code else ""
+        calls = []
+        for name in CALL_RE.findall(code):
+            short = name.split(".")[-1]
+            if short not in KEYWORDS and name not in calls and name not in first:
+                calls.append(name)
+        branches = len(BRANCH_RE.findall(code))
+        calls_text = ", ".join(f"`{c}`" for c in calls[:5]) if calls else "no other functions"
+        return (
+            f"`{first}` is a {len(code.splitlines())}-line function with {branches} branch points that calls {calls_text}. "
+            f"{'Its branching makes it risky to change without tests.' if branches > 5 else 'Its control flow is straightforward.'}"
+        )
+
+
+def estimate_tokens(text):
+    # ~4 characters per token is the usual rule of thumb for code and English
+    return max(1, len(text) // 4)
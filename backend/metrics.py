@@ -0,0 +1,123 @@
+"""
+Code Archeologist - Instrumentation
+Process-wide Prometheus counters/histograms, exposed by server.py on /metrics.
+Recording is a lock + float add, so it costs next to nothing when nobody scrapes.
+"""
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Buckets tuned for "whole pipeline phase" and "LLM round-trip" scales
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# Buckets tuned for per-file parsing and single vector DB calls
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# --- Pipeline ---
+PHASE_DURATION = Histogram(
+    "archeologist_phase_duration_seconds",
+    "Wall time spent in each pipeline phase.",
+    ["phase"], buckets=SLOW_BUCKETS
+)
+PHASE_ERRORS = Counter(
+    "archeologist_phase_errors_total",
+    "Pipeline phases that raised an exception.",
+    ["phase"]
+)
+
+# --- Phase 1: Parsing ---
+PARSE_DURATION = Histogram(
+    "archeologist_parse_duration_seconds",
+    "Time spent parsing a single file, per language.",
+    ["language"], buckets=FAST_BUCKETS
+)
+PARSED_FILES = Counter("archeologist_parsed_files_total", "Files parsed, per language.", ["language"])
+PARSED_BYTES = Counter("archeologist_parsed_bytes_total", "Source bytes parsed, per language.", ["language"])
+PARSED_FUNCTIONS = Counter("archeologist_parsed_functions_total", "Function definitions extracted, per language.", ["language"])
+
+# --- Vector Memory (ChromaDB) ---
+VECTOR_DURATION = Histogram(
+    "archeologist_vector_duration_seconds",
+    "Latency of vector DB operations.",
+    ["operation"], buckets=FAST_BUCKETS
+)
+VECTOR_ERRORS = Counter("archeologist_vector_errors_total", "Failed vector DB operations.", ["operation"])
+CHROMA_UP = Gauge("archeologist_chroma_up", "1 while the shared ChromaDB client's last heartbeat succeeded.")
+CHROMA_HEALTH_CHECKS = Counter("archeologist_chroma_health_checks_total", "ChromaDB heartbeats by result.", ["result"])
+CHROMA_RECONNECTS = Counter("archeologist_chroma_reconnects_total", "Times ChromaDB became reachable again after failing.")
+VECTOR_EMBEDDINGS = Counter("archeologist_vector_embeddings_total", "Functions embedded by Phase 1, or skipped because their stored vector is still valid.", ["outcome"])
+SEARCH_DURATION = Histogram(
+    "archeologist_search_duration_seconds",
+    "Latency of the lexical side of /search (identifier: exact name lookups that skip the vector DB).",
+    ["mode"], buckets=FAST_BUCKETS
+)
+SEARCH_CACHE = Counter("archeologist_search_cache_lookups_total", "Search cache lookups (query embeddings, results).", ["cache", "result"])
+
+# --- Graph ---
+GRAPH_NODES = Gauge("archeologist_graph_nodes", "Nodes in the dependency graph after the last analysis.")
+GRAPH_EDGES = Gauge("archeologist_graph_edges", "Edges in the dependency graph after the last analysis.")
+
+# --- Healing (Phases 3-5) ---
+HEALS = Counter("archeologist_heals_total", "Heal executions by outcome.", ["outcome"])
+PROPAGATED_CALLERS = Counter("archeologist_propagated_callers_total", "Callers rewritten by Phase 5.", ["outcome"])
+GIT_DURATION = Histogram(
+    "archeologist_git_operation_seconds",
+    "Latency of git commands run by the heal pipeline, per git subcommand.",
+    ["operation"], buckets=FAST_BUCKETS
+)
+
+# --- LLM Providers ---
+LLM_DURATION = Histogram(
+    "archeologist_llm_request_duration_seconds",
+    "Latency of LLM generate_content calls.",
+    ["provider", "model"], buckets=SLOW_BUCKETS
+)
+LLM_REQUESTS = Counter("archeologist_llm_requests_total", "LLM calls by outcome.", ["provider", "model", "status"])
+LLM_QUEUE_WAIT = Histogram(
+    "archeologist_llm_queue_wait_seconds",
+    "Time async LLM calls waited for a concurrency slot / token budget.",
+    ["provider"], buckets=SLOW_BUCKETS
+)
+LLM_IN_FLIGHT = Gauge("archeologist_llm_in_flight", "Async LLM calls currently running.", ["provider"])
+CONTEXT_TOKENS = Histogram(
+    "archeologist_heal_context_tokens", "Estimated tokens of heal-plan context after budgeting.",
+    buckets=(500, 1000, 2000, 4000, 6000, 8000, 12000, 16000, 32000)
+)
+CONTEXT_DROPPED = Counter("archeologist_heal_context_dropped_total", "Context items dropped to fit the token budget.", ["section"])
+LLM_RETRIES = Counter("archeologist_llm_retries_total", "LLM calls retried after a retryable error.", ["provider", "error"])
+LLM_HEDGES = Counter("archeologist_llm_hedges_total", "Hedged (duplicate) LLM requests: sent, and won by the duplicate.", ["provider", "outcome"])
+LLM_FAILOVERS = Counter("archeologist_llm_failovers_total", "LLM calls answered by the fallback model.", ["from_model", "to_model"])
+LLM_CIRCUIT_OPEN = Gauge("archeologist_llm_circuit_open", "1 while the model's circuit breaker is open.", ["provider", "model"])
+LLM_CACHE = Counter("archeologist_llm_cache_lookups_total", "LLM response cache lookups.", ["result"])
+LLM_PROMPT_CHARS = Counter("archeologist_llm_prompt_chars_total", "Characters sent to LLM providers.", ["provider"])
+LLM_RESPONSE_CHARS = Counter("archeologist_llm_response_chars_total", "Characters received from LLM providers.", ["provider"])
+
+
+@contextmanager
+def track_phase(phase):
+    """Times a pipeline phase and counts it as failed if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        PHASE_ERRORS.labels(phase).inc()
+        raise
+    finally:
+        PHASE_DURATION.labels(phase).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def track_vector(operation):
+    """Times a single vector DB call and counts it as failed if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        VECTOR_ERRORS.labels(operation).inc()
+        raise
+    finally:
+        VECTOR_DURATION.labels(operation).observe(time.perf_counter() - start)
+
+
+def render():
+    """Returns (payload, content_type) in the Prometheus text exposition format."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,130 @@
+"""
+Precomputed k-nearest neighbours by embedding, for the heal prompt's "similar code".
+
+After Phase 1 every function's vector is fetched from the vector DB once (no
+re-embedding) and the top-k most similar other functions are found with blocked
+matrix products. They are stored on the node as `similar`: [[node_id, cosine], ...].
+build_healing_context reads that attribute instead of querying the vector DB
+with the whole target source.
+
+After a merge only the re-ingested nodes are recomputed, plus the nodes whose
+list pointed at one of them; a changed node that is now closer than some other
+node's k-th neighbour is merged into that node's list.
+
+    SIMILAR_NEIGHBOURS_K=3    # 0 disables (heals then query the vector DB)
+"""
+import os
+
+import numpy as np
+
+import metrics
+
+BLOCK_ROWS = 1024
+FETCH_BATCH = 1000
+
+
+def neighbours_k():
+    return int(os.getenv("SIMILAR_NEIGHBOURS_K", "3"))
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class NeighbourIndex:
+    """The function vectors (unit rows) the neighbour lists were computed from."""
+    def __init__(self):
+        self.ids = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def _fetch(self, collection, ids):
+        """{node_id: vector} for the ids the vector DB has."""
+        vectors = {}
+        for start in range(0, len(ids), FETCH_BATCH):
+            with metrics.track_vector("get"):
+                result = collection.get(ids=ids[start:start + FETCH_BATCH], include=["embeddings"])
+            embeddings = result.get("embeddings")
+            if embeddings is None:
+                continue
+            for node_id, vector in zip(result["ids"], embeddings):
+                vectors[node_id] = vector
+        return vectors
+
+    def _top_k(self, rows, k):
+        """[(node_id, [[neighbour, score], ...])] for the given matrix rows, self excluded."""
+        out = []
+        k = min(k, len(self.ids) - 1)
+        if k <= 0:
+            return [(self.ids[row], []) for row in rows]
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = np.asarray(rows[start:start + BLOCK_ROWS])
+            scores = self.matrix[block] @ self.matrix.T
+            scores[np.arange(len(block)), block] = -np.inf
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for i, row in enumerate(block):
+                best = top[i][np.argsort(-scores[i, top[i]], kind="stable")]
+                out.append((self.ids[row], [[self.ids[j], round(float(scores[i, j]), 4)] for j in best]))
+        return out
+
+    def build(self, archeologist):
+        """Neighbour lists for every function in the graph."""
+        k = neighbours_k()
+        if k <= 0 or not archeologist.has_memory:
+            return
+        node_ids = [n for n, data in archeologist.graph.nodes(data=True) if data.get('type') == 'function']
+        try:
+            vectors = self._fetch(archeologist.collection, node_ids)
+        except Exception as e:
+            print(f"   -> Could not precompute neighbours: {e}")
+            return
+        self.ids = [n for n in node_ids if n in vectors]
+        self.matrix = _unit([vectors[n] for n in self.ids]) if self.ids else np.zeros((0, 0), dtype=np.float32)
+        for node_id, similar in self._top_k(list(range(len(self.ids))), k):
+            archeologist.graph.nodes[node_id]['similar'] = similar
+        archeologist.log(f"   -> Precomputed {k} nearest neighbours for {len(self.ids)} functions.")
+
+    def update(self, archeologist, changed, removed):
+        """Recomputes what re-ingesting `changed` and deleting `removed` (node ids) can affect."""
+        k = neighbours_k()
+        if k <= 0 or not archeologist.has_memory or not self.ids:
+            return
+        gone = set(changed) | set(removed)
+        try:
+            vectors = self._fetch(archeologist.collection, [n for n in changed if n in archeologist.graph])
+        except Exception as e:
+            # Drop the lists rather than keep ones that may point at stale code; heals query instead
+            print(f"   -> Could not refresh neighbours: {e}")
+            for node_id in self.ids:
+                archeologist.graph.nodes[node_id].pop('similar', None)
+            self.ids = []
+            return
+        keep = [row for row, node_id in enumerate(self.ids) if node_id not in gone]
+        added = list(vectors)
+        self.ids = [self.ids[row] for row in keep] + added
+        self.matrix = np.vstack([self.matrix[keep]] + ([_unit([vectors[n] for n in added])] if added else []))
+        rows = {node_id: row for row, node_id in enumerate(self.ids)}
+
+        # Lists that pointed at a changed/removed node are recomputed, as are the changed nodes' own
+        stale = set(added)
+        for node_id in self.ids:
+            similar = archeologist.graph.nodes[node_id].get('similar') or []
+            if any(neighbour in gone for neighbour, _ in similar):
+                stale.add(node_id)
+        for node_id, similar in self._top_k(sorted(rows[n] for n in stale), k):
+            archeologist.graph.nodes[node_id]['similar'] = similar
+
+        # Everyone else only needs to know whether a changed node now beats their k-th neighbour
+        if added:
+            added_rows = np.array([rows[n] for n in added])
+            scores = self.matrix @ self.matrix[added_rows].T
+            for row, node_id in enumerate(self.ids):
+                if node_id in stale:
+                    continue
+                similar = archeologist.graph.nodes[node_id].get('similar') or []
+                floor = similar[-1][1] if len(similar) >= k else -np.inf
+                better = [[added[i], round(float(score), 4)] for i, score in enumerate(scores[row]) if score > floor]
+                if better:
+                    archeologist.graph.nodes[node_id]['similar'] = sorted(similar + better, key=lambda item: -item[1])[:k]
+        archeologist.log(f"   -> Neighbour lists: {len(stale)} recomputed, {len(added)} function vectors refreshed.")
@@ -1,72 +1,179 @@
 import os
+import time
+import call_index
+import clones
+import lexical_index
+import metrics
+import profiling
+import vector_memory
+
+SOURCE_EXTENSIONS = ('.py', '.js', '.ts', '.java', '.php', '.cs')
 
 def run(archeologist, project_path):
     """
     Phase 1: Digital Excavation (Ingestion)
     - Crawl the file system.
     - Parse code into AST using tree-sitter.
-    - Store code chunks and vectors in ChromaDB.
+    - Store code chunks and vectors in ChromaDB, names/paths/strings in the lexical index.
     """
     archeologist.log(f"Phase 1: Excavating {project_path}...")
     if not os.path.exists(project_path):
         archeologist.log(f"❌ Error: Path {project_path} does not exist.")
         return
 
-    count = 0
+    vector_memory.open_collection(archeologist, project_path)
+    archeologist.graph_stream.begin()
+    archeologist.call_index = call_index.CallSiteIndex()
+    archeologist.lexical_index = lexical_index.LexicalIndex()
+    archeologist.clone_index = clones.CloneIndex()
+
     for root, dirs, files in os.walk(project_path):
         for file in files:
-            if file.endswith(('.py', '.js', '.ts', '.java', '.php', '.cs')): 
+            if file.endswith(SOURCE_EXTENSIONS): 
                 full_path = os.path.join(root, file)
-                rel_path = os.path.relpath(full_path, project_path)
-                with open(full_path, 'rb') as f:
-                    code = f.read()
-                
-                lang = 'python' if file.endswith('.py') else 'javascript'
-                if file.endswith('.ts'): lang = 'typescript'
-                if file.endswith('.java'): lang = 'java'
-                if file.endswith('.php'): lang = 'php'
-                if file.endswith('.cs'): lang = 'csharp'
-                
-                defs = archeologist.parser_manager.parse(code, lang)
-                
-                # Store nodes in graph
-                for func_def in defs:
-                    count += 1
-                    func_name = func_def['name']
-                    node_id = f"{rel_path}::{func_name}"
-                    
-                    # Extract just the function code
-                    s_byte = func_def['start_byte']
-                    e_byte = func_def['end_byte']
-                    func_code = code[s_byte:e_byte].decode('utf-8')
-                    
-                    archeologist.graph.add_node(
-                        node_id, 
-                        type="function", 
-                        file=rel_path, 
-                        code=func_code, 
-                        calls=func_def.get('calls', []),
-                        imports=func_def.get('imports', []),
-                        start_byte=s_byte,
-                        end_byte=e_byte,
-                        complexity=func_def.get('complexity', 1)
-                    )
-                    
-                    # Phase 1.5: Embed in Vector DB
-                    if archeologist.has_memory:
-                        try:
-                            archeologist.collection.upsert(
-                                ids=[node_id],
-                                documents=[func_code],
-                                metadatas=[{
-                                    "file": rel_path,
-                                    "name": func_name,
-                                    "type": "function",
-                                    "node_id": node_id
-                                }]
-                            )
-                        except Exception as e:
-                            print(f"   -> Error embedding {node_id}: {e}")
+                ingest_file(archeologist, project_path, os.path.relpath(full_path, project_path))
+
+    archeologist.graph_stream.flush()
+    save_call_index(archeologist, project_path)
+    save_vectors(archeologist)
+    archeologist.neighbours.build(archeologist)
+    clones.annotate(archeologist)
+    vector_memory.collect_orphans(archeologist, on_done=lambda: save_vectors(archeologist))
+    archeologist.graph_version += 1
 
     if archeologist.has_memory:
         archeologist.log(f"   -> Ingested {archeologist.graph.number_of_nodes()} code artifacts into Vector Memory.")
+
+def language_for(rel_path):
+    lang = 'python' if rel_path.endswith('.py') else 'javascript'
+    if rel_path.endswith('.ts'): lang = 'typescript'
+    if rel_path.endswith('.java'): lang = 'java'
+    if rel_path.endswith('.php'): lang = 'php'
+    if rel_path.endswith('.cs'): lang = 'csharp'
+    return lang
+
+def ingest_file(archeologist, project_path, rel_path):
+    """Parses one file into graph nodes (and the Vector DB). Returns the file's node ids."""
+    with open(os.path.join(project_path, rel_path), 'rb') as f:
+        code = f.read()
+    lang = language_for(rel_path)
+    
+    parse_start = time.perf_counter()
+    with profiling.section(f"lang:{lang}"):
+        defs = archeologist.parser_manager.parse(code, lang, with_body_tokens=True)
+    metrics.PARSE_DURATION.labels(lang).observe(time.perf_counter() - parse_start)
+    metrics.PARSED_FILES.labels(lang).inc()
+    metrics.PARSED_BYTES.labels(lang).inc(len(code))
+    metrics.PARSED_FUNCTIONS.labels(lang).inc(len(defs))
+    
+    # Store nodes in graph
+    node_ids = []
+    sites = []
+    for func_def in defs:
+        func_name = func_def['name']
+        node_id = f"{rel_path}::{func_name}"
+        node_ids.append(node_id)
+        
+        # Extract just the function code
+        s_byte = func_def['start_byte']
+        e_byte = func_def['end_byte']
+        func_code = code[s_byte:e_byte].decode('utf-8')
+        
+        archeologist.graph.add_node(
+            node_id, 
+            type="function", 
+            file=rel_path, 
+            code=func_code, 
+            calls=func_def.get('calls', []),
+            call_sites=func_def.get('call_sites', []), # (call text, start_byte, end_byte of the called name)
+            imports=func_def.get('imports', []),
+            start_byte=s_byte,
+            end_byte=e_byte,
+            complexity=func_def.get('complexity', 1)
+        )
+        archeologist.graph_stream.add_node(node_id, rel_path, func_def.get('complexity', 1))
+        sites += [(func_name, *site) for site in func_def.get('call_sites', [])]
+        archeologist.lexical_index.add(node_id, rel_path, func_name, func_code)
+        archeologist.clone_index.add(node_id, func_def.get('body_tokens') or [])
+        
+        # Phase 1.5: Embed in Vector DB (unless the stored vector was made from this exact code)
+        if archeologist.has_memory:
+            code_hash = vector_memory.content_hash(func_code)
+            if archeologist.vector_hashes.get(node_id) == code_hash:
+                metrics.VECTOR_EMBEDDINGS.labels("reused").inc()
+                continue
+            try:
+                with metrics.track_vector("upsert"):
+                    archeologist.collection.upsert(
+                        ids=[node_id],
+                        documents=[func_code],
+                        metadatas=[{
+                            "file": rel_path,
+                            "name": func_name,
+                            "type": "function",
+                            "node_id": node_id,
+                            "content_hash": code_hash
+                        }]
+                    )
+                archeologist.vector_hashes[node_id] = code_hash
+                metrics.VECTOR_EMBEDDINGS.labels("embedded").inc()
+            except Exception as e:
+                print(f"   -> Error embedding {node_id}: {e}")
+
+    archeologist.call_index.add_file(rel_path, code, sites)
+    return node_ids
+
+def save_call_index(archeologist, project_path):
+    try:
+        archeologist.call_index.save(call_index.path_for(project_path))
+    except OSError as e:
+        print(f"   -> Could not persist the call-site index: {e}")
+
+def save_vectors(archeologist):
+    """The embedded vector index (vector_index.py) is written out in one go; Chroma persists by itself."""
+    persist = getattr(archeologist.collection, 'persist', None) if archeologist.has_memory else None
+    if persist is None:
+        return
+    try:
+        persist()
+    except OSError as e:
+        print(f"   -> Could not persist the local vector index: {e}")
+
+def refresh_files(archeologist, project_path, rel_paths):
+    """
+    Re-ingests just the given files (e.g. the ones a merged heal touched) instead of the
+    whole repo. Nodes that still exist are updated in place, keeping their incoming
+    edges; definitions that are gone are removed from the graph and the Vector DB.
+    Returns {rel_path: node ids now defined in it}.
+    """
+    nodes_by_file = {}
+    removed = []
+    for rel_path in rel_paths:
+        old = set(archeologist.file_map.get(rel_path, {}).values())
+        current = []
+        if rel_path.endswith(SOURCE_EXTENSIONS) and os.path.exists(os.path.join(project_path, rel_path)):
+            current = ingest_file(archeologist, project_path, rel_path)
+        else:
+            archeologist.call_index.remove_file(rel_path)
+        removed += [n for n in old - set(current) if n in archeologist.graph]
+        nodes_by_file[rel_path] = current
+
+    archeologist.graph.remove_nodes_from(removed)
+    for node_id in removed:
+        archeologist.lexical_index.remove(node_id)
+        archeologist.clone_index.remove(node_id)
+    if removed and archeologist.has_memory:
+        try:
+            with metrics.track_vector("delete"):
+                archeologist.collection.delete(ids=removed)
+            for node_id in removed:
+                archeologist.vector_hashes.pop(node_id, None)
+        except Exception as e:
+            print(f"   -> Error removing stale vectors: {e}")
+    save_call_index(archeologist, project_path)
+    save_vectors(archeologist)
+    archeologist.neighbours.update(archeologist, [n for ids in nodes_by_file.values() for n in ids], removed)
+    clones.annotate(archeologist)
+    archeologist.graph_version += 1
+    archeologist.log(f"   -> Refreshed {len(rel_paths)} file(s): {sum(len(n) for n in nodes_by_file.values())} nodes updated, {len(removed)} removed.")
+    return nodes_by_file
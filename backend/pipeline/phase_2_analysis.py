@@ -9,7 +9,7 @@ def run(archeologist):
     archeologist.log("Phase 2: Building the Dependency Map...")
 
     # 1. Build Index: { filename : { func_name : node_id } }
-    file_map = {} 
+    file_map = {}
     for node, data in archeologist.graph.nodes(data=True):
         if data.get('type') == 'function':
             fpath = data.get('file')
@@ -17,88 +17,135 @@ def run(archeologist):
             if fpath not in file_map:
                 file_map[fpath] = {}
             file_map[fpath][fname] = node
-    
+    # Kept for refresh() after merges
+    archeologist.file_map = file_map
+
     edges_added = 0
     for node_id, data in archeologist.graph.nodes(data=True):
-        calls = data.get('calls', [])
-        imports = data.get('imports', [])
-        current_file = data.get('file')
-        
-        # Helper to find target node
-        def find_target(target_module, target_func):
-            candidates = []
-            for fpath in file_map:
-                # Resolve Target Module Name
-                base = os.path.basename(fpath)
-                name_only = os.path.splitext(base)[0] # utils.js -> utils
-                
-                # Check strict match
-                is_match = False
-                if target_module.startswith('.'):
-                    # Relative Import Logic
-                    # Heuristic: Check if target_module ends with the filename
-                    target_clean = os.path.basename(target_module)
-                    if target_clean == name_only:
-                         is_match = True
-                else:
-                    # Absolute/Package Import Logic
-                    if target_module == name_only:
-                        is_match = True
-                        
-                if is_match:
-                    if target_func in file_map[fpath]:
-                        candidates.append(file_map[fpath][target_func])
-            return candidates
-
-        for call_text in calls:
-            # Case 1: Qualified Call (e.g. inventory.process_item)
-            if '.' in call_text:
-                parts = call_text.split('.')
-                obj = parts[0]
-                method = parts[-1] 
-                
-                # Resolve 'obj'. Is it an import alias?
-                real_module = None
-                for imp in imports:
-                    if imp.get('alias') == obj:
-                        real_module = imp.get('module')
-                        break
-                
-                if real_module:
-                     targets = find_target(real_module, method)
-                     for t in targets:
-                         archeologist.graph.add_edge(node_id, t)
-                         edges_added += 1
-                else:
-                    # Try explicit match (implicit relative or just matching name)
-                    targets = find_target(obj, method)
-                    for t in targets:
-                         archeologist.graph.add_edge(node_id, t)
-                         edges_added += 1
-
-            # Case 2: Unqualified Call (e.g. process_item)
-            else:
-                # Check if it is 'from M import func' (aliased as call_text)
-                imported_target = None
-                for imp in imports:
-                    if imp.get('alias') == call_text:
-                        mod = imp.get('module')
-                        orig_name = imp.get('name')
-                        if orig_name:
-                            imported_target = (mod, orig_name)
-                        break
-                
-                if imported_target:
-                    targets = find_target(imported_target[0], imported_target[1])
-                    for t in targets:
-                        archeologist.graph.add_edge(node_id, t)
-                        edges_added += 1
-                else:
-                    # Assume internal call (same file)
-                    if current_file in file_map and call_text in file_map[current_file]:
-                         target = file_map[current_file][call_text]
-                         if target != node_id:
-                             archeologist.graph.add_edge(node_id, target)
-                             edges_added += 1
-                        
+        for target in resolve_calls(file_map, node_id, data):
+            archeologist.graph.add_edge(node_id, target)
+            archeologist.graph_stream.add_edge(node_id, target)
+            edges_added += 1
+
+    archeologist.graph_stream.end(archeologist.graph.number_of_nodes(), archeologist.graph.number_of_edges())
     archeologist.log(f"   -> Graph built with {archeologist.graph.number_of_nodes()} nodes and {edges_added} dependencies.")
+
+def refresh(archeologist, nodes_by_file):
+    """
+    Re-resolves only the edges a change to some files can affect (after phase_1_ingestion.refresh_files):
+    - outgoing edges of every node in those files
+    - callers elsewhere whose calls may now resolve to a name newly defined there
+    Edges into nodes that kept their name are untouched.
+    """
+    file_map = archeologist.file_map
+    new_names = set()
+    touched = []
+    for fpath, node_ids in nodes_by_file.items():
+        names = {node.split('::')[1]: node for node in node_ids}
+        new_names |= set(names) - set(file_map.get(fpath, {}))
+        if names:
+            file_map[fpath] = names
+        else:
+            file_map.pop(fpath, None)
+        touched += node_ids
+
+    # The call-site index knows who calls a name without scanning the graph
+    for name in new_names:
+        for site in archeologist.call_index.sites(name):
+            if site['file'] not in nodes_by_file and site['caller'] in archeologist.graph and site['caller'] not in touched:
+                touched.append(site['caller'])
+
+    edges_added = 0
+    for node_id in touched:
+        data = archeologist.graph.nodes[node_id]
+        archeologist.graph.remove_edges_from(list(archeologist.graph.out_edges(node_id)))
+        for target in resolve_calls(file_map, node_id, data):
+            archeologist.graph.add_edge(node_id, target)
+            edges_added += 1
+    archeologist.log(f"   -> Re-resolved {len(touched)} nodes ({edges_added} dependencies).")
+
+def call_sites_of(archeologist, node_id):
+    """Call sites (from the call-site index) that resolve to node_id, i.e. the sites behind its incoming edges."""
+    sites = []
+    for site in archeologist.call_index.sites(node_id.split('::')[1]):
+        if site['caller'] not in archeologist.graph:
+            continue
+        scope = {'file': site['file'], 'imports': archeologist.graph.nodes[site['caller']].get('imports', []), 'calls': [site['call']]}
+        if node_id in resolve_calls(archeologist.file_map, site['caller'], scope):
+            sites.append(site)
+    return sites
+
+def resolve_calls(file_map, node_id, data):
+    """Targets of a node's calls (node ids), resolved through its imports and the file index."""
+    calls = data.get('calls', [])
+    imports = data.get('imports', [])
+    current_file = data.get('file')
+    targets_found = []
+
+    # Helper to find target node
+    def find_target(target_module, target_func):
+        candidates = []
+        for fpath in file_map:
+            # Resolve Target Module Name
+            base = os.path.basename(fpath)
+            name_only = os.path.splitext(base)[0] # utils.js -> utils
+
+            # Check strict match
+            is_match = False
+            if target_module.startswith('.'):
+                # Relative Import Logic
+                # Heuristic: Check if target_module ends with the filename
+                target_clean = os.path.basename(target_module)
+                if target_clean == name_only:
+                     is_match = True
+            else:
+                # Absolute/Package Import Logic
+                if target_module == name_only:
+                    is_match = True
+
+            if is_match:
+                if target_func in file_map[fpath]:
+                    candidates.append(file_map[fpath][target_func])
+        return candidates
+
+    for call_text in calls:
+        # Case 1: Qualified Call (e.g. inventory.process_item)
+        if '.' in call_text:
+            parts = call_text.split('.')
+            obj = parts[0]
+            method = parts[-1]
+
+            # Resolve 'obj'. Is it an import alias?
+            real_module = None
+            for imp in imports:
+                if imp.get('alias') == obj:
+                    real_module = imp.get('module')
+                    break
+
+            if real_module:
+                 targets_found += find_target(real_module, method)
+            else:
+                # Try explicit match (implicit relative or just matching name)
+                targets_found += find_target(obj, method)
+
+        # Case 2: Unqualified Call (e.g. process_item)
+        else:
+            # Check if it is 'from M import func' (aliased as call_text)
+            imported_target = None
+            for imp in imports:
+                if imp.get('alias') == call_text:
+                    mod = imp.get('module')
+                    orig_name = imp.get('name')
+                    if orig_name:
+                        imported_target = (mod, orig_name)
+                    break
+
+            if imported_target:
+                targets_found += find_target(imported_target[0], imported_target[1])
+            else:
+                # Assume internal call (same file)
+                if current_file in file_map and call_text in file_map[current_file]:
+                     target = file_map[current_file][call_text]
+                     if target != node_id:
+                         targets_found.append(target)
+    return targets_found
@@ -1,38 +1,117 @@
-def run_search(archeologist, query_text, n_results=3):
+import asyncio
+import re
+import metrics
+import search_cache
+from pipeline.phase_4_execution import extract_code_block
+from ai_bridge import TextWrapper
+from context_budget import ContextBudgeter, format_report, rank_callees, rank_callers
+
+SEARCH_MODES = ("hybrid", "lexical", "vector")
+MAX_SEARCH_RESULTS = 50
+RRF_K = 60 # Reciprocal-rank fusion constant (Cormack et al.); damps the weight of the top ranks
+IDENTIFIER_QUERY_RE = re.compile(r"^\s*[A-Za-z_][A-Za-z0-9_]*\s*$")
+
+def run_search(archeologist, query_text, n_results=3, mode="hybrid"):
     """
-    Performs a semantic search against the codebase using ChromaDB.
-    Returns a list of matching nodes with their distance scores.
+    Searches the codebase: BM25 over names/paths/string literals (lexical_index.py) fused
+    with the vector DB's semantic matches by reciprocal-rank fusion. A query that is exactly
+    a function name is answered from the lexical index alone, without embedding it.
+    Returns a list of matching nodes, best first: {"node_id", "metadata", "score", "sources"}.
     """
-    if not archeologist.has_memory:
-        return []
-        
-    print(f"RAG Search: '{query_text}'")
+    return run_search_batch(archeologist, [query_text], n_results, mode)[0]
+
+def run_search_batch(archeologist, query_texts, n_results=3, mode="hybrid"):
+    """
+    run_search for many queries (one result list per query, in order) with at most one
+    embedding call and one vector DB round-trip for all of them. Results are cached per
+    graph version and query embeddings across analyses (search_cache.py).
+    """
+    n_results = max(1, min(int(n_results), MAX_SEARCH_RESULTS))
+    if mode not in SEARCH_MODES:
+        mode = "hybrid"
+    print(f"RAG Search: {len(query_texts)} quer{'y' if len(query_texts) == 1 else 'ies'} ({mode}, top {n_results})")
+
+    results = {}
+    pending = []
+    for query_text in dict.fromkeys(query_texts):
+        cached = archeologist.search_results.get((query_text, n_results, mode, archeologist.graph_version))
+        if cached is not None:
+            results[query_text] = cached
+        else:
+            pending.append(query_text)
+
+    # Both lists go deeper than n_results so fusion can promote what either one ranks lower
+    depth = max(n_results * 4, 20)
+    lexical = {}
+    needs_vector = []
+    for query_text in pending:
+        if mode != "vector":
+            exact = archeologist.lexical_index.lookup(query_text.strip()) if IDENTIFIER_QUERY_RE.match(query_text) else []
+            if exact:
+                with metrics.SEARCH_DURATION.labels("identifier").time():
+                    ranked = exact + [node_id for node_id, _ in archeologist.lexical_index.search(query_text, depth) if node_id not in exact]
+                results[query_text] = [_search_match(archeologist, node_id, _rrf(rank), ["lexical"]) for rank, node_id in enumerate(ranked[:n_results])]
+                continue
+            with metrics.SEARCH_DURATION.labels("lexical").time():
+                lexical[query_text] = [node_id for node_id, _ in archeologist.lexical_index.search(query_text, depth)]
+        if mode != "lexical":
+            needs_vector.append(query_text)
+
+    vector = _vector_matches(archeologist, needs_vector, depth if mode == "hybrid" else n_results)
+
+    for query_text in pending:
+        if query_text in results:
+            pass
+        elif mode == "vector":
+            # Convert distance to similarity roughly
+            results[query_text] = [_search_match(archeologist, node_id, 1 - distance, ["vector"])
+                                   for node_id, distance in vector.get(query_text, [])]
+        else:
+            results[query_text] = _fuse(archeologist, lexical.get(query_text, []),
+                                        [node_id for node_id, _ in vector.get(query_text, [])], n_results)
+        # A failed vector query isn't cached, so the next search tries again
+        if query_text not in needs_vector or query_text in vector:
+            archeologist.search_results.put((query_text, n_results, mode, archeologist.graph_version), results[query_text])
+
+    return [[dict(match) for match in results[query_text]] for query_text in query_texts]
+
+def _vector_matches(archeologist, query_texts, n_results):
+    """{query: [(node_id, distance)]} from one vector DB query; queries that failed are missing."""
+    if not query_texts or not archeologist.has_memory or archeologist.collection is None:
+        return {}
     try:
-        results = archeologist.collection.query(
-            query_texts=[query_text],
-            n_results=n_results
-        )
-        
-        # Format results into a cleaner list
-        matches = []
-        if results['ids']:
-            ids = results['ids'][0]
-            metadatas = results['metadatas'][0]
-            distances = results['distances'][0]
-            
-            for i, node_id in enumerate(ids):
-                matches.append({
-                    "node_id": node_id,
-                    "metadata": metadatas[i],
-                    "score": 1 - distances[i] # Convert distance to similarity roughly
-                })
-        
-        return matches
+        query_embeddings = search_cache.embed_queries(archeologist.collection, query_texts)
+        with metrics.track_vector("query"):
+            if query_embeddings is not None:
+                results = archeologist.collection.query(query_embeddings=query_embeddings, n_results=n_results)
+            else:
+                results = archeologist.collection.query(query_texts=query_texts, n_results=n_results)
+        return {query_text: list(zip(ids, distances))
+                for query_text, ids, distances in zip(query_texts, results['ids'], results['distances'])}
     except Exception as e:
-        print(f"   ❌ Search failed: {e}")
-        return []
+        print(f"   ❌ Vector search failed: {e}")
+        return {}
+
+def _fuse(archeologist, lexical, vector, n_results):
+    """Reciprocal-rank fusion of two ranked lists of node ids."""
+    fused = {}
+    for source, ranked in (("lexical", lexical), ("vector", vector)):
+        for rank, node_id in enumerate(ranked):
+            score, sources = fused.get(node_id, (0.0, []))
+            fused[node_id] = (score + _rrf(rank), sources + [source])
+    best = sorted(fused.items(), key=lambda item: (-item[1][0], item[0]))[:n_results]
+    return [_search_match(archeologist, node_id, score, sources) for node_id, (score, sources) in best]
 
-def explain_function(archeologist, node_id):
+def _rrf(rank):
+    return 1.0 / (RRF_K + rank + 1)
+
+def _search_match(archeologist, node_id, score, sources):
+    data = archeologist.graph.nodes[node_id] if node_id in archeologist.graph else {}
+    metadata = {"file": data.get('file', node_id.split('::')[0]), "name": node_id.split('::')[-1],
+                "type": data.get('type', 'function'), "node_id": node_id}
+    return {"node_id": node_id, "metadata": metadata, "score": score, "sources": sources}
+
+def explain_function(archeologist, node_id, use_cache=True):
     """
     Phase 4: The Rosetta Stone.
     Uses GenAI to explain a function's purpose.
@@ -40,10 +119,39 @@ def explain_function(archeologist, node_id):
     if not archeologist.has_ai:
         return "AI features are disabled."
         
+    try:
+        res = archeologist.model.generate_content(build_explain_prompt(archeologist, node_id), use_cache=use_cache)
+        return res.text
+    except Exception as e:
+        return f"Error explaining code: {e}"
+
+async def aexplain_function(archeologist, node_id, use_cache=True, on_token=None):
+    """
+    Async twin of explain_function (limited per provider, see llm_limits.py).
+    With on_token (async callable), the explanation is streamed to it as it is generated.
+    """
+    if not archeologist.has_ai:
+        return "AI features are disabled."
+
+    prompt = build_explain_prompt(archeologist, node_id)
+    try:
+        if on_token is None:
+            res = await archeologist.model.agenerate_content(prompt, use_cache=use_cache)
+            return res.text
+
+        chunks = []
+        async for chunk in archeologist.model.astream_content(prompt, use_cache=use_cache):
+            chunks.append(chunk)
+            await on_token(chunk)
+        return "".join(chunks)
+    except Exception as e:
+        return f"Error explaining code: {e}"
+
+def build_explain_prompt(archeologist, node_id):
     node_data = archeologist.graph.nodes[node_id]
     code = node_data.get('code', '')
     
-    prompt = f"""
+    return f"""
     Explain the following Python/JS/TS function in 2-3 sentences. 
     Focus on WHAT it does and WHY it might be complex or risky.
     Do not explain syntax. Explain logic.
@@ -53,12 +161,6 @@ def explain_function(archeologist, node_id):
     {code}
     ```
     """
-    
-    try:
-        res = archeologist.model.generate_content(prompt)
-        return res.text
-    except Exception as e:
-        return f"Error explaining code: {e}"
 
 def build_healing_context(archeologist, node_id):
     """
@@ -81,41 +183,26 @@ def build_healing_context(archeologist, node_id):
     except:
         context['name'] = node_id
     
-    # 2. Neighbors (The Reality Check)
+    # 2. Neighbors (The Reality Check), most relevant first
     # Incoming (Who calls me? -> Do not break their contract)
-    callers = []
-    try:
-        for u, v in archeologist.graph.in_edges(node_id):
-             if u in archeologist.graph.nodes:
-                 code = archeologist.graph.nodes[u].get('code', '')
-                 # Just take the signature/first few lines to show usage
-                 snippet = "\\n".join(code.split('\\n')[:5])
-                 callers.append(f"Caller `{u}`:\n{snippet}...") 
-    except:
-        pass
-    context['callers'] = callers
-    
     # Outgoing (Who do I call? -> Do not hallucinate APIS)
-    callees = []
-    try:
-        for u, v in archeologist.graph.out_edges(node_id):
-             if v in archeologist.graph.nodes:
-                 code = archeologist.graph.nodes[v].get('code', '')
-                 sig = code.split('\\n')[0]
-                 callees.append(f"Callee `{v}` defined as: {sig}")
-    except:
-        pass
-    context['callees'] = callees
+    callers = rank_callers(archeologist.graph, node_id, context['name'])
+    callees = rank_callees(archeologist.graph, node_id, context['target_code'])
     
     # 3. Style/Patterns (The RAG)
     similar_snippets = []
-    if archeologist.has_memory:
+    precomputed = node_data.get('similar')
+    if precomputed is not None:
+        # Nearest neighbours precomputed after ingestion (neighbours.py)
+        similar_snippets = [archeologist.graph.nodes[n].get('code', '') for n, _ in precomputed if n in archeologist.graph]
+    elif archeologist.has_memory and archeologist.collection is not None:
         try:
              # Search for functions with similar vector embeddings
-             res = archeologist.collection.query(
-                 query_texts=[node_data.get('code', '')],
-                 n_results=3
-             )
+             with metrics.track_vector("query"):
+                 res = archeologist.collection.query(
+                     query_texts=[node_data.get('code', '')],
+                     n_results=3
+                 )
              if res['documents']:
                  for i, doc in enumerate(res['documents'][0]):
                      # Don't include self
@@ -123,11 +210,22 @@ def build_healing_context(archeologist, node_id):
                          similar_snippets.append(doc)
         except Exception as e:
             print(f"   ⚠️ RAG context fetch failed: {e}")
-            
-    context['similar_code'] = similar_snippets
+
+    # 4. Fit everything into the Architect's token budget
+    budgeter = ContextBudgeter(archeologist.architect.provider if archeologist.has_ai else None)
+    sections, report = budgeter.fit(context['target_code'], callers, callees, similar_snippets)
+    context['callers'] = sections['callers']
+    context['callees'] = sections['callees']
+    context['similar_code'] = sections['similar']
+    context['budget_report'] = report
+    print(f"   -> Context budget: {format_report(report)}")
+    for section, dropped in report['dropped'].items():
+        if dropped:
+            metrics.CONTEXT_DROPPED.labels(section).inc(len(dropped))
+    metrics.CONTEXT_TOKENS.observe(report['used_tokens'])
     return context
 
-def generate_heal_plan(archeologist, project_path, specific_target=None):
+def generate_heal_plan(archeologist, project_path, specific_target=None, use_cache=True):
     """
     Phase 3: The Heal Plan (Strategy)
     - Pick a target node.
@@ -135,10 +233,72 @@ def generate_heal_plan(archeologist, project_path, specific_target=None):
     - Consult Architect Model to generate a heal plan.
     """
     print("Phase 3: Consulting the Architect...")
-    
+    prepared = prepare_heal_prompt(archeologist, specific_target)
+    if not prepared:
+        return None
+    target_node, prompt = prepared
+
+    print(f"   -> Context built. Sending to {archeologist.model_name}...")
+    try:
+        # Use the Architect (smarter model) for this task
+        response = archeologist.architect.generate_content(prompt, use_cache=use_cache)
+        return _report_plan(target_node, response)
+    except Exception as e:
+         print(f"   -> AI Error: {e}")
+         return None
+
+async def agenerate_heal_plan(archeologist, project_path, specific_target=None, use_cache=True,
+                              on_token=None, on_code_block=None):
+    """
+    Async twin of generate_heal_plan (limited per provider, see llm_limits.py).
+    Streaming (either callback given, both async):
+    - on_token(chunk) receives the report as the Architect writes it.
+    - on_code_block(target_node, text_so_far) fires once, as soon as the refactored
+      code block is complete, so Phase 4 can start before the report is finished.
+    """
+    print("Phase 3: Consulting the Architect...")
+    # Context building queries the vector DB synchronously: keep it off the event loop
+    prepared = await asyncio.to_thread(prepare_heal_prompt, archeologist, specific_target)
+    if not prepared:
+        return None
+    target_node, prompt = prepared
+
+    print(f"   -> Context built. Sending to {archeologist.model_name}...")
+    try:
+        if on_token is None and on_code_block is None:
+            response = await archeologist.architect.agenerate_content(prompt, use_cache=use_cache)
+            return _report_plan(target_node, response)
+
+        chunks = []
+        block_sent = on_code_block is None
+        async for chunk in archeologist.architect.astream_content(prompt, use_cache=use_cache):
+            chunks.append(chunk)
+            if on_token:
+                await on_token(chunk)
+            # Only re-scan when a fence could just have closed
+            if not block_sent and "`" in chunk:
+                text = "".join(chunks)
+                if extract_code_block(text, allow_fallback=False) is not None:
+                    block_sent = True
+                    print("   -> Code block complete. Handing over to Phase 4 while the report finishes...")
+                    await on_code_block(target_node, text)
+        return _report_plan(target_node, TextWrapper("".join(chunks)))
+    except Exception as e:
+         print(f"   -> AI Error: {e}")
+         return None
+
+def _report_plan(target_node, response):
+    print("   -> Architect's Report:\n")
+    print("="*40)
+    print(response.text)
+    print("="*40)
+    return (target_node, response.text) # Return tuple
+
+def prepare_heal_prompt(archeologist, specific_target=None):
+    """Picks the target and builds the Architect prompt. Returns (target_node, prompt) or None."""
     if not archeologist.has_ai:
         print("   -> AI disabled. Skipping strategy generation.")
-        return
+        return None
 
     target_node = specific_target
     
@@ -193,16 +353,4 @@ def generate_heal_plan(archeologist, project_path, specific_target=None):
     5. CRITICAL: Output ONLY the refactored function code. Do NOT include imports, helper functions, or the original dependencies in the code block.
     6. Output the REFACTORED code in a Markdown block like ```python ... ```.
     """
-
-    print(f"   -> Context built. Sending to {archeologist.model_name}...")
-    try:
-        # Use the Architect (smarter model) for this task
-        response = archeologist.architect.generate_content(prompt)
-        print("   -> Architect's Report:\n")
-        print("="*40)
-        print(response.text)
-        print("="*40)
-        return (target_node, response.text) # Return tuple
-    except Exception as e:
-         print(f"   -> AI Error: {e}")
-         return None
+    return target_node, prompt
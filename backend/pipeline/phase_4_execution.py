@@ -1,7 +1,9 @@
 import os
 import re
-import subprocess
 import datetime
+import git_service
+import metrics
+import worktrees
 
 def run(archeologist, plan_tuple, project_path):
     """
@@ -21,86 +23,30 @@ def run(archeologist, plan_tuple, project_path):
         return None, None
 
     # 1. Parse the new code from the Markdown
-    code_match = re.search(r"```(?:python|javascript|typescript)\s*(.*?)\s*```", response_text, re.DOTALL)
-    if not code_match:
-         # Fallback for unspecified language block
-         code_match = re.search(r"```\s*(.*?)\s*```", response_text, re.DOTALL)
-         
-    if not code_match:
+    new_code, new_func_name = parse_refactor(response_text)
+    if new_code is None:
         print("   -> Could not find code block in AI response.")
+        metrics.HEALS.labels("no_code_block").inc()
         return None, None
-    
-    new_code = code_match.group(1).strip()
-    new_code += "\n"
-    
-    # Extract new function name - simplistic regex
-    name_match = re.search(r"def\s+([a-zA-Z_]\w*)\s*\(", new_code)
-    if not name_match:
-        name_match = re.search(r"function\s+([a-zA-Z_]\w*)\s*\(", new_code) # JS style
-        
-    if name_match:
-        new_func_name = name_match.group(1)
-    else:
+    if not new_func_name:
         print("   -> Could not determine new function name.")
-        new_func_name = None
+
+    # --- PHASE 5: GIT SAFETY NET ---
+    branch_name, workdir = prepare_branch(archeologist, project_path, target_node.split("::")[-1].replace("_", "-"))
 
     # 2. Get location of the old code
     node_data = archeologist.graph.nodes[target_node]
     file_rel_path = node_data['file']
-    full_file_path = os.path.join(project_path, file_rel_path)
+    full_file_path = os.path.join(workdir, file_rel_path)
     
     start_byte = node_data['start_byte']
     end_byte = node_data['end_byte']
 
     print(f"   -> Surgically replacing {target_node} in {file_rel_path}...")
 
-    # --- PHASE 5: GIT SAFETY NET ---
-    branch_name = None
     try:
-        # Check if git repo exists, if not init
-        if not os.path.exists(os.path.join(project_path, ".git")):
-            print("   -> Initializing Git repository for safety...")
-            subprocess.run(["git", "init"], cwd=project_path, check=True)
-            subprocess.run(["git", "config", "user.email", "archeologist@system.local"], cwd=project_path, check=True)
-            subprocess.run(["git", "config", "user.name", "Code Archeologist"], cwd=project_path, check=True)
-            
-            subprocess.run(["git", "branch", "-M", "main"], cwd=project_path, check=True) # Enforce main
-            subprocess.run(["git", "add", "."], cwd=project_path, check=True)
-            subprocess.run(["git", "commit", "-m", "Initial Baseline"], cwd=project_path, check=True)
-        
-        # ALWAYS ensure config is set
-        subprocess.run(["git", "config", "--global", "user.email", "archeologist@system.local"], cwd=project_path, check=True)
-        subprocess.run(["git", "config", "--global", "user.name", "Code Archeologist"], cwd=project_path, check=True)
-
-        # ENSURE MAIN BRANCH EXISTS
-        try:
-            branches_out = subprocess.check_output(["git", "branch"], cwd=project_path).decode()
-            if "master" in branches_out and "main" not in branches_out:
-                 print("   -> Renaming 'master' to 'main' for consistency...")
-                 subprocess.run(["git", "branch", "-m", "master", "main"], cwd=project_path, check=True)
-        except Exception as e:
-             pass
+        worktrees.sync_from_checkout(project_path, workdir, file_rel_path)
 
-        if archeologist.safe_mode:
-            # Create Branch
-            timestamp = datetime.datetime.now().strftime("%H%M%S")
-            clean_node = target_node.split("::")[-1].replace("_", "-")
-            branch_name = f"ai-heal-{clean_node}-{timestamp}"
-            
-            print(f"   -> Creating safety branch: {branch_name}")
-            subprocess.run(["git", "checkout", "-b", branch_name], cwd=project_path, check=True)
-        else:
-             print("   -> ⚠️ Safe Mode OFF: Applying changes directly to current branch.")
-             # Get current branch name just for reporting
-             try:
-                branch_name = subprocess.check_output(["git", "rev-parse", "--abbrev-ref", "HEAD"], cwd=project_path).decode().strip()
-             except:
-                branch_name = "HEAD"
-        
-    except Exception as e:
-        print(f"   -> Git Ops Failed: {e}. Proceeding carefully...")
-
-    try:
         # 3. Read the original file as BYTES
         with open(full_file_path, 'rb') as f:
             content_bytes = f.read()
@@ -118,68 +64,280 @@ def run(archeologist, plan_tuple, project_path):
             f.write(final_content)
             
         print("   -> Surgery complete.")
+        metrics.HEALS.labels("applied").inc()
         
         # Stage but DO NOT COMMIT so VS Code sees the pending changes
         try:
-            subprocess.run(["git", "add", file_rel_path], cwd=project_path, check=True)
-            # subprocess.run(["git", "commit", "-m", f"Healed {target_node}"], cwd=project_path, check=True)
-        except:
+            git_service.stage(workdir, [file_rel_path])
+        except Exception:
             pass
             
         return new_func_name, branch_name
         
     except Exception as e:
         print(f"   -> Surgery Failed: {e}")
+        metrics.HEALS.labels("failed").inc()
         return None, None
 
+def run_batch(archeologist, plans, project_path):
+    """
+    Phase 4 for many plans at once: one branch, one read/splice/write per file.
+    Splices are applied back to front so earlier byte offsets stay valid; a target
+    whose span overlaps an already accepted one (e.g. a nested function) is skipped.
+    Returns ({node_id: {"status", "new_name", ...}}, branch_name).
+    """
+    print(f"Phase 4: Dispatching Agents for {len(plans)} plans...")
+    results = {}
+    edits_by_file = _group_edits(archeologist, plans, results)
+    metrics.HEALS.labels("no_code_block").inc(len(results))
+
+    if not edits_by_file:
+        print("   -> No applicable plans.")
+        return results, None
+
+    branch_name, workdir = prepare_branch(archeologist, project_path, f"batch-{sum(len(e) for e in edits_by_file.values())}")
+
+    spliced = []
+    for file_rel_path, edits in sorted(edits_by_file.items()):
+        accepted = _accept_edits(edits, results)
+        metrics.HEALS.labels("failed").inc(len(edits) - len(accepted))
+
+        print(f"   -> Surgically replacing {len(accepted)} function(s) in {file_rel_path}...")
+        try:
+            worktrees.sync_from_checkout(project_path, workdir, file_rel_path)
+            with open(os.path.join(workdir, file_rel_path), 'rb') as f:
+                content_bytes = f.read()
+            with open(os.path.join(workdir, file_rel_path), 'wb') as f:
+                f.write(_splice(content_bytes, accepted))
+        except Exception as e:
+            print(f"   -> Surgery Failed: {e}")
+            for _, _, target_node, _, _ in accepted:
+                results[target_node] = {"status": "failed", "new_name": None, "error": str(e)}
+                metrics.HEALS.labels("failed").inc()
+            continue
+
+        for _, _, target_node, _, new_func_name in accepted:
+            results[target_node] = {"status": "applied", "new_name": new_func_name}
+            metrics.HEALS.labels("applied").inc()
+        spliced.append(file_rel_path)
+
+    try:
+        git_service.stage(workdir, spliced)
+    except Exception:
+        pass
+
+    print(f"   -> Surgery complete on {len(edits_by_file)} file(s).")
+    return results, branch_name
+
+def preview(archeologist, plans, project_path):
+    """
+    Dry run of run_batch: the same splices, computed in memory against the files in
+    project_path. Nothing is written and git is not touched.
+    Returns ({node_id: {"status": "ready" | ..., "new_name"}}, {file_rel_path: (old bytes, new bytes)}).
+    """
+    results = {}
+    files = {}
+    for file_rel_path, edits in sorted(_group_edits(archeologist, plans, results).items()):
+        accepted = _accept_edits(edits, results)
+        try:
+            with open(os.path.join(project_path, file_rel_path), 'rb') as f:
+                content_bytes = f.read()
+        except OSError as e:
+            for _, _, target_node, _, _ in accepted:
+                results[target_node] = {"status": "failed", "new_name": None, "error": str(e)}
+            continue
+        files[file_rel_path] = (content_bytes, _splice(content_bytes, accepted))
+        for _, _, target_node, _, new_func_name in accepted:
+            results[target_node] = {"status": "ready", "new_name": new_func_name}
+    return results, files
+
+def _group_edits(archeologist, plans, results):
+    """{file_rel_path: [(start_byte, end_byte, node_id, new_code, new_name)]}; plans without code go to results."""
+    edits_by_file = {}
+    for target_node, response_text in plans:
+        new_code, new_func_name = parse_refactor(response_text or "")
+        if new_code is None:
+            results[target_node] = {"status": "no_code_block", "new_name": None}
+            continue
+        node_data = archeologist.graph.nodes[target_node]
+        edits_by_file.setdefault(node_data['file'], []).append(
+            (node_data['start_byte'], node_data['end_byte'], target_node, new_code, new_func_name)
+        )
+    return edits_by_file
+
+def _accept_edits(edits, results):
+    """Edits of one file in byte order, minus those overlapping an earlier one (recorded in results)."""
+    edits.sort()
+    accepted = []
+    for edit in edits:
+        if accepted and edit[0] < accepted[-1][1]:
+            results[edit[2]] = {"status": "overlap", "new_name": None, "overlaps": accepted[-1][2]}
+            continue
+        accepted.append(edit)
+    return accepted
+
+def _splice(content_bytes, accepted):
+    # Back to front, so the byte offsets of earlier edits stay valid
+    for start_byte, end_byte, _, new_code, _ in reversed(accepted):
+        content_bytes = content_bytes[:start_byte] + new_code.encode('utf-8') + content_bytes[end_byte:]
+    return content_bytes
+
+def parse_refactor(response_text):
+    """(new code ending in a newline, new function name or None), or (None, None) without a code block."""
+    new_code = extract_code_block(response_text)
+    if new_code is None:
+        return None, None
+    new_code += "\n"
+    
+    # Extract new function name - simplistic regex
+    name_match = re.search(r"def\s+([a-zA-Z_]\w*)\s*\(", new_code)
+    if not name_match:
+        name_match = re.search(r"function\s+([a-zA-Z_]\w*)\s*\(", new_code) # JS style
+    return new_code, name_match.group(1) if name_match else None
+
+def prepare_branch(archeologist, project_path, slug):
+    """
+    Makes sure project_path is a git repo with a 'main' branch and, in safe mode, checks
+    out a new ai-heal-<slug>-<time> branch in a pooled worktree (see worktrees.py).
+    Returns (branch the changes land on, directory to edit and stage them in).
+    """
+    branch_name = None
+    workdir = project_path
+    try:
+        # init / 'main' / identity are only checked on the first heal in this repo
+        repo = git_service.get_repo(project_path)
+        repo.ensure_ready()
+
+        if archeologist.safe_mode:
+            # Create Branch
+            timestamp = datetime.datetime.now().strftime("%H%M%S")
+            branch_name = f"ai-heal-{slug}-{timestamp}"
+            
+            print(f"   -> Creating safety branch: {branch_name}")
+            workdir = worktrees.get_pool(project_path).acquire(branch_name)
+        else:
+             print("   -> ⚠️ Safe Mode OFF: Applying changes directly to current branch.")
+             # Current branch name just for reporting
+             branch_name = repo.current_branch()
+        
+    except Exception as e:
+        print(f"   -> Git Ops Failed: {e}. Proceeding carefully...")
+    return branch_name, workdir
+
+def extract_code_block(response_text, allow_fallback=True):
+    """
+    The refactored code from the Architect's Markdown report, or None.
+    With allow_fallback=False only a labelled fence counts: on a report that is still
+    streaming in, a match is then guaranteed to be the one the full report yields.
+    """
+    code_match = re.search(r"```(?:python|javascript|typescript)\s*(.*?)\s*```", response_text, re.DOTALL)
+    if not code_match and allow_fallback:
+         # Fallback for unspecified language block
+         code_match = re.search(r"```\s*(.*?)\s*```", response_text, re.DOTALL)
+    return code_match.group(1).strip() if code_match else None
+
 def get_diff(branch_name, project_path):
     try:
         # Compare Staged changes (cached) against HEAD (which is the baseline before commit)
-        cmd = ["git", "diff", "--cached"]
-        result = subprocess.run(cmd, cwd=project_path, capture_output=True, text=True)
-        diff = result.stdout
+        diff = git_service.get_repo(project_path).diff_cached(worktrees.workspace_for(branch_name, project_path))
         if not diff:
             return "No textual differences found (or branches are identical)."
         return diff
     except Exception as e:
         return f"Error getting diff: {e}"
 
+def touched_files(branch_name, project_path):
+    """Files a heal changed (everything staged for it), relative to the project."""
+    return git_service.get_repo(project_path).staged_files(worktrees.workspace_for(branch_name, project_path))
+
 def merge_branch(branch_name, project_path):
+    workdir = worktrees.workspace_for(branch_name, project_path)
+    if workdir != project_path:
+        return _merge_worktree_branch(branch_name, project_path, workdir)
     try:
-        # Determine current branch
-        current_branch = subprocess.check_output(
-            ["git", "rev-parse", "--abbrev-ref", "HEAD"], 
-            cwd=project_path
-        ).decode().strip()
+        repo = git_service.get_repo(project_path)
+        current_branch = repo.current_branch()
 
         # CASE A: Safe Mode OFF (Direct Commit)
         # If the branch_name passed in IS the current branch (e.g., 'main' or 'HEAD'),
         # or if they are the same actual ref, we just commit.
         if branch_name == "HEAD" or branch_name == current_branch:
             print(f"   -> Direct commit on {current_branch} (Safe Mode OFF)")
-            subprocess.run(["git", "commit", "-m", "AI Refactor: Direct Apply"], cwd=project_path, check=True)
+            repo.commit("AI Refactor: Direct Apply")
             return True, "Changes committed successfully."
 
         # CASE B: Safe Mode ON (Merge feature branch)
         # 1. Commit the pending staged changes on the feature branch.
-        subprocess.run(["git", "commit", "-m", f"AI Refactor: {branch_name}"], cwd=project_path, check=True)
+        repo.commit(f"AI Refactor: {branch_name}")
         
         # 2. Merge into main
-        subprocess.run(["git", "checkout", "-f", "main"], cwd=project_path, check=True)
-        subprocess.run(["git", "merge", branch_name], cwd=project_path, check=True)
-        subprocess.run(["git", "branch", "-d", branch_name], cwd=project_path, check=True)
+        git_service.run(project_path, "checkout", "-q", "-f", git_service.MAIN_BRANCH)
+        repo.merge(branch_name)
+        repo.delete_branch(branch_name)
+        return True, "Merged successfully"
+    except Exception as e:
+        return False, str(e)
+
+def _merge_worktree_branch(branch_name, project_path, workdir):
+    """
+    Commits the heal in its worktree and merges it into main without switching the user's checkout.
+    Uncommitted edits the heal was built on (copied over by worktrees.sync_from_checkout) are in
+    the heal commit, so those files are reset in the checkout first; `git merge` would refuse to
+    overwrite them otherwise. Any other uncommitted edit of a file the heal touches stops the merge.
+    """
+    try:
+        repo = git_service.get_repo(project_path)
+        merge_in_checkout = repo.current_branch() == git_service.MAIN_BRANCH
+
+        carried = {}
+        if merge_in_checkout:
+            synced = worktrees.synced_files(project_path, workdir)
+            for path in sorted(set(repo.changed_files()) & set(repo.staged_files(workdir))):
+                with open(os.path.join(project_path, path), 'rb') as f:
+                    current = f.read()
+                if synced.get(path) != current:
+                    return False, (f"{path} has uncommitted changes that are not part of this heal. "
+                                   "Commit or stash them, then merge again.")
+                carried[path] = current
+
+        repo.commit(f"AI Refactor: {branch_name}", cwd=workdir)
+
+        if merge_in_checkout:
+            repo.restore(carried)
+            try:
+                repo.merge(branch_name)
+            except Exception:
+                # Put the user's edits back exactly as they were
+                git_service.run(project_path, "merge", "--abort", check=False)
+                for path, content in carried.items():
+                    with open(os.path.join(project_path, path), 'wb') as f:
+                        f.write(content)
+                raise
+        else:
+            # main isn't checked out anywhere: fast-forward the ref directly
+            repo.fast_forward(branch_name)
+
+        worktrees.get_pool(project_path).release(branch_name)
+        repo.delete_branch(branch_name)
         return True, "Merged successfully"
     except Exception as e:
         return False, str(e)
 
 def discard_branch(branch_name, project_path):
+    repo = git_service.get_repo(project_path)
+    workdir = worktrees.workspace_for(branch_name, project_path)
+    if workdir != project_path:
+        try:
+            # Resets the worktree's changes and hands it back to the pool
+            worktrees.get_pool(project_path).release(branch_name)
+            repo.delete_branch(branch_name, force=True)
+            return True, "Discarded successfully"
+        except Exception as e:
+            return False, str(e)
     try:
-         # 1. Reset any staged/uncommitted changes on the current branch
-         subprocess.run(["git", "reset", "--hard"], cwd=project_path, check=True)
-         
-         # 2. Return to main and delete the temp branch
-         subprocess.run(["git", "checkout", "-f", "main"], cwd=project_path, check=True)
-         subprocess.run(["git", "branch", "-D", branch_name], cwd=project_path, check=True)
+         # Drop staged/uncommitted changes, return to main and delete the temp branch
+         git_service.run(project_path, "checkout", "-q", "-f", git_service.MAIN_BRANCH)
+         repo.delete_branch(branch_name, force=True)
          return True, "Discarded successfully"
     except Exception as e:
          return False, str(e)
@@ -1,37 +1,177 @@
 import os
-import subprocess
+import re
+import call_index
+import git_service
+import metrics
+from pipeline.phase_1_ingestion import language_for
+from pipeline.phase_2_analysis import resolve_calls
 
-def run(archeologist, old_node_id, new_name, project_path):
+PY_FROM_IMPORT = re.compile(rb"^[ \t]*from[ \t]+(\S+)[ \t]+import[ \t]+(.*)$", re.M)
+JS_NAMED_IMPORT = re.compile(rb"import\s*\{([^}]+)\}\s*from\s*['\"]([^'\"]+)['\"]")
+
+def run(archeologist, old_node_id, new_name, project_path, renamed=None):
     """
     Phase 5: Healing the Web (Propagation)
     - Update all callers to use the new name.
+    - At most one parse, one pass and one write per file; one `git add` for all of them.
+    renamed: {node_id: new name} of the functions already spliced under a new name (batch heals).
+    Returns (rewritten sites, ids of the callers that could not be updated).
     """
     print(f"Phase 5: Propagating changes for {old_node_id} -> {new_name}...")
-    
+
+    files = {}
+    sites, failed = rewrite_callers(archeologist, old_node_id, new_name, files, project_path, renamed)
+
+    updated_files = []
+    for file_rel_path in sorted({site["file"] for site in sites}):
+        try:
+            with open(os.path.join(project_path, file_rel_path), 'wb') as f:
+                f.write(files[file_rel_path])
+            updated_files.append(file_rel_path)
+        except Exception as e:
+            print(f"      -> Error updating {file_rel_path}: {e}")
+            failed += sorted({site["caller"] for site in sites if site["file"] == file_rel_path})
+    sites = [site for site in sites if site["file"] in updated_files]
+
+    metrics.PROPAGATED_CALLERS.labels("updated").inc(len({site["caller"] for site in sites}))
+    metrics.PROPAGATED_CALLERS.labels("failed").inc(len(failed))
+
+    # Stage all rewritten callers at once so they're included in the merge
+    try:
+        git_service.stage(project_path, updated_files)
+    except Exception as e:
+        print(f"      -> Error staging callers: {e}")
+    return sites, failed
+
+def rewrite_callers(archeologist, old_node_id, new_name, files, project_path, renamed=None):
+    """
+    Renames the calls to old_node_id in all its callers, in memory.
+    files maps file_rel_path -> bytes; files not in it yet are read from project_path.
+    renamed maps the node ids already spliced under a new name to that name, so a caller
+    that is itself a target of the same batch is found under its new name.
+
+    Call sites come from the call-site index, or from parsing the file again if it no
+    longer matches the analysed version (Phase 4 spliced it, another rename ran first).
+    Only the called name token of calls that resolve to old_node_id changes, never other
+    identifiers that merely contain the old name. A call that resolves through
+    `from M import old_name [as alias]` also renames the name in that import, so the
+    binding and the call stay in step (aliased calls keep their alias). Edits are applied
+    from the end of the file backwards so the remaining offsets stay valid.
+
+    Returns (sites, failed caller ids); a site is {"caller", "file", "line", "start_byte", "end_byte", "kind"}
+    with kind "call" or "import".
+    """
     old_name = old_node_id.split('::')[1]
-    
-    # Find callers using the graph
-    callers = list(archeologist.graph.predecessors(old_node_id))
-    
-    for caller_id in callers:
-        caller_data = archeologist.graph.nodes[caller_id]
-        print(f"   -> Updating caller: {caller_id}")
-        
-        file_rel_path = caller_data['file']
-        full_path = os.path.join(project_path, file_rel_path)
+    new_name_bytes = new_name.encode('utf-8')
+
+    # Find callers using the graph, grouped by file
+    callers_by_file = {}
+    for caller_id in archeologist.graph.predecessors(old_node_id):
+        callers_by_file.setdefault(archeologist.graph.nodes[caller_id]['file'], []).append(caller_id)
+
+    sites, failed = [], []
+    for file_rel_path, callers in sorted(callers_by_file.items()):
+        print(f"   -> Updating {len(callers)} caller(s) in {file_rel_path}")
         try:
-            with open(full_path, 'r') as f:
-                content = f.read()
-            
-            # Very naive replacement: replace `old_name(` with `new_name(`
-            # In a real tool, we would use AST-based replacement
-            new_content = content.replace(f"{old_name}(", f"{new_name}(")
-            
-            with open(full_path, 'w') as f:
-                f.write(new_content)
-                
-            # Stage the change so it's included in the merge
-            subprocess.run(["git", "add", file_rel_path], cwd=project_path, check=True)
-            
+            if file_rel_path not in files:
+                with open(os.path.join(project_path, file_rel_path), 'rb') as f:
+                    files[file_rel_path] = f.read()
+            content = files[file_rel_path]
+
+            bindings = _import_bindings(archeologist, old_node_id, old_name, file_rel_path, callers)
+            names = {old_name.encode('utf-8')} | {alias.encode('utf-8') for alias in bindings}
+            edits = {} # (start_byte, end_byte) -> (caller id, kind)
+            found, used_bindings = set(), {} # alias -> first caller resolved through it
+            for caller_id, call_text, start_byte, end_byte, imports in _candidate_sites(archeologist, file_rel_path, content, callers, names, renamed or {}):
+                token = content[start_byte:end_byte]
+                if token not in names or (start_byte, end_byte) in edits:
+                    continue
+                # Same resolution rules as Phase 2, so only calls that made the graph edge change
+                scope = {'file': file_rel_path, 'imports': imports, 'calls': [call_text]}
+                if old_node_id not in resolve_calls(archeologist.file_map, caller_id, scope):
+                    continue
+                found.add(caller_id)
+                alias = token.decode('utf-8')
+                if '.' not in call_text and alias in bindings:
+                    used_bindings.setdefault(alias, caller_id)
+                if alias == old_name:
+                    edits[(start_byte, end_byte)] = (caller_id, "call")
+
+            for alias, caller_id in sorted(used_bindings.items()):
+                for start_byte, end_byte in _import_name_spans(content, file_rel_path, bindings[alias], old_name):
+                    edits.setdefault((start_byte, end_byte), (caller_id, "import"))
+
+            for (start_byte, end_byte), (caller_id, kind) in sorted(edits.items(), reverse=True):
+                sites.append({
+                    "caller": caller_id,
+                    "file": file_rel_path,
+                    "line": content.count(b"\n", 0, start_byte) + 1,
+                    "start_byte": start_byte,
+                    "end_byte": end_byte,
+                    "kind": kind,
+                })
+                content = content[:start_byte] + new_name_bytes + content[end_byte:]
+            files[file_rel_path] = content
+
+            missing = sorted(set(callers) - found)
+            if missing:
+                print(f"      -> No call site found in: {', '.join(missing)}")
+                failed += missing
+
         except Exception as e:
-            print(f"      -> Error updating caller: {e}")
+            print(f"      -> Error updating callers in {file_rel_path}: {e}")
+            failed += callers
+
+    sites.sort(key=lambda site: (site["file"], site["start_byte"]))
+    return sites, failed
+
+def _import_bindings(archeologist, old_node_id, old_name, file_rel_path, callers):
+    """{alias: module} for the file's `from M import old_name [as alias]` imports that resolve to old_node_id."""
+    bindings = {}
+    imports = archeologist.graph.nodes[callers[0]].get('imports', [])
+    for imp in imports:
+        if imp.get('name') != old_name or not imp.get('alias'):
+            continue
+        scope = {'file': file_rel_path, 'imports': [imp], 'calls': [imp['alias']]}
+        if old_node_id in resolve_calls(archeologist.file_map, callers[0], scope):
+            bindings[imp['alias']] = imp['module']
+    return bindings
+
+def _import_name_spans(content, file_rel_path, module, name):
+    """Byte ranges of `name` as the imported name (not the alias) in the file's imports from `module`."""
+    module, name = module.encode('utf-8'), name.encode('utf-8')
+    if language_for(file_rel_path) == 'python':
+        # Same shape the Python parser reads: one `from M import a, b as c` per line
+        statements = [(m.group(1), m.start(2), m.group(2)) for m in PY_FROM_IMPORT.finditer(content)]
+    else:
+        # Newlines as spaces keeps the byte offsets, as in the JavaScript parser
+        statements = [(m.group(2), m.start(1), m.group(1)) for m in JS_NAMED_IMPORT.finditer(content.replace(b"\n", b" "))]
+    spans = []
+    for statement_module, offset, names in statements:
+        if statement_module.strip() != module:
+            continue
+        for part in re.finditer(rb"[^,]+", names):
+            first = re.match(rb"\s*\(?\s*([\w$]+)", part.group(0))
+            if first and first.group(1) == name:
+                spans.append((offset + part.start() + first.start(1), offset + part.start() + first.end(1)))
+    return spans
+
+def _candidate_sites(archeologist, file_rel_path, content, callers, names, renamed):
+    """(caller id, call text, start_byte, end_byte, caller imports) for calls of `names` by `callers` in content."""
+    if archeologist.call_index.digest(file_rel_path) == call_index.file_digest(content):
+        # Unchanged since analysis: the index has the exact offsets, no parse needed
+        for name in names:
+            for site in archeologist.call_index.sites(name.decode('utf-8'), files={file_rel_path}):
+                if site["caller"] in callers:
+                    imports = archeologist.graph.nodes[site["caller"]].get('imports', [])
+                    yield site["caller"], site["call"], site["start_byte"], site["end_byte"], imports
+        return
+
+    # Callers spliced earlier in the same batch are defined under their new name by now
+    callers_by_name = {renamed.get(caller_id) or caller_id.split('::')[1]: caller_id for caller_id in callers}
+    for func_def in archeologist.parser_manager.parse(content, language_for(file_rel_path)):
+        caller_id = callers_by_name.get(func_def['name'])
+        if caller_id is None:
+            continue
+        for call_text, start_byte, end_byte in func_def.get('call_sites', []):
+            yield caller_id, call_text, start_byte, end_byte, func_def.get('imports', [])
@@ -0,0 +1,161 @@
+"""
+Background precomputation of explanations (and optionally heal plans) for hotspots.
+
+After an analysis, the top-N nodes by complexity x fan-in are explained ahead of
+time so the first click on them is instant. Results are keyed by a hash of the
+node's code, so an edited function is simply a miss. Heal plans are also keyed by
+the node: their prompt names its file, callers and similar functions, so clones
+with identical bodies must not share one.
+
+The scheduler is deliberately low priority:
+- it runs one LLM call at a time, through the normal per-provider limiter and token bucket
+- it pauses while any interactive /explain or /heal request is in flight
+
+    PRECOMPUTE_ENABLED=1
+    PRECOMPUTE_TOP_N=20
+    PRECOMPUTE_PLANS=0        (also pre-generate Architect heal plans; costs more tokens)
+"""
+import asyncio
+import contextlib
+import hashlib
+import math
+import os
+
+from pipeline import phase_3_strategy
+
+MAX_ENTRIES = 2000
+EXPLAIN = "explain"
+PLAN = "plan"
+
+
+def code_hash(code):
+    return hashlib.sha256((code or "").encode("utf-8")).hexdigest()
+
+
+def node_key(kind, node_id):
+    """The node part of a store key: explanations only depend on the code, plans on where it lives too."""
+    return node_id if kind == PLAN else None
+
+
+RANKINGS = {
+    "hotspot": lambda graph, node, data: (data.get("complexity") or 1) * (1 + math.log1p(graph.in_degree(node))),
+    "complexity": lambda graph, node, data: data.get("complexity") or 1,
+    "fan_in": lambda graph, node, data: graph.in_degree(node),
+}
+
+
+def rank_hotspots(graph, top_n, by="hotspot"):
+    """Top-N nodes; by default the most complex, most depended-upon functions first."""
+    score = RANKINGS[by]
+    scored = [(score(graph, node, data), node) for node, data in graph.nodes(data=True)]
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [node for _, node in scored[:top_n]]
+
+
+class PrecomputeStore:
+    """(kind, node id or None, code hash) -> text. Insertion-ordered, oldest entries evicted first."""
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = {}
+
+    def get(self, kind, code, node_id=None):
+        return self.entries.get((kind, node_id, code_hash(code)))
+
+    def put(self, kind, code, text, node_id=None):
+        key = (kind, node_id, code_hash(code))
+        self.entries.pop(key, None)
+        self.entries[key] = text
+        while len(self.entries) > self.max_entries:
+            self.entries.pop(next(iter(self.entries)))
+
+
+class PrecomputeScheduler:
+    def __init__(self):
+        self.store = PrecomputeStore()
+        self.task = None
+        self.interactive_requests = 0
+        self._idle = None # asyncio.Event, created on the server loop
+        self.status = {"state": "idle", "targets": 0, "explained": 0, "planned": 0, "failed": 0}
+
+    def _idle_event(self):
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            self._idle.set()
+        return self._idle
+
+    @contextlib.contextmanager
+    def interactive(self):
+        """Wrap user-facing LLM requests: background work waits until none are running."""
+        idle = self._idle_event()
+        self.interactive_requests += 1
+        idle.clear()
+        try:
+            yield
+        finally:
+            self.interactive_requests -= 1
+            if self.interactive_requests == 0:
+                idle.set()
+
+    def lookup(self, kind, archeologist, node_id):
+        code = archeologist.graph.nodes[node_id].get("code", "")
+        return self.store.get(kind, code, node_key(kind, node_id))
+
+    async def start(self, archeologist):
+        """(Re)starts precomputation for a freshly analysed graph. Must run on the server loop."""
+        self.cancel()
+        if os.getenv("PRECOMPUTE_ENABLED", "1").lower() in ("0", "false", "no") or not archeologist.has_ai:
+            return
+        self.task = asyncio.ensure_future(self._run(archeologist))
+
+    def cancel(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+        self.task = None
+        self.status["state"] = "idle"
+
+    async def _run(self, archeologist):
+        top_n = int(os.getenv("PRECOMPUTE_TOP_N", "20"))
+        with_plans = os.getenv("PRECOMPUTE_PLANS", "0").lower() in ("1", "true", "yes")
+        targets = rank_hotspots(archeologist.graph, top_n)
+        self.status = {"state": "running", "targets": len(targets), "explained": 0, "planned": 0, "failed": 0}
+        print(f"   -> Precomputing explanations{' and heal plans' if with_plans else ''} for {len(targets)} hotspots in the background...")
+
+        for node_id in targets:
+            if node_id not in archeologist.graph.nodes:
+                continue
+            code = archeologist.graph.nodes[node_id].get("code", "")
+            if self.store.get(EXPLAIN, code) is None:
+                await self._job(EXPLAIN, code, lambda: self._explain(archeologist, node_id))
+            if with_plans and self.store.get(PLAN, code, node_id) is None:
+                await self._job(PLAN, code, lambda: self._plan(archeologist, node_id), node_id)
+
+        self.status["state"] = "done"
+        print(f"   -> Precompute done: {self.status['explained']} explanations, {self.status['planned']} plans.")
+
+    async def _job(self, kind, code, make_text, node_id=None):
+        await self._idle_event().wait()
+        try:
+            text = await make_text()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.status["failed"] += 1
+            print(f"   ⚠️ Precompute ({kind}) failed: {e}")
+            return
+        if text:
+            self.store.put(kind, code, text, node_id)
+            self.status["explained" if kind == EXPLAIN else "planned"] += 1
+
+    async def _explain(self, archeologist, node_id):
+        prompt = phase_3_strategy.build_explain_prompt(archeologist, node_id)
+        return (await archeologist.model.agenerate_content(prompt)).text
+
+    async def _plan(self, archeologist, node_id):
+        # Same prompt as an interactive heal; context building touches the vector DB, so off the loop
+        prepared = await asyncio.to_thread(phase_3_strategy.prepare_heal_prompt, archeologist, node_id)
+        if not prepared:
+            return None
+        return (await archeologist.architect.agenerate_content(prepared[1])).text
+
+
+scheduler = PrecomputeScheduler()
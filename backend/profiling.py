@@ -0,0 +1,204 @@
+"""
+Code Archeologist - On-demand Profiling
+Opt-in profiling of pipeline runs (per request, or globally via /profiling).
+
+Each job gets:
+- a cProfile per top-level section (one per phase), downloadable as pstats
+- a stack sampler whose collapsed stacks are prefixed with the active sections,
+  e.g. "analyze;1_ingestion;lang:python;parse (python_parser.py:11);..."
+  so flamegraphs break down per phase and per language.
+
+When no job is being profiled on the current thread, section() is a single
+thread-local lookup.
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MAX_PROFILES = 20
+SAMPLE_INTERVAL = 0.005
+
+# Global switch flipped by POST /profiling: profile every job, not just opted-in ones
+ALWAYS_ON = False
+
+_local = threading.local()
+_profiles = OrderedDict() # job_id -> ProfileSession (most recent last)
+_profiles_lock = threading.Lock()
+
+
+class ProfileSession:
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.started = time.time()
+        self.duration = None
+        self.sections = [] # Active section labels (outermost first)
+        self.profiles = {} # top-level section -> cProfile.Profile
+        self.samples = Counter() # collapsed stack -> sample count
+        self.notes = []
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    # --- Sampling ---
+
+    def start_sampler(self, interval=SAMPLE_INTERVAL):
+        self._sampler = threading.Thread(target=self._sample_loop, args=(interval,), daemon=True)
+        self._sampler.start()
+
+    def stop_sampler(self):
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+
+    def _sample_loop(self, interval):
+        while not self._stop.wait(interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"))
+                frame = frame.f_back
+            stack.reverse()
+
+            # Drop the server/threadpool plumbing below our own code
+            for i, (filename, _) in enumerate(stack):
+                if filename.startswith(BACKEND_DIR) and "site-packages" not in filename:
+                    stack = stack[i:]
+                    break
+
+            prefix = [self.kind] + list(self.sections)
+            self.samples[";".join(prefix + [label for _, label in stack])] += 1
+
+    # --- Exports ---
+
+    def stats(self, section=None):
+        selected = [p for name, p in self.profiles.items() if section in (None, name)]
+        if not selected:
+            return None
+        stats = pstats.Stats(selected[0])
+        for p in selected[1:]:
+            stats.add(p)
+        return stats
+
+    def pstats_bytes(self, section=None):
+        """Same bytes Stats.dump_stats() would write; load with pstats.Stats(path)."""
+        stats = self.stats(section)
+        return marshal.dumps(stats.stats) if stats else b""
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed-stack format, ready for flamegraph.pl / speedscope."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def summary(self, top=15):
+        # Self samples attributed to each section path (phase, phase;lang:x, ...)
+        breakdown = Counter()
+        for stack, count in self.samples.items():
+            frames = stack.split(";")[1:]
+            path = []
+            for frame in frames:
+                if "(" in frame: # First real frame: end of the section prefix
+                    break
+                path.append(frame)
+            breakdown[";".join(path) or "(outside phases)"] += count
+
+        top_functions = []
+        stats = self.stats()
+        if stats:
+            buf = io.StringIO()
+            stats.stream = buf
+            stats.sort_stats("cumulative").print_stats(top)
+            top_functions = buf.getvalue().splitlines()
+
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "started": self.started,
+            "duration": self.duration,
+            "sample_interval": SAMPLE_INTERVAL,
+            "total_samples": sum(self.samples.values()),
+            "sections": dict(breakdown.most_common()),
+            "pstats_sections": list(self.profiles.keys()),
+            "top_functions": top_functions,
+            "notes": self.notes
+        }
+
+
+@contextmanager
+def profile_job(kind, enabled=False):
+    """
+    Profiles everything run inside the block on this thread if enabled (or ALWAYS_ON).
+    Yields the ProfileSession, or None when profiling is off.
+    """
+    if not (enabled or ALWAYS_ON) or getattr(_local, "session", None):
+        yield None
+        return
+
+    session = ProfileSession(kind)
+    _local.session = session
+    session.start_sampler()
+    start = time.perf_counter()
+    try:
+        yield session
+    finally:
+        session.duration = time.perf_counter() - start
+        session.stop_sampler()
+        _local.session = None
+        with _profiles_lock:
+            _profiles[session.id] = session
+            while len(_profiles) > MAX_PROFILES:
+                _profiles.popitem(last=False)
+        print(f"   -> Profile {session.id} stored ({sum(session.samples.values())} samples).")
+
+
+@contextmanager
+def section(label):
+    """Marks a nested section (phase, language, ...) of the current profiled job."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        yield
+        return
+
+    profiler = None
+    if not session.sections:
+        # Top-level section: a phase may run more than once per job, keep accumulating
+        profiler = session.profiles.get(label) or cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Python 3.12+: only one cProfile may run per process (e.g. concurrent jobs)
+            session.notes.append(f"cProfile unavailable for {label}: {e}")
+            profiler = None
+
+    session.sections.append(label)
+    try:
+        yield
+    finally:
+        session.sections.pop()
+        if profiler:
+            profiler.disable()
+            session.profiles[label] = profiler
+
+
+def get(job_id):
+    with _profiles_lock:
+        return _profiles.get(job_id)
+
+
+def list_profiles():
+    with _profiles_lock:
+        return [
+            {"id": s.id, "kind": s.kind, "started": s.started, "duration": s.duration}
+            for s in reversed(_profiles.values())
+        ]
@@ -0,0 +1,81 @@
+"""
+Caches behind /search and /search/batch.
+
+- Query embeddings, keyed by (embedding model, query text). Process-wide: a query
+  embeds to the same vector whatever the repo, so they survive re-analysis.
+- Search results, keyed by (query, n_results, mode, graph version). One per
+  CodeArcheologist; Phase 1 bumps the graph version whenever the indexes change,
+  which makes every older entry unreachable (they age out of the LRU).
+
+    SEARCH_CACHE_SIZE=2048
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+
+
+class LRUCache:
+    def __init__(self, name, max_entries=None):
+        self.name = name
+        self.max_entries = max_entries or int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+        metrics.SEARCH_CACHE.labels(self.name, "hit" if value is not None else "miss").inc()
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+embeddings = LRUCache("embedding")
+
+
+def embedding_function(collection):
+    """(model name, callable) the collection embeds queries with, or None if it only takes texts."""
+    embedder = getattr(collection, "embedder", None) # vector_index.LocalVectorCollection
+    if embedder is not None:
+        return embedder.name, embedder
+    embedder = getattr(collection, "_embedding_function", None) # chromadb Collection
+    if embedder is not None:
+        name = embedder.name() if callable(getattr(embedder, "name", None)) else type(embedder).__name__
+        return name, embedder
+    return None
+
+
+def embed_queries(collection, texts):
+    """
+    Embeddings for texts: cached ones from the LRU, the rest in one call of the
+    collection's embedding function. None if the collection can't embed client-side.
+    """
+    function = embedding_function(collection)
+    if function is None:
+        return None
+    model, embed = function
+    vectors = {text: embeddings.get((model, text)) for text in texts}
+    missing = [text for text, vector in vectors.items() if vector is None]
+    if missing:
+        for text, vector in zip(missing, embed(missing)):
+            vectors[text] = np.asarray(vector, dtype=np.float32)
+            embeddings.put((model, text), vectors[text])
+    return [vectors[text] for text in texts]
@@ -4,14 +4,16 @@ Exposes endpoints for code graph analysis, visualization data, and AI-driven cod
 Powered by FastAPI, NetworkX, and Google Gemini.
 """
 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import networkx as nx
 import os
 import sys
 import importlib
 import asyncio
+import json
 from typing import List
 
 # Add current directory to path so we can import modules
@@ -19,6 +21,14 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import Core (Refactored)
 import core
+import graph_stream
+import metrics
+import profiling
+import llm_cache
+import precompute
+import heal_preview
+import call_index
+import chroma_pool
 
 app = FastAPI()
 
@@ -53,6 +63,57 @@ class ConnectionManager:
 manager = ConnectionManager()
 GLOBAL_LOOP = None
 
+class GraphStreamManager(ConnectionManager):
+    """
+    Fans out graph frames (see graph_stream.py) to /ws/graph clients.
+    Keeps the frames of the current run so late joiners can catch up.
+    """
+    def __init__(self):
+        super().__init__()
+        self.history: List[str] = []
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        # Replay until caught up; frames published meanwhile are picked up by the loop,
+        # and a new run starting mid-replay restarts it from that run's BEGIN frame.
+        history, i = self.history, 0
+        while True:
+            if history is not self.history:
+                history, i = self.history, 0
+            if i >= len(history):
+                break
+            await websocket.send_text(history[i])
+            i += 1
+        live = bool(self.history) and not self.history[-1].startswith(f'["{graph_stream.END}"')
+        await websocket.send_text(graph_stream.encode_frame(graph_stream.REPLAY_DONE, live))
+        self.active_connections.append(websocket)
+
+    async def publish(self, frame: str):
+        if frame.startswith(f'["{graph_stream.BEGIN}"'):
+            self.history = []
+        self.history.append(frame)
+        await self.broadcast(frame)
+
+graph_manager = GraphStreamManager()
+
+def publish_graph_frame(frame):
+    """Sink for GraphStreamer. Called from the worker thread running the pipeline."""
+    if GLOBAL_LOOP:
+        asyncio.run_coroutine_threadsafe(graph_manager.publish(frame), GLOBAL_LOOP)
+
+# LLM token streams (/ws/llm). Clients pick a stream_id, pass it to /explain or /heal
+# and receive {"stream": id, "event": "token" | "done" | "error", "text": ...} frames.
+llm_manager = ConnectionManager()
+
+def llm_stream_sink(stream_id):
+    """Async on_token callback forwarding chunks of one generation to /ws/llm."""
+    async def on_token(text):
+        await llm_manager.broadcast(json.dumps({"stream": stream_id, "event": "token", "text": text}))
+    return on_token
+
+async def end_llm_stream(stream_id, event="done", text=""):
+    await llm_manager.broadcast(json.dumps({"stream": stream_id, "event": event, "text": text}))
+
 class StreamToLogger:
     def __init__(self, original_stream):
         self.original_stream = original_stream
@@ -96,12 +157,37 @@ def backend_logger(msg):
 # Global Archaeologist Instance
 archeologist = None
 CURRENT_REPO = "/workspace/test_codebase"
+MAX_BATCH_QUERIES = 256
 
 class HealRequest(BaseModel):
     node_id: str
+    profile: bool = False
+    no_cache: bool = False # Skip the LLM response cache (force a fresh plan)
+    stream_id: str | None = None # Stream the Architect's report to /ws/llm under this id
+    dry_run: bool = False # Return a diff preview (see /heal/apply) instead of writing anything
+
+class BatchHealRequest(BaseModel):
+    # Either explicit targets, or the top_n nodes of a ranking (see precompute.RANKINGS)
+    node_ids: List[str] | None = None
+    top_n: int | None = None
+    rank_by: str = "hotspot"
+    max_parallel: int = 4 # Concurrent Phase 3 plans
+    no_cache: bool = False
+    dry_run: bool = False
+
+class ApplyPreviewRequest(BaseModel):
+    preview_id: str
+    merge: bool = True # Commit and merge into main right away (False: leave the heal branch staged for review)
 
 class SearchRequest(BaseModel):
     query: str
+    n_results: int = 3 # Capped at phase_3_strategy.MAX_SEARCH_RESULTS
+    mode: str = "hybrid" # hybrid | lexical | vector
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    n_results: int = 3
+    mode: str = "hybrid"
 
 class ExplainRequest(BaseModel):
     node_id: str
@@ -109,10 +195,19 @@ class ExplainRequest(BaseModel):
 class GitOperationRequest(BaseModel):
     branch_name: str
 
+class ProfilingRequest(BaseModel):
+    enabled: bool
+
 @app.get("/")
 def read_root():
     return {"status": "Code Archeologist API Ready"}
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint (phase durations, parse throughput, vector DB and LLM latency, graph size)."""
+    payload, content_type = metrics.render()
+    return Response(content=payload, media_type=content_type)
+
 @app.get("/status")
 def get_status():
     """
@@ -133,6 +228,8 @@ def get_status():
         "analyzed": node_count > 0,
         "node_count": node_count,
         "vector_db_connected": getattr(archeologist, 'has_memory', False),
+        "vector_backend": getattr(archeologist, 'vector_backend', None),
+        "chroma": chroma_pool.pool.status(),
         "ai_connected": getattr(archeologist, 'has_ai', False),
         "repo_path": CURRENT_REPO
     }
@@ -147,8 +244,31 @@ async def websocket_endpoint(websocket: WebSocket):
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
+@app.websocket("/ws/graph")
+async def graph_websocket_endpoint(websocket: WebSocket):
+    """
+    Streams node batches (Phase 1) and edge batches (Phase 2) while analysis runs.
+    On connect, the frames of the latest run are replayed, followed by ["r", live].
+    """
+    await graph_manager.connect(websocket)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        graph_manager.disconnect(websocket)
+
+@app.websocket("/ws/llm")
+async def llm_websocket_endpoint(websocket: WebSocket):
+    """Streams LLM output token by token for requests that passed a stream_id."""
+    await llm_manager.connect(websocket)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        llm_manager.disconnect(websocket)
+
 @app.post("/analyze")
-def trigger_analysis(repo_path: str = None):
+def trigger_analysis(repo_path: str = None, profile: bool = False):
     global CURRENT_REPO, archeologist
     
     if repo_path:
@@ -163,19 +283,26 @@ def trigger_analysis(repo_path: str = None):
         # Instantiate Core (Lazy Loading happens here now!)
         # This will trigger the 'Initializing...' logs via print -> StreamToLogger -> WS
         archeologist = core.CodeArcheologist()
+        archeologist.graph_stream.sink = publish_graph_frame
         
         # Execute Analysis Pipeline
-        archeologist.phase_1_ingest(target_repo)
-        archeologist.phase_2_analyze()
+        with profiling.profile_job("analyze", enabled=profile) as job:
+            archeologist.phase_1_ingest(target_repo)
+            archeologist.phase_2_analyze()
         
         node_count = archeologist.graph.number_of_nodes()
         print(f"✅ Analysis complete. Nodes: {node_count}")
         print("ANALYSIS_COMPLETE") # Signal for frontend to switch view
 
+        # Warm up explanations for the hotspots while the user looks at the graph
+        if GLOBAL_LOOP:
+            asyncio.run_coroutine_threadsafe(precompute.scheduler.start(archeologist), GLOBAL_LOOP)
+
         return {
             "message": "Analysis complete", 
             "node_count": node_count,
-            "edge_count": archeologist.graph.number_of_edges()
+            "edge_count": archeologist.graph.number_of_edges(),
+            "profile_id": job.id if job else None
         }
     except Exception as e:
         import traceback
@@ -186,17 +313,35 @@ def trigger_analysis(repo_path: str = None):
 
 class ExplainRequest(BaseModel):
     node_id: str
+    no_cache: bool = False # Skip the LLM response cache (force a fresh explanation)
+    stream_id: str | None = None # Stream the explanation to /ws/llm under this id
 
 @app.post("/explain")
-def explain_node(request: ExplainRequest):
+async def explain_node(request: ExplainRequest):
     """
     GenAI Endpoint: Explains what a specific function does in plain English.
+    Async: many explains can wait on the provider at once without holding worker threads.
     """
     node_id = request.node_id
     if node_id not in archeologist.graph.nodes:
          raise HTTPException(status_code=404, detail="Node not found")
     
-    explanation = archeologist.explain_function(node_id)
+    explanation = None if request.no_cache else precompute.scheduler.lookup(precompute.EXPLAIN, archeologist, node_id)
+    if explanation is not None:
+        if request.stream_id:
+            await llm_stream_sink(request.stream_id)(explanation)
+            await end_llm_stream(request.stream_id)
+        return {"explanation": explanation}
+
+    with precompute.scheduler.interactive():
+        if not request.stream_id:
+            explanation = await archeologist.aexplain_function(node_id, use_cache=not request.no_cache)
+            return {"explanation": explanation}
+
+        explanation = await archeologist.aexplain_function(
+            node_id, use_cache=not request.no_cache, on_token=llm_stream_sink(request.stream_id)
+        )
+    await end_llm_stream(request.stream_id)
     return {"explanation": explanation}
 
 @app.get("/graph")
@@ -218,11 +363,69 @@ def run_search(request: SearchRequest):
     Returns: List of matching nodes to highlight in the UI.
     """
     print(f"Received Search Query: {request.query}")
-    results = archeologist.rag_search(request.query)
+    results = archeologist.rag_search(request.query, request.n_results, request.mode)
     return {"results": results}
 
+@app.post("/search/batch")
+def run_search_batch(request: BatchSearchRequest):
+    """
+    Many searches in one request: the vector DB gets a single query with every text that
+    needs it, and repeated queries come from the search caches.
+    Returns: {"results": [{"query", "results"}]} in request order.
+    """
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch.")
+    if archeologist is None:
+        return {"results": [{"query": q, "results": []} for q in request.queries]}
+    print(f"Received Batch Search: {len(request.queries)} queries")
+    results = archeologist.rag_search_batch(request.queries, request.n_results, request.mode)
+    return {"results": [{"query": q, "results": r} for q, r in zip(request.queries, results)]}
+
+@app.get("/usages")
+def find_usages(node_id: str = None, name: str = None):
+    """
+    Find usages from the call-site index, without reading any source:
+    node_id -> the calls that resolve to that function (its incoming edges, site by site);
+    name -> every call of any function with that name.
+    Before an analysis has run, name lookups use the index persisted by the last one.
+    """
+    if not node_id and not name:
+        raise HTTPException(status_code=400, detail="Provide node_id or name.")
+    if archeologist is None or archeologist.graph.number_of_nodes() == 0:
+        if node_id:
+            raise HTTPException(status_code=400, detail="System not initialized.")
+        try:
+            index = call_index.CallSiteIndex.load(call_index.path_for(CURRENT_REPO))
+        except (OSError, ValueError):
+            raise HTTPException(status_code=404, detail="No call-site index for this repository yet.")
+        sites = index.sites(name)
+    elif node_id:
+        if node_id not in archeologist.graph.nodes:
+            raise HTTPException(status_code=404, detail="Node not found")
+        sites = archeologist.find_usages(node_id)
+    else:
+        sites = archeologist.call_index.sites(name)
+    return {"sites": sites, "callers": sorted({site["caller"] for site in sites})}
+
+@app.get("/clones")
+def list_clones(node_id: str = None, min_size: int = 2):
+    """
+    Clusters of near-duplicate functions (MinHash/LSH over normalised body tokens, see clones.py).
+    node_id -> just the cluster containing that function (empty if it has no clones).
+    """
+    if archeologist is None or archeologist.graph.number_of_nodes() == 0:
+        raise HTTPException(status_code=400, detail="System not initialized.")
+    if node_id:
+        if node_id not in archeologist.graph.nodes:
+            raise HTTPException(status_code=404, detail="Node not found")
+        group = archeologist.graph.nodes[node_id].get('clone_group')
+        clusters = [archeologist.clone_index.cluster(group)] if group is not None else []
+    else:
+        clusters = [c for c in archeologist.clones if len(c["members"]) >= min_size]
+    return {"clusters": clusters, "stats": archeologist.clone_index.stats()}
+
 @app.post("/heal")
-def heal_node(request: HealRequest):
+async def heal_node(request: HealRequest):
     if archeologist is None:
         raise HTTPException(status_code=400, detail="System not initialized.")
 
@@ -232,36 +435,245 @@ def heal_node(request: HealRequest):
          raise HTTPException(status_code=404, detail="Node not found")
          
     try:
-        # Phase 3: Strategy
-        plan = archeologist.phase_3_strategy(CURRENT_REPO, specific_target=node_id)
+        precomputed = None if request.no_cache else precompute.scheduler.lookup(precompute.PLAN, archeologist, node_id)
+        if request.dry_run:
+            return await _heal_preview(node_id, precomputed, request)
+
+        if precomputed is not None:
+            print(f"   -> Using precomputed heal plan for {node_id}.")
+            if request.stream_id:
+                await llm_stream_sink(request.stream_id)(precomputed)
+                await end_llm_stream(request.stream_id)
+            return await run_in_threadpool(_execute_heal, (node_id, precomputed))
+
+        if request.profile or profiling.ALWAYS_ON:
+            # Profiled heals run every phase on one worker thread so the profilers see all of them
+            return await run_in_threadpool(_heal_profiled, node_id, request.profile, not request.no_cache)
+
+        with precompute.scheduler.interactive():
+            if request.stream_id:
+                return await _heal_streamed(node_id, request.stream_id, not request.no_cache)
+
+            # Phase 3: Strategy (async: waits on the provider without holding a worker thread)
+            plan = await archeologist.aphase_3_strategy(CURRENT_REPO, specific_target=node_id, use_cache=not request.no_cache)
         
         if not plan:
             return {"status": "skipped", "message": "AI could not generate a plan"}
-            
-        target_node, ai_response = plan
-        
-        # Phase 4: Execution
-        new_name, branch_name = archeologist.phase_4_execution(plan, CURRENT_REPO)
-        
-        # Phase 5: Propagation
-        updated_callers = []
-        if new_name:
-             # Capture stdout or modify phase_5 to return info, 
-             # but for now we just run it.
-             archeologist.phase_5_propagation(target_node, new_name, CURRENT_REPO)
-             updated_callers = list(archeologist.graph.predecessors(target_node))
 
-        return {
-            "status": "success",
-            "old_node": target_node,
-            "new_name": new_name,
-            "branch": branch_name, 
-            "ai_report": ai_response,
-            "propagated_to": updated_callers
-        }
+        # Phases 4 & 5 touch git and the file system
+        return await run_in_threadpool(_execute_heal, plan)
     except Exception as e:
+        if request.stream_id:
+            await end_llm_stream(request.stream_id, "error", str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _heal_streamed(node_id, stream_id, use_cache):
+    """
+    Heal with the Architect's report streamed to /ws/llm.
+    Phases 4 & 5 start as soon as the refactored code block is complete,
+    while the rest of the report is still being generated.
+    """
+    execution = []
+
+    async def on_code_block(target_node, text_so_far):
+        execution.append(asyncio.ensure_future(run_in_threadpool(_execute_heal, (target_node, text_so_far))))
+
+    plan = await archeologist.aphase_3_strategy(
+        CURRENT_REPO, specific_target=node_id, use_cache=use_cache,
+        on_token=llm_stream_sink(stream_id), on_code_block=on_code_block
+    )
+    await end_llm_stream(stream_id)
+
+    if execution:
+        # Already applied from the code block: wait for it even if the rest of the report failed
+        result = await execution[0]
+        if plan:
+            result["ai_report"] = plan[1]
+        return result
+
+    if not plan:
+        return {"status": "skipped", "message": "AI could not generate a plan"}
+    return await run_in_threadpool(_execute_heal, plan)
+
+async def _heal_preview(node_id, precomputed, request):
+    """Dry run: Phase 3 as usual, then Phases 4 & 5 in memory only."""
+    plan = (node_id, precomputed) if precomputed is not None else None
+    if plan is None:
+        with precompute.scheduler.interactive():
+            plan = await archeologist.aphase_3_strategy(
+                CURRENT_REPO, specific_target=node_id, use_cache=not request.no_cache,
+                on_token=llm_stream_sink(request.stream_id) if request.stream_id else None
+            )
+    elif request.stream_id:
+        await llm_stream_sink(request.stream_id)(precomputed)
+    if request.stream_id:
+        await end_llm_stream(request.stream_id)
+
+    if not plan:
+        return {"status": "skipped", "message": "AI could not generate a plan"}
+    preview = await run_in_threadpool(heal_preview.build, archeologist, [plan], CURRENT_REPO)
+    result = preview.results[node_id]
+    return {
+        "status": "preview" if result["status"] == "ready" else result["status"], # partial still has a preview_id
+        "preview_id": preview.id,
+        "old_node": node_id,
+        "new_name": result["new_name"],
+        "ai_report": plan[1],
+        "propagated_to": result["propagated_to"],
+        "propagated_sites": result["propagated_sites"],
+        "propagation_failed": result["propagation_failed"],
+        "files": preview.file_diffs()
+    }
+
+def _execute_heal(plan):
+    """Phase 4 (Execution) + Phase 5 (Propagation) for a plan returned by Phase 3."""
+    target_node, ai_response = plan
+    
+    # Phase 4: Execution
+    new_name, branch_name = archeologist.phase_4_execution(plan, CURRENT_REPO)
+    
+    # Phase 5: Propagation
+    sites, failed = [], []
+    if new_name:
+         # Callers are updated in the heal's own worktree, next to the spliced function
+         sites, failed = archeologist.phase_5_propagation(target_node, new_name, archeologist.workspace_for(branch_name, CURRENT_REPO))
+
+    return {
+        # partial: the function was healed but some callers still use the old name
+        "status": "partial" if failed else "success",
+        "old_node": target_node,
+        "new_name": new_name,
+        "branch": branch_name, 
+        "ai_report": ai_response,
+        "propagated_to": sorted({site["caller"] for site in sites}),
+        "propagated_sites": sites,
+        "propagation_failed": failed,
+        "profile_id": None
+    }
+
+def _heal_profiled(node_id, profile, use_cache=True):
+    with profiling.profile_job("heal", enabled=profile) as job:
+        plan = archeologist.phase_3_strategy(CURRENT_REPO, specific_target=node_id, use_cache=use_cache)
+        if not plan:
+            return {"status": "skipped", "message": "AI could not generate a plan"}
+        result = _execute_heal(plan)
+    result["profile_id"] = job.id if job else None
+    return result
+
+@app.post("/heal/batch")
+async def heal_batch(request: BatchHealRequest):
+    """
+    Heals many nodes in one go: plans concurrently (bounded by max_parallel),
+    then applies every non-overlapping splice on a single branch, one write per file.
+    """
+    if archeologist is None:
+        raise HTTPException(status_code=400, detail="System not initialized.")
+    if request.rank_by not in precompute.RANKINGS:
+        raise HTTPException(status_code=400, detail=f"rank_by must be one of {sorted(precompute.RANKINGS)}")
+
+    if request.node_ids:
+        targets = list(dict.fromkeys(request.node_ids))
+    elif request.top_n:
+        targets = precompute.rank_hotspots(archeologist.graph, request.top_n, request.rank_by)
+    else:
+        raise HTTPException(status_code=400, detail="Provide node_ids or top_n.")
+
+    results = {n: {"status": "not_found", "new_name": None} for n in targets if n not in archeologist.graph.nodes}
+    targets = [n for n in targets if n not in results]
+    print(f"Batch heal: planning {len(targets)} targets ({max(1, request.max_parallel)} at a time)...")
+
+    semaphore = asyncio.Semaphore(max(1, request.max_parallel))
+    async def plan_one(node_id):
+        async with semaphore:
+            precomputed = None if request.no_cache else precompute.scheduler.lookup(precompute.PLAN, archeologist, node_id)
+            if precomputed is not None:
+                return (node_id, precomputed)
+            return await archeologist.aphase_3_strategy(CURRENT_REPO, specific_target=node_id, use_cache=not request.no_cache)
+
+    with precompute.scheduler.interactive():
+        plans = await asyncio.gather(*[plan_one(n) for n in targets], return_exceptions=True)
+
+    ready = []
+    for node_id, plan in zip(targets, plans):
+        if isinstance(plan, Exception) or not plan:
+            results[node_id] = {"status": "no_plan", "new_name": None,
+                                "error": str(plan) if isinstance(plan, Exception) else None}
+        else:
+            ready.append(plan)
+
+    branch_name = None
+    preview = None
+    if ready and request.dry_run:
+        preview = await run_in_threadpool(heal_preview.build, archeologist, ready, CURRENT_REPO)
+        reports = dict(ready)
+        for node_id, result in preview.results.items():
+            results[node_id] = {**result, "ai_report": reports.get(node_id)}
+    elif ready:
+        applied, branch_name = await run_in_threadpool(_execute_batch, ready)
+        results.update(applied)
+
+    counts = {}
+    for result in results.values():
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    response = {
+        "status": "success" if counts.get("applied") or counts.get("partial") else "skipped",
+        "branch": branch_name,
+        "summary": counts,
+        "results": [{"node_id": n, **results[n]} for n in request.node_ids or targets if n in results]
+    }
+    if request.dry_run:
+        response["status"] = "preview" if counts.get("ready") or counts.get("partial") else "skipped"
+        response["preview_id"] = preview.id if preview else None
+        response["files"] = preview.file_diffs() if preview else []
+    return response
+
+def _execute_batch(plans):
+    """Phase 4 (one pass per file, one branch) + Phase 5 for every renamed target."""
+    reports = dict(plans)
+    results, branch_name = archeologist.phase_4_batch_execution(plans, CURRENT_REPO)
+    # Every splice is done before any propagation: callers that are targets too have their new name
+    renamed = {node_id: r["new_name"] for node_id, r in results.items() if r["status"] == "applied" and r["new_name"]}
+    for node_id, result in results.items():
+        result["ai_report"] = reports.get(node_id)
+        result["propagated_to"] = []
+        result["propagated_sites"] = []
+        result["propagation_failed"] = []
+        if node_id in renamed:
+            sites, failed = archeologist.phase_5_propagation(node_id, renamed[node_id], archeologist.workspace_for(branch_name, CURRENT_REPO), renamed)
+            result["propagated_to"] = sorted({site["caller"] for site in sites})
+            result["propagated_sites"] = sites
+            result["propagation_failed"] = failed
+            if failed:
+                result["status"] = "partial"
+    return results, branch_name
+
+@app.post("/heal/apply")
+def apply_heal_preview(request: ApplyPreviewRequest):
+    """Accepts a dry-run preview: writes exactly the previewed files on a heal branch and (by default) merges it."""
+    if archeologist is None:
+        raise HTTPException(status_code=400, detail="System not initialized.")
+    preview = heal_preview.store.pop(request.preview_id)
+    if preview is None:
+        raise HTTPException(status_code=404, detail="Preview not found or expired.")
+    try:
+        branch_name = heal_preview.apply(archeologist, preview, CURRENT_REPO)
+    except heal_preview.StalePreviewError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if branch_name is None:
+        return {"status": "skipped", "message": "Preview has no changes."}
+    if not request.merge:
+        return {"status": "success", "branch": branch_name, "merged": False}
+
+    touched = _touched_files(branch_name)
+    success, msg = archeologist.merge_branch(branch_name, CURRENT_REPO)
+    if not success:
+        # Nothing was merged: drop the heal branch and keep the preview so it can be applied again
+        archeologist.discard_branch(branch_name, CURRENT_REPO)
+        heal_preview.store.put(preview)
+        raise HTTPException(status_code=500, detail=f"{msg} (the heal branch was discarded; preview {preview.id} can be applied again)")
+    _refresh_graph(touched)
+    return {"status": "success", "branch": branch_name, "merged": True, "message": msg}
+
 @app.post("/git/diff")
 def get_diff(request: GitOperationRequest):
     diff = archeologist.get_diff(request.branch_name, CURRENT_REPO)
@@ -269,29 +681,101 @@ def get_diff(request: GitOperationRequest):
 
 @app.post("/git/merge")
 def merge_branch(request: GitOperationRequest):
+    touched = _touched_files(request.branch_name)
     success, msg = archeologist.merge_branch(request.branch_name, CURRENT_REPO)
     if success:
-        # Re-analyze to refresh graph state
-        # We trigger analysis in bg so we don't block, but for merge we might want to block?
-        # Let's just block for now as it's fast on small updates usually
-        # Actually, let's call the phase_1/2 directly on archeologist instance to skip the socket noise or keep it
-        archeologist.phase_1_ingest(CURRENT_REPO)
-        archeologist.phase_2_analyze()
+        # Refresh graph state for the files the heal changed
+        _refresh_graph(touched)
         return {"status": "success", "message": msg}
     else:
         raise HTTPException(status_code=500, detail=msg)
 
 @app.post("/git/discard")
 def discard_branch(request: GitOperationRequest):
+    touched = _touched_files(request.branch_name)
     success, msg = archeologist.discard_branch(request.branch_name, CURRENT_REPO)
     if success:
-        # Re-analyze to refresh graph state
-        archeologist.phase_1_ingest(CURRENT_REPO)
-        archeologist.phase_2_analyze()
+        # Refresh graph state for the files the heal changed
+        _refresh_graph(touched)
         return {"status": "success", "message": msg}
     else:
         raise HTTPException(status_code=500, detail=msg)
 
+def _touched_files(branch_name):
+    """Files staged for a heal, read before merge/discard; None if git can't tell."""
+    try:
+        return archeologist.touched_files(branch_name, CURRENT_REPO)
+    except Exception as e:
+        print(f"   -> Could not list changed files ({e}); will re-analyze the repo.")
+        return None
+
+def _refresh_graph(touched):
+    """Updates the graph in place for the touched files (cost independent of repo size)."""
+    if touched is None:
+        archeologist.phase_1_ingest(CURRENT_REPO)
+        archeologist.phase_2_analyze()
+    elif touched:
+        archeologist.refresh_files(touched, CURRENT_REPO)
+
+@app.get("/precompute")
+def get_precompute_status():
+    """Progress of the background explain/plan precomputation for hotspots."""
+    return precompute.scheduler.status
+
+# --- LLM Response Cache ---
+
+@app.get("/llm/cache")
+def get_llm_cache_stats():
+    cache = llm_cache.get_cache()
+    return cache.stats() if cache else {"enabled": False}
+
+@app.delete("/llm/cache")
+def clear_llm_cache():
+    cache = llm_cache.get_cache()
+    if cache:
+        cache.clear()
+    return {"status": "cleared"}
+
+# --- Profiling ---
+
+@app.get("/profiling")
+def get_profiling():
+    return {"enabled": profiling.ALWAYS_ON, "profiles": profiling.list_profiles()}
+
+@app.post("/profiling")
+def set_profiling(request: ProfilingRequest):
+    """Profile every analyze/heal job until switched off (per-request opt-in works regardless)."""
+    profiling.ALWAYS_ON = request.enabled
+    print(f"   -> Profiling of all jobs {'enabled' if request.enabled else 'disabled'}.")
+    return {"enabled": profiling.ALWAYS_ON}
+
+def _get_profile(profile_id):
+    session = profiling.get(profile_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return session
+
+@app.get("/profiles/{profile_id}")
+def get_profile_summary(profile_id: str):
+    return _get_profile(profile_id).summary()
+
+@app.get("/profiles/{profile_id}/pstats")
+def download_pstats(profile_id: str, section: str = None):
+    """cProfile dump of the whole job, or of one phase (e.g. ?section=1_ingestion)."""
+    data = _get_profile(profile_id).pstats_bytes(section)
+    if not data:
+        raise HTTPException(status_code=404, detail="No cProfile data for this job/section")
+    filename = f"{profile_id}{'-' + section if section else ''}.pstats"
+    return Response(content=data, media_type="application/octet-stream",
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+@app.get("/profiles/{profile_id}/collapsed")
+def download_collapsed(profile_id: str):
+    """Collapsed stacks (phase;lang:x;frames... count) for flamegraph.pl or speedscope."""
+    data = _get_profile(profile_id).collapsed()
+    return Response(content=data, media_type="text/plain",
+                    headers={"Content-Disposition": f"attachment; filename={profile_id}.collapsed.txt"})
+
 class SettingsRequest(BaseModel):
     safe_mode: bool
     # repo_path is optional because sometimes we just want to toggle safe mode
@@ -333,18 +817,26 @@ async def update_settings(request: SettingsRequest, background_tasks: Background
         if archeologist:
             archeologist.reset()
             archeologist = None 
+        graph_manager.history = []
+        precompute.scheduler.cancel()
+        heal_preview.store.clear()
 
     return {"status": "updated", "safe_mode": True if not archeologist else archeologist.safe_mode, "repo_path": CURRENT_REPO}
 
 @app.post("/reset")
-def reset_system():
+def reset_system(wipe_vectors: bool = False):
+    """Clears the analysis. Stored vectors are reused by the next analysis unless wipe_vectors=true."""
     global archeologist
     print("⚠️  Use requested SYSTEM RESET.")
     
     if archeologist:
-        archeologist.reset()
+        archeologist.reset(wipe_vectors=wipe_vectors)
     
     # We detach the instance so next /analyze starts fresh-fresh
     archeologist = None
+    graph_manager.history = []
+    if GLOBAL_LOOP:
+        GLOBAL_LOOP.call_soon_threadsafe(precompute.scheduler.cancel)
+    heal_preview.store.clear()
     
     return {"status": "success", "message": "System Reset Complete"}
@@ -0,0 +1,304 @@
+"""
+Embedded vector index, used instead of the ChromaDB server when it isn't reachable
+(or when asked to). Same calls as a chromadb client/collection as far as the
+pipeline uses them: heartbeat / get_or_create_collection / create_collection /
+delete_collection, then upsert / query / get / delete / count.
+
+Vectors live in one float32 matrix per collection, memory-mapped from an .npy file,
+with ids, documents and metadata in a JSON sidecar. Search is exact: one matrix-vector
+product over the unit-normalised rows (cosine distance, 0 = identical), which stays in
+the low milliseconds up to ~100k functions and removes the HTTP hop.
+
+Embeddings are computed on the CPU: all-MiniLM-L6-v2 through onnxruntime (the model
+Chroma uses by default) when it is in the local cache, otherwise a dependency-free
+hashing embedder over identifier sub-tokens and character trigrams.
+
+    VECTOR_BACKEND=auto            # auto (Chroma, else local) | chroma | local
+    LOCAL_VECTOR_DIR=<tmp>/code-archeologist-vectors
+    LOCAL_EMBEDDING_MODEL=auto     # auto | minilm (downloads it if needed) | hashing
+"""
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+
+HASHING_DIMENSIONS = 384
+MIN_CAPACITY = 256
+
+IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+SUBTOKEN_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def vector_dir():
+    return os.getenv("LOCAL_VECTOR_DIR") or os.path.join(tempfile.gettempdir(), "code-archeologist-vectors")
+
+
+def split_identifier(identifier):
+    """`getUserID_v2` -> ["get", "user", "id", "v", "2"]"""
+    return [part.lower() for part in SUBTOKEN_RE.findall(identifier)]
+
+
+class HashingEmbedder:
+    """
+    Feature hashing of identifiers, their sub-tokens and the sub-tokens' character
+    trigrams (signed, log-scaled counts). Deterministic, no model, ~50k functions/s.
+    Close to what a lexical match would find; good enough for style examples.
+    """
+    name = f"hashing-{HASHING_DIMENSIONS}"
+    dimensions = HASHING_DIMENSIONS
+
+    def __call__(self, texts):
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = {}
+            for identifier in IDENTIFIER_RE.findall(text or ""):
+                features = [identifier.lower()]
+                for part in split_identifier(identifier):
+                    features.append(part)
+                    padded = f"#{part}#"
+                    features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+                for feature in features:
+                    counts[feature] = counts.get(feature, 0) + 1
+            for feature, count in counts.items():
+                h = zlib.crc32(feature.encode("utf-8"))
+                matrix[row, h % self.dimensions] += (1.0 if h & 0x80000000 else -1.0) * (1.0 + math.log(count))
+        return matrix
+
+
+class MiniLMEmbedder:
+    """all-MiniLM-L6-v2 on onnxruntime's CPU provider (via chromadb's bundled wrapper)."""
+    name = "all-MiniLM-L6-v2"
+    dimensions = 384
+
+    def __init__(self):
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+        self.model = ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+
+    @staticmethod
+    def is_cached():
+        try:
+            from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+        except ImportError:
+            return False
+        return os.path.isdir(os.path.join(ONNXMiniLM_L6_V2.DOWNLOAD_PATH, ONNXMiniLM_L6_V2.EXTRACTED_FOLDER_NAME))
+
+    def __call__(self, texts):
+        return np.asarray(self.model(list(texts)), dtype=np.float32)
+
+
+def default_embedder():
+    choice = os.getenv("LOCAL_EMBEDDING_MODEL", "auto").lower()
+    if choice == "minilm" or (choice == "auto" and MiniLMEmbedder.is_cached()):
+        try:
+            return MiniLMEmbedder()
+        except Exception as e:
+            print(f"   -> Could not load the MiniLM embedding model ({e}); using the hashing embedder.")
+    return HashingEmbedder()
+
+
+def _matches(metadata, where):
+    return all(metadata.get(key) == value for key, value in (where or {}).items())
+
+
+class LocalVectorCollection:
+    def __init__(self, name, directory, embedder):
+        self.name = name
+        self.embedder = embedder
+        self.matrix_path = os.path.join(directory, f"{name}.npy")
+        self.meta_path = os.path.join(directory, f"{name}.json")
+        self._lock = threading.RLock()
+        self.ids = [] # slot -> id (None for a free slot)
+        self.documents = []
+        self.metadatas = []
+        self.slots = {} # id -> slot
+        self.free = []
+        self.matrix = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # --- storage ---
+
+    def _load(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("embedder") != self.embedder.name:
+                raise ValueError(f"built with {state.get('embedder')}")
+            matrix = np.load(self.matrix_path, mmap_mode="r+")
+            if matrix.shape[1] != self.embedder.dimensions or matrix.shape[0] < len(state["ids"]):
+                raise ValueError("matrix does not match its metadata")
+        except FileNotFoundError:
+            self._allocate(MIN_CAPACITY)
+            return
+        except (OSError, ValueError, KeyError) as e:
+            print(f"   -> Discarding local vector index '{self.name}': {e}")
+            self._allocate(MIN_CAPACITY)
+            return
+        self.matrix = matrix
+        self.ids, self.documents, self.metadatas = state["ids"], state["documents"], state["metadatas"]
+        self.slots = {node_id: slot for slot, node_id in enumerate(self.ids) if node_id is not None}
+        self.free = [slot for slot, node_id in enumerate(self.ids) if node_id is None]
+
+    def _allocate(self, capacity):
+        """(Re)creates the matrix file with room for `capacity` rows, keeping the used ones."""
+        tmp_path = f"{self.matrix_path}.tmp.npy"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32,
+                                          shape=(capacity, self.embedder.dimensions))
+        if self.matrix is not None and self.ids:
+            grown[:len(self.ids)] = self.matrix[:len(self.ids)]
+        grown.flush()
+        del grown
+        self.matrix = None
+        os.replace(tmp_path, self.matrix_path)
+        self.matrix = np.load(self.matrix_path, mmap_mode="r+")
+
+    def persist(self):
+        """Flushes the matrix and writes the sidecar; called after each analysis/refresh."""
+        with self._lock:
+            self.matrix.flush()
+            tmp_path = f"{self.meta_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"embedder": self.embedder.name, "ids": self.ids,
+                           "documents": self.documents, "metadatas": self.metadatas}, f)
+            os.replace(tmp_path, self.meta_path)
+
+    def _drop_files(self):
+        self.matrix = None
+        for path in (self.matrix_path, self.meta_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # --- chromadb Collection interface ---
+
+    def count(self):
+        return len(self.slots)
+
+    def upsert(self, ids, documents, metadatas=None, embeddings=None):
+        metadatas = metadatas or [{} for _ in ids]
+        vectors = np.asarray(embeddings, dtype=np.float32) if embeddings is not None else self.embedder(documents)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        with self._lock:
+            for node_id, document, metadata, vector in zip(ids, documents, metadatas, vectors):
+                slot = self.slots.get(node_id)
+                if slot is None:
+                    if self.free:
+                        slot = self.free.pop()
+                    else:
+                        slot = len(self.ids)
+                        if slot >= self.matrix.shape[0]:
+                            self._allocate(max(MIN_CAPACITY, self.matrix.shape[0] * 2))
+                        self.ids.append(None)
+                        self.documents.append(None)
+                        self.metadatas.append(None)
+                    self.slots[node_id] = slot
+                self.ids[slot] = node_id
+                self.documents[slot] = document
+                self.metadatas[slot] = metadata
+                self.matrix[slot] = vector
+
+    add = upsert
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            if ids is None:
+                ids = [node_id for node_id, slot in self.slots.items() if _matches(self.metadatas[slot], where)]
+            for node_id in ids:
+                slot = self.slots.pop(node_id, None)
+                if slot is None:
+                    continue
+                self.ids[slot] = self.documents[slot] = self.metadatas[slot] = None
+                self.matrix[slot] = 0
+                self.free.append(slot)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        with self._lock:
+            slots = [self.slots[i] for i in ids if i in self.slots] if ids is not None else sorted(self.slots.values())
+            slots = [slot for slot in slots if _matches(self.metadatas[slot], where)]
+            slots = slots[offset or 0:(offset or 0) + limit if limit is not None else None]
+            result = {"ids": [self.ids[s] for s in slots],
+                      "documents": [self.documents[s] for s in slots],
+                      "metadatas": [self.metadatas[s] for s in slots]}
+            if include and "embeddings" in include:
+                result["embeddings"] = np.array(self.matrix[slots]) if slots else np.zeros((0, self.embedder.dimensions), np.float32)
+            return result
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, where=None, include=None):
+        """Exact cosine search; results shaped like chromadb's (one list per query)."""
+        queries = np.asarray(query_embeddings, dtype=np.float32) if query_embeddings is not None else self.embedder(query_texts)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            used = len(self.ids)
+            candidates = np.array([slot for slot in self.slots.values() if _matches(self.metadatas[slot], where)], dtype=np.int64) \
+                if where else None
+            mask = None
+            if candidates is None and self.free:
+                mask = np.array([node_id is None for node_id in self.ids])
+            for query in queries:
+                if candidates is not None:
+                    rows, similarity = candidates, self.matrix[candidates] @ query
+                else:
+                    rows, similarity = None, self.matrix[:used] @ query
+                    if mask is not None:
+                        similarity[mask] = -np.inf
+                k = min(n_results, len(self.slots) if candidates is None else len(candidates))
+                top = np.argpartition(-similarity, k - 1)[:k] if 0 < k < len(similarity) else np.arange(k)
+                top = top[np.argsort(-similarity[top], kind="stable")]
+                slots = rows[top] if rows is not None else top
+                out["ids"].append([self.ids[s] for s in slots])
+                out["documents"].append([self.documents[s] for s in slots])
+                out["metadatas"].append([self.metadatas[s] for s in slots])
+                out["distances"].append([float(1.0 - similarity[t]) for t in top])
+        return out
+
+
+class LocalVectorClient:
+    """The subset of chromadb.HttpClient the archeologist uses, backed by LocalVectorCollection."""
+    def __init__(self, directory=None, embedder=None):
+        self.directory = directory or vector_dir()
+        self.embedder = embedder or default_embedder()
+        self.collections = {}
+        self._lock = threading.Lock()
+
+    def heartbeat(self):
+        return time.time_ns()
+
+    def get_or_create_collection(self, name):
+        with self._lock:
+            if name not in self.collections:
+                self.collections[name] = LocalVectorCollection(name, self.directory, self.embedder)
+            return self.collections[name]
+
+    def create_collection(self, name):
+        with self._lock:
+            if name in self.collections or os.path.exists(os.path.join(self.directory, f"{name}.json")):
+                raise ValueError(f"Collection {name} already exists")
+        return self.get_or_create_collection(name)
+
+    def delete_collection(self, name):
+        with self._lock:
+            collection = self.collections.pop(name, None) or LocalVectorCollection(name, self.directory, self.embedder)
+            collection._drop_files()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """One embedded client per process (it owns the memory-mapped files)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LocalVectorClient()
+        return _client
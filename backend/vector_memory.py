@@ -0,0 +1,133 @@
+"""
+Per-repository vector collections that survive re-analysis and resets.
+
+Every repo gets its own collection (`code-<repo name>-<hash of its path>`), so
+switching repos never wipes another repo's vectors and two repos can be analysed
+side by side. Each vector's metadata carries the sha1 of the function source it was
+embedded from (`content_hash`). Phase 1 only embeds a function whose id is new or
+whose code changed, and reuses every other vector as it is.
+
+Vectors whose function no longer exists are deleted on a background thread after
+the analysis, so the deletes never hold up the graph. The next analysis of the same
+repo waits for that thread, so it can't see a half-collected collection.
+"""
+import hashlib
+import os
+import re
+import threading
+
+import metrics
+
+COLLECTION_PREFIX = "code"
+PAGE_SIZE = 5000
+
+_gc_threads = {} # collection name -> thread
+_gc_lock = threading.Lock()
+
+
+def content_hash(code):
+    return hashlib.sha1(code.encode("utf-8")).hexdigest()
+
+
+def collection_name(project_path):
+    """Chroma-safe (3-512 chars of [A-Za-z0-9._-], alphanumeric at both ends), stable per path."""
+    project_path = os.path.abspath(project_path)
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "-", os.path.basename(project_path))[:40].strip("-_") or "repo"
+    return f"{COLLECTION_PREFIX}-{slug}-{hashlib.sha1(project_path.encode('utf-8')).hexdigest()[:12]}"
+
+
+def open_collection(archeologist, project_path):
+    """Points archeologist.collection at the repo's collection; loads what it already holds."""
+    archeologist.vector_project = project_path
+    archeologist.vector_hashes = {}
+    if not archeologist.has_memory:
+        return
+    name = collection_name(project_path)
+    with _gc_lock:
+        pending = _gc_threads.pop(name, None)
+    if pending is not None:
+        pending.join()
+    try:
+        archeologist.collection = archeologist.chroma_client.get_or_create_collection(name=name)
+        archeologist.vector_hashes = stored_hashes(archeologist.collection)
+        archeologist.log(f"   -> Vector collection '{name}': {len(archeologist.vector_hashes)} stored vectors.")
+    except Exception as e:
+        archeologist.log(f"⚠️  Warning: Could not open vector collection '{name}': {e}")
+        archeologist.has_memory = False
+
+
+def reattach(archeologist, batch_size=100):
+    """
+    After ChromaDB comes back: reopens the repo's collection and embeds the functions
+    analysed while it was away (or changed since), in batches.
+    """
+    open_collection(archeologist, archeologist.vector_project)
+    if not archeologist.has_memory:
+        return
+    missing = []
+    for node_id, data in list(archeologist.graph.nodes(data=True)):
+        code = data.get('code', '')
+        code_hash = content_hash(code)
+        if data.get('type') == 'function' and archeologist.vector_hashes.get(node_id) != code_hash:
+            missing.append((node_id, data, code, code_hash))
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        try:
+            with metrics.track_vector("upsert"):
+                archeologist.collection.upsert(
+                    ids=[node_id for node_id, _, _, _ in batch],
+                    documents=[code for _, _, code, _ in batch],
+                    metadatas=[{"file": data.get('file'), "name": node_id.split('::')[1], "type": "function",
+                                "node_id": node_id, "content_hash": code_hash} for node_id, data, _, code_hash in batch]
+                )
+        except Exception as e:
+            print(f"   -> Error embedding functions after reconnecting: {e}")
+            return
+        for node_id, _, _, code_hash in batch:
+            archeologist.vector_hashes[node_id] = code_hash
+        metrics.VECTOR_EMBEDDINGS.labels("embedded").inc(len(batch))
+    if missing:
+        archeologist.log(f"   -> Embedded {len(missing)} functions analysed while ChromaDB was unreachable.")
+
+
+def stored_hashes(collection):
+    """{id: content_hash} for every vector in the collection (None for vectors without one)."""
+    hashes = {}
+    offset = 0
+    while True:
+        with metrics.track_vector("get"):
+            page = collection.get(include=["metadatas"], limit=PAGE_SIZE, offset=offset)
+        for node_id, metadata in zip(page["ids"], page["metadatas"]):
+            hashes[node_id] = (metadata or {}).get("content_hash")
+        if len(page["ids"]) < PAGE_SIZE:
+            return hashes
+        offset += PAGE_SIZE
+
+
+def collect_orphans(archeologist, on_done=None):
+    """Deletes, in the background, the stored vectors of functions that are no longer in the graph."""
+    if not archeologist.has_memory:
+        return None
+    orphans = [node_id for node_id in archeologist.vector_hashes if node_id not in archeologist.graph]
+    if not orphans:
+        return None
+    for node_id in orphans:
+        del archeologist.vector_hashes[node_id]
+    collection = archeologist.collection
+
+    def run():
+        try:
+            for start in range(0, len(orphans), PAGE_SIZE):
+                with metrics.track_vector("delete"):
+                    collection.delete(ids=orphans[start:start + PAGE_SIZE])
+            if on_done:
+                on_done()
+            print(f"   -> Collected {len(orphans)} orphaned vectors from '{collection.name}'.")
+        except Exception as e:
+            print(f"   -> Orphaned vector collection failed: {e}")
+
+    thread = threading.Thread(target=run, name=f"vector-gc-{collection.name}", daemon=True)
+    with _gc_lock:
+        _gc_threads[collection.name] = thread
+    thread.start()
+    return thread
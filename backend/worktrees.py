@@ -0,0 +1,171 @@
+"""
+Isolated git worktrees for heals.
+
+In safe mode every heal gets its own worktree (a separate checkout of 'main' on
+the heal's branch) under a scratch directory, so concurrent heals never share
+files or an index and the user's checkout never changes branch. Worktrees are
+pooled: after a merge/discard the checkout is cleaned and reused by the next heal,
+which only costs a `git checkout` instead of a full `git worktree add`.
+
+    HEAL_WORKTREE_DIR=<tmp>/code-archeologist-worktrees
+    HEAL_WORKTREE_POOL=4        (idle worktrees kept per repository)
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+import git_service
+
+MAIN_BRANCH = git_service.MAIN_BRANCH
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _git(cwd, *args):
+    return git_service.run(cwd, *args)
+
+
+class WorktreePool:
+    def __init__(self, project_path):
+        self.project_path = os.path.abspath(project_path)
+        base = os.getenv("HEAL_WORKTREE_DIR") or os.path.join(tempfile.gettempdir(), "code-archeologist-worktrees")
+        repo_key = hashlib.sha1(self.project_path.encode("utf-8")).hexdigest()[:12]
+        self.root = os.path.join(base, f"{os.path.basename(self.project_path)}-{repo_key}")
+        self.max_idle = int(os.getenv("HEAL_WORKTREE_POOL", "4"))
+        self.idle = []
+        self.active = {} # branch -> worktree path
+        self.synced = {} # worktree path -> {file_rel_path: bytes copied from the user's checkout}
+        self.created = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        # Forget worktrees whose directories were wiped (e.g. /tmp cleared)
+        _git(self.project_path, "worktree", "prune")
+
+    def acquire(self, branch_name):
+        """A clean worktree with branch_name freshly created from main checked out."""
+        with self._lock:
+            path = self.idle.pop() if self.idle else None
+            if path is None:
+                self.created += 1
+                path = os.path.join(self.root, f"wt-{os.getpid()}-{self.created}")
+                if os.path.exists(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                    _git(self.project_path, "worktree", "prune")
+                _git(self.project_path, "worktree", "add", "--detach", path, MAIN_BRANCH)
+                print(f"   -> Created heal worktree {path}")
+            self.active[branch_name] = path
+            self.synced.pop(path, None)
+
+        try:
+            _git(path, "checkout", "-q", "-f", "-b", branch_name, MAIN_BRANCH)
+            _git(path, "clean", "-q", "-fd")
+        except Exception:
+            with self._lock:
+                self.active.pop(branch_name, None)
+            raise
+        return path
+
+    def path_for(self, branch_name):
+        """Worktree holding branch_name, or None (also finds worktrees from before a restart)."""
+        with self._lock:
+            if branch_name in self.active:
+                return self.active[branch_name]
+        try:
+            listing = _git(self.project_path, "worktree", "list", "--porcelain")
+        except Exception:
+            return None
+        path = None
+        for line in listing.splitlines():
+            if line.startswith("worktree "):
+                path = line[len("worktree "):]
+            elif line == f"branch refs/heads/{branch_name}" and os.path.abspath(path) != self.project_path:
+                with self._lock:
+                    self.active[branch_name] = path
+                return path
+        return None
+
+    def release(self, branch_name):
+        """Detaches the worktree from branch_name and returns it to the pool (or removes it)."""
+        with self._lock:
+            path = self.active.pop(branch_name, None)
+            self.synced.pop(path, None)
+        if path is None:
+            return
+        try:
+            # A forced checkout also drops staged and modified files
+            _git(path, "checkout", "-q", "-f", "--detach", MAIN_BRANCH)
+            _git(path, "clean", "-q", "-fd")
+        except Exception as e:
+            print(f"   -> Could not recycle worktree {path}: {e}")
+            self._remove(path)
+            return
+        with self._lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(path)
+                return
+        self._remove(path)
+
+    def _remove(self, path):
+        try:
+            _git(self.project_path, "worktree", "remove", "--force", path)
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            git_service.run(self.project_path, "worktree", "prune", check=False)
+
+
+def get_pool(project_path):
+    key = os.path.abspath(project_path)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = WorktreePool(key)
+        return _pools[key]
+
+
+def workspace_for(branch_name, project_path):
+    """Where a heal's files live: its worktree, or the project itself (Safe Mode OFF / unknown branch)."""
+    if not branch_name or not os.path.exists(os.path.join(project_path, ".git")):
+        return project_path
+    return get_pool(project_path).path_for(branch_name) or project_path
+
+
+def sync_from_checkout(project_path, workdir, file_rel_path):
+    """
+    Copies the user's version of a file into the worktree if it differs from main's,
+    so the splice (whose byte offsets come from analysing the user's checkout) lands
+    on the same bytes it was computed from. The copied bytes are remembered per worktree
+    (see synced_files): the heal commit carries those uncommitted edits, so the merge
+    may hand the file back to git as long as the user hasn't changed it since.
+    """
+    if workdir == project_path:
+        return
+    src = os.path.join(project_path, file_rel_path)
+    dst = os.path.join(workdir, file_rel_path)
+    with open(src, "rb") as f:
+        wanted = f.read()
+    if os.path.exists(dst):
+        with open(dst, "rb") as f:
+            if f.read() == wanted:
+                return
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    with open(dst, "wb") as f:
+        f.write(wanted)
+    record_synced(project_path, workdir, file_rel_path, wanted)
+
+
+def record_synced(project_path, workdir, file_rel_path, content):
+    """Remembers that the heal in workdir was built on these bytes of the user's file (see synced_files)."""
+    if workdir == project_path:
+        return
+    pool = get_pool(project_path)
+    with pool._lock:
+        pool.synced.setdefault(workdir, {})[file_rel_path] = content
+
+
+def synced_files(project_path, workdir):
+    """{file_rel_path: bytes} copied from the user's checkout into this worktree since it was acquired."""
+    pool = get_pool(project_path)
+    with pool._lock:
+        return dict(pool.synced.get(workdir, {}))
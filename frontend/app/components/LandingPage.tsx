@@ -95,6 +95,25 @@ export default function LandingPage({ onAnalysisComplete }: LandingPageProps) {
         setLogs(prev => [...prev, "Initializing connection to backend..."]);
 
         const ws = new WebSocket('ws://localhost:8000/ws/logs');
+
+        // Hand over to the dashboard as soon as the first node batch of this run arrives;
+        // it keeps rendering the rest of the graph as it streams in.
+        const graphWs = new WebSocket('ws://localhost:8000/ws/graph');
+        let replayed = false;
+        let runStarted = false;
+        graphWs.onmessage = (event) => {
+            const frame = JSON.parse(event.data);
+            if (frame[0] === 'r') {
+                replayed = true; // Anything before this belongs to a previous run
+            } else if (frame[0] === 'b' && replayed) {
+                runStarted = true;
+            } else if (frame[0] === 'n' && runStarted) {
+                setLogs(prev => [...prev, "First nodes excavated! Loading visualization..."]);
+                graphWs.close();
+                ws.close();
+                onAnalysisComplete();
+            }
+        };
         
         ws.onopen = () => {
             setLogs(prev => [...prev, "Connection established.", "Starting codebase analysis..."]);
@@ -126,6 +145,7 @@ export default function LandingPage({ onAnalysisComplete }: LandingPageProps) {
             const msg = event.data;
             if (msg === "ANALYSIS_COMPLETE") {
                 setLogs(prev => [...prev, "Analysis complete! Loading visualization..."]);
+                graphWs.close();
                 setTimeout(() => {
                     onAnalysisComplete();
                 }, 1000);
@@ -54,6 +54,29 @@ const ForceGraph3D = dynamic(() => import('react-force-graph-3d'), {
 });
 
 const API_URL = 'http://127.0.0.1:8000';
+const GRAPH_WS_URL = 'ws://localhost:8000/ws/graph';
+const LLM_WS_URL = 'ws://localhost:8000/ws/llm';
+
+const newStreamId = () => Math.random().toString(36).slice(2);
+
+// Modern color palette based on complexity
+const styleNode = (n: any) => {
+  const c = n.complexity || 1;
+  
+  let color = '#10b981'; // Green (Low)
+  if (c > 35) color = '#8b5cf6';      // Violet (Extreme)
+  else if (c > 20) color = '#ef4444'; // Red (High)
+  else if (c > 10) color = '#f97316'; // Orange (Medium)
+  else if (c > 5) color = '#eab308';  // Yellow (Low-Med)
+  else if (c > 2) color = '#22c55e';  // Green-500 (Low)
+  
+  return {
+    ...n,
+    color: color,
+    _uiColor: color,
+    val: Math.pow(c, 0.5) * 2 
+  };
+};
 
 type Node = {
   id: string;
@@ -73,6 +96,7 @@ type HealResult = {
   new_name: string;
   ai_report: string;
   propagated_to: string[];
+  propagation_failed?: string[];
   branch?: string;
   message?: string;
 };
@@ -101,6 +125,9 @@ export default function Home() {
   const [explanation, setExplanation] = useState<string | null>(null);
   const [isExplaining, setIsExplaining] = useState(false);
   const [isHealing, setIsHealing] = useState(false);
+  const [streamingReport, setStreamingReport] = useState("");
+  // stream_id -> token handler for the LLM output streamed over /ws/llm
+  const llmStreams = useRef<Record<string, (text: string) => void>>({});
   const [isMerging, setIsMerging] = useState(false);
   const [isDiscarding, setIsDiscarding] = useState(false);
   const [isPanelOpen, setIsPanelOpen] = useState(true);
@@ -185,8 +212,8 @@ export default function Home() {
     }, ...prev].slice(0, 50));
   };
 
-  const fetchGraph = async () => {
-    setLoading(true);
+  const fetchGraph = async (quiet = false) => {
+    if (!quiet) setLoading(true);
     addLog("Fetching graph data...", "info");
     
     try {
@@ -203,26 +230,16 @@ export default function Home() {
         addLog("No nodes found in graph.", "warning");
       }
 
-      const processedNodes = nodes.map((n: any) => {
-        const c = n.complexity || 1;
-        
-        // Modern color palette based on complexity
-        let color = '#10b981'; // Green (Low)
-        if (c > 35) color = '#8b5cf6';      // Violet (Extreme)
-        else if (c > 20) color = '#ef4444'; // Red (High)
-        else if (c > 10) color = '#f97316'; // Orange (Medium)
-        else if (c > 5) color = '#eab308';  // Yellow (Low-Med)
-        else if (c > 2) color = '#22c55e';  // Green-500 (Low)
-        
+      const processedNodes = nodes.map(styleNode);
+      
+      // Hydrate nodes already on screen (e.g. streamed ones) in place so the layout doesn't jump
+      setGraphData(prev => {
+        const onScreen = new Map(prev.nodes.map((n: any) => [n.id, n]));
         return {
-          ...n,
-          color: color,
-          _uiColor: color,
-          val: Math.pow(c, 0.5) * 2 
+          nodes: processedNodes.map((n: any) => onScreen.has(n.id) ? Object.assign(onScreen.get(n.id), n) : n),
+          links: edges
         };
       });
-      
-      setGraphData({ nodes: processedNodes, links: edges });
       addLog(`Loaded ${processedNodes.length} nodes and ${edges.length} links.`, "success");
       
       if (nodes.length > 0 && fgRef.current) {
@@ -316,28 +333,36 @@ export default function Home() {
   const handleHeal = async () => {
     if (!selectedNode) return;
     setIsHealing(true);
+    setStreamingReport("");
     addLog(`Starting refactoring for ${selectedNode.id}...`, "warning");
+
+    const streamId = newStreamId();
+    llmStreams.current[streamId] = (text) => setStreamingReport(prev => prev + text);
     
     try {
       const res = await fetch(`${API_URL}/heal`, {
         method: 'POST',
         headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({ node_id: selectedNode.id })
+        body: JSON.stringify({ node_id: selectedNode.id, stream_id: streamId })
       });
       const result: HealResult = await res.json();
       
-      if (result.status === 'success') {
+      if (result.status === 'success' || result.status === 'partial') {
         setHealResult(result);
         addLog(`Refactoring complete: ${result.new_name}`, "success");
         if (result.propagated_to.length > 0) {
           addLog(`Updated ${result.propagated_to.length} dependent files.`, "info");
         }
+        if (result.propagation_failed && result.propagation_failed.length > 0) {
+          addLog(`Could not update callers: ${result.propagation_failed.join(', ')}`, "warning");
+        }
       } else {
         addLog(`Refactoring failed: ${result.message}`, "error");
       }
     } catch (e: any) {
       addLog(`Error: ${e.message}`, "error");
     } finally {
+      delete llmStreams.current[streamId];
       setIsHealing(false);
     }
   };
@@ -458,13 +483,17 @@ export default function Home() {
   const handleExplain = async () => {
     if (!selectedNode) return;
     setIsExplaining(true);
+    setExplanation("");
     addLog(`Analyzing ${selectedNode.id}...`, "info");
 
+    const streamId = newStreamId();
+    llmStreams.current[streamId] = (text) => setExplanation(prev => (prev || "") + text);
+
     try {
       const res = await fetch(`${API_URL}/explain`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ node_id: selectedNode.id })
+        body: JSON.stringify({ node_id: selectedNode.id, stream_id: streamId })
       });
       const result = await res.json();
       if (result.explanation) {
@@ -476,6 +505,7 @@ export default function Home() {
     } catch(e: any) {
       addLog(`Error: ${e.message}`, "error");
     } finally {
+      delete llmStreams.current[streamId];
       setIsExplaining(false);
     }
   };
@@ -500,10 +530,70 @@ export default function Home() {
     initSystem();
   }, []);
 
+  // Progressive graph streaming: render node/edge batches as the backend produces them.
+  // Frame format is documented in backend/graph_stream.py.
   useEffect(() => {
-    if (hasStarted) {
-      fetchGraph();
-    }
+    if (!hasStarted) return;
+
+    let sawRun = false;
+    const ws = new WebSocket(GRAPH_WS_URL);
+
+    ws.onmessage = (event) => {
+      const frame = JSON.parse(event.data);
+      switch (frame[0]) {
+        case 'b':
+          sawRun = true;
+          setLoading(false);
+          setGraphData({ nodes: [], links: [] });
+          break;
+        case 'n': {
+          const batch = frame[1].map(([id, file, complexity]: [string, string, number]) =>
+            styleNode({ id, file, complexity, type: 'function' })
+          );
+          setGraphData(prev => {
+            const known = new Set(prev.nodes.map((n: any) => n.id));
+            return { nodes: [...prev.nodes, ...batch.filter((n: any) => !known.has(n.id))], links: prev.links };
+          });
+          break;
+        }
+        case 'e':
+          setGraphData(prev => {
+            const known = new Set(prev.nodes.map((n: any) => n.id));
+            const batch = frame[1]
+              .filter(([source, target]: [string, string]) => known.has(source) && known.has(target))
+              .map(([source, target]: [string, string]) => ({ source, target }));
+            return { nodes: prev.nodes, links: [...prev.links, ...batch] };
+          });
+          break;
+        case 'z':
+          // Graph is complete: pull the full node attributes (source code etc.)
+          fetchGraph(true);
+          break;
+        case 'r':
+          // Nothing streamed in this server session: fall back to a plain fetch
+          if (!sawRun) fetchGraph();
+          break;
+      }
+    };
+
+    ws.onerror = () => {
+      if (!sawRun) fetchGraph();
+    };
+
+    return () => ws.close();
+  }, [hasStarted]);
+
+  // Token streaming for /explain and /heal (frame format in backend/server.py, /ws/llm)
+  useEffect(() => {
+    if (!hasStarted) return;
+
+    const ws = new WebSocket(LLM_WS_URL);
+    ws.onmessage = (event) => {
+      const frame = JSON.parse(event.data);
+      if (frame.event === 'token') llmStreams.current[frame.stream]?.(frame.text);
+    };
+
+    return () => ws.close();
   }, [hasStarted]);
 
   const handleReset = async () => {
@@ -607,7 +697,7 @@ export default function Home() {
 
           {/* Action Buttons */}
           <button 
-            onClick={fetchGraph} 
+            onClick={() => fetchGraph()} 
             className="btn btn-secondary text-sm"
             title="Refresh graph"
           >
@@ -788,7 +878,19 @@ export default function Home() {
                   </div>
 
                   {/* Healing Result or Code Preview */}
-                  {isHealing ? (
+                  {isHealing && streamingReport ? (
+                    <div className="flex-1 flex flex-col min-h-0">
+                      <div className="p-4 bg-indigo-50 border-b border-indigo-100 flex items-center gap-3">
+                        <Activity className="w-5 h-5 text-indigo-600 animate-spin" />
+                        <h3 className="font-medium text-indigo-900">AI is Refactoring</h3>
+                      </div>
+                      <div className="p-5 flex-1 overflow-y-auto custom-scrollbar">
+                        <div className="prose-modern text-sm bg-gray-50 rounded-lg p-4 border border-gray-200">
+                          <ReactMarkdown>{streamingReport}</ReactMarkdown>
+                        </div>
+                      </div>
+                    </div>
+                  ) : isHealing ? (
                     <div className="flex-1 flex flex-col items-center justify-center p-8 text-center">
                       <div className="w-16 h-16 border-4 border-indigo-200 border-t-indigo-600 rounded-full animate-spin mb-6" />
                       <h3 className="text-lg font-semibold text-gray-900 mb-2">AI is Refactoring</h3>